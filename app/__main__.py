@@ -0,0 +1,4 @@
+from app.server import main
+
+
+main()
@@ -1,52 +1,141 @@
+from datetime import datetime
+from uuid import UUID
+
 import asyncpg
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
 from app.core.security import verify_token
 from app.core.config import settings
-from app.db.connection import get_conn
+from app.db.connection import LazyConnection, get_conn
+from app.auth.services.otp_store import OTPStore, get_store
+from app.auth.services.permissions import Permission, has_permissions, permission_mask
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+# Users allowed to authenticate, as a SQL condition on `users`
+ACTIVE_USER = "is_verified AND is_active AND deleted_at IS NULL"
 
 
-async def get_current_user(
-        token: str = Depends(oauth2_scheme),
-        conn: asyncpg.Connection = Depends(get_conn)
-        ) -> dict:
+class Principal(asyncpg.Record):
     '''
-    validates the access token and retrieves uer information from the database
+    The authenticated user, as returned by asyncpg (`record_class`): an
+    immutable record with no per-instance dict, holding PRINCIPAL_COLUMNS
+    only. Supports `principal["id"]`, `.get()` and attribute access.
     '''
 
+    __slots__ = ()
+
+    @property
+    def id(self) -> UUID:
+        return self["id"]
+
+    @property
+    def email(self) -> str:
+        return self["email"]
+
+    @property
+    def is_superuser(self) -> bool:
+        return self["is_superuser"]
+
+    @property
+    def created_at(self) -> datetime:
+        return self["created_at"]
+
+
+# What routes read from the current user (never the password hash)
+PRINCIPAL_COLUMNS = "id, email, is_verified, is_superuser, created_at"
+
+
+def _credentials_exception() -> HTTPException:
     # standard error for unregistered user
-    credentials_exception = HTTPException(
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    # get the token from request and decode it to get user email
+
+
+async def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    '''
+    decodes the access token, without touching the database
+    (FastAPI caches it per request, so it is decoded once)
+    '''
     try:
         payload = verify_token(token, settings.SECRET_KEY)
-        email = payload.get("sub")
-        if not email:
-            raise credentials_exception
-    
     except ValueError:
-        raise credentials_exception
-    
-    query = """
-        SELECT id, email, username, password_hash,
-        is_verified, is_active, is_superuser,
-        created_at, last_login, email_verified_at
+        raise _credentials_exception()
+
+    # an MFA token only proves the password step
+    if not payload.get("sub") or payload.get("type") == "mfa":
+        raise _credentials_exception()
+    return payload
+
+
+async def get_current_user(
+        payload: dict = Depends(get_token_payload),
+        conn: LazyConnection = Depends(get_conn)
+        ) -> Principal:
+    '''
+    validates the access token and retrieves uer information from the database
+    '''
+
+    query = f"""
+        SELECT {PRINCIPAL_COLUMNS}
         FROM users
-        WHERE email = $1
+        WHERE email = $1 AND {ACTIVE_USER}
     """
 
-    user_row = await conn.fetchrow(query, email)
+    await conn.route(payload["sub"])
+    user_row = await conn.fetchrow(query, payload["sub"], record_class=Principal)
+    if user_row is None:
+        raise _credentials_exception()
+    return user_row
+
+
+async def get_current_user_id(
+        payload: dict = Depends(get_token_payload),
+        conn: LazyConnection = Depends(get_conn)
+        ) -> UUID:
+    '''
+    The user id from the access token (`uid` claim), with no database access
+    and no pool connection (the request's connection is only routed to the
+    user's shard). The user may have been deactivated since the token was
+    issued: routes using it must check ACTIVE_USER in their own query on `users`.
+    '''
+    await conn.route(payload["sub"])
+    try:
+        return UUID(payload["uid"])
+    except (KeyError, TypeError, ValueError):
+        raise _credentials_exception()  # issued before the claim existed, the client refreshes
+
+
+async def get_current_superuser(current_user: Principal = Depends(get_current_user)) -> Principal:
+    '''Like get_current_user, for admin routes'''
+    if not current_user["is_superuser"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough privileges")
+    return current_user
+
+
+def require_permission(*permissions: Permission):
+    '''
+    Route dependency checking the permission bitset of the access token
+    (`perm` claim, resolved from the user's roles when the token is issued):
+    a bit test, no database access.
+
+        @router.get("", dependencies=[Depends(require_permission(Permission.USERS_READ))])
+    '''
+
+    required = permission_mask(permissions)
+
+    async def dependency(payload: dict = Depends(get_token_payload)) -> None:
+        if not has_permissions(int(payload.get("perm") or 0), required):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough privileges")
+
+    return dependency
 
-    if user_row is None or not user_row["is_verified"] or not user_row["is_active"]:
-        raise credentials_exception
 
-    return dict(user_row)
+async def get_otp_store(conn: LazyConnection = Depends(get_conn)) -> OTPStore:
+    '''OTP store configured by OTP_STORE, sharing the request's connection'''
+    return get_store(conn)
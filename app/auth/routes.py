@@ -1,23 +1,55 @@
+import hmac
+import math
+import time
 from datetime import timedelta, datetime, timezone
-import asyncpg
-from fastapi import APIRouter, Depends, HTTPException, status, Body
-
-from app.db.connection import get_conn
-from app.core.security import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token
-from app.auth.services.password import hash_password, verify_password
-from app.auth.services.jwt import create_refresh_token, verify_refresh_token
+from uuid import UUID
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status, Body
+
+from app.db.connection import LazyConnection, get_conn, shard_ctx, shard_for
+from app.core.security import create_access_token
+from app.auth.services.password import dummy_verify, hash_password, verify_and_update_password, verify_password
+from app.auth.services.breach import is_breached
+from app.auth.services.email_filter import email_filter
+from app.auth.services.jwt import create_mfa_token, create_refresh_token, verify_mfa_token, verify_refresh_token
+from app.auth.services.forward_auth import get_forward_auth_cache
+from app.auth.services.introspection import introspect_tokens
+from app.auth.services.permissions import Permission, get_role_permission_cache
+from app.auth.services.stuffing import get_stuffing_detector
+from app.auth.services.totp import encrypt_secret, generate_secret, get_totp_verifier, provisioning_uri
 from app.auth.schemas import (
     EmailVerificationRequestResponse,
+    HeavyHittersResponse,
+    IntrospectionRequest,
+    IntrospectionResponse,
     LoginRequest,
+    MFARequiredResponse,
+    MFAVerifyRequest,
+    PasswordChangeRequest,
     RegisterRequest,
     TokenResponse,
+    TOTPCodeRequest,
+    TOTPEnrollResponse,
     VerifyEmailRequest,
     VerifyTokenResponse,
+    mfa_required_serializer,
+    token_response_serializer,
+)
+from app.user.schemas import UserOut, user_out_serializer
+from app.auth.dependencies import (
+    ACTIVE_USER,
+    Principal,
+    get_current_user,
+    get_current_user_id,
+    get_otp_store,
+    require_permission,
 )
-from app.user.schemas import UserOut
-from app.auth.dependencies import get_current_user
-from app.auth.services.otp import EmailService, OTPService
+from app.auth.services.otp import OTPCheck, OTPService
+from app.auth.services.otp_store import OTPStore, get_kv_client
+from app.core.admission import Priority, admit, get_hashing_budget
+from app.core.audit import audit_log
+from app.core.client_ip import client_ip
 from app.core.config import settings
+from app.core.responses import ORJSONResponse
 
 
 router = APIRouter()
@@ -31,18 +63,116 @@ def _normalize_email(email: str) -> str:
     return email
 
 
-@router.post("/register", response_model=UserOut, status_code=status.HTTP_201_CREATED)
+def _client_ip(request: Request) -> str | None:
+    return client_ip(request)
+
+
+def _reject_breached(password: str) -> None:
+    '''400 for passwords found in the breach index (an mmap lookup, cheap enough to run on the loop)'''
+    if is_breached(password):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This password has appeared in a data breach, please choose another one",
+        )
+
+
+def _user_agent(request: Request) -> str | None:
+    return request.headers.get("user-agent")
+
+
+async def _throttle_login(request: Request) -> None:
+    '''
+    Delay or refuse login attempts from sources with many recent failed logins.
+
+    Runs first in `token`, before admission, so a throttled attempt holds
+    no admission slot, pool connection or bcrypt thread while it waits.
+    '''
+
+    detector = get_stuffing_detector()
+    if detector is None:
+        return
+    verdict = detector.assess(_client_ip(request), _user_agent(request))
+    if verdict.action == "allow":
+        return
+    if verdict.action == "slow" and (await detector.slow_down(verdict.seconds) or verdict.shared):
+        return  # a user agent alone never locks out every user of a browser
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many failed login attempts, please retry later",
+        headers={"Retry-After": str(math.ceil(verdict.seconds))},
+    )
+
+
+def _login_failed(request: Request) -> None:
+    detector = get_stuffing_detector()
+    if detector is not None:
+        detector.record_failure(_client_ip(request), _user_agent(request))
+
+
+async def _screen_login(payload: LoginRequest, request: Request) -> LoginRequest:
+    '''
+    Reject logins for emails the Bloom filter knows are not registered.
+
+    Declared before `get_conn` in `token`, so a definite miss never acquires
+    a pool connection or runs a SELECT. A dummy bcrypt verification keeps
+    the response time equal to a real failed login.
+    '''
+
+    email = _normalize_email(payload.username)
+    if not email_filter.might_exist(email):
+        await get_hashing_budget().run_in_thread(dummy_verify, payload.password, priority=Priority.LOW)
+        audit_log.record("login.failed", email=email, ip_address=_client_ip(request), detail={"reason": "unknown_email"})
+        _login_failed(request)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+
+# Role ids of the user, selected along with the users row
+USER_ROLE_IDS = "ARRAY(SELECT role_id FROM user_roles WHERE user_id = users.id) AS role_ids"
+
+
+async def _permissions(conn, user_row) -> int:
+    return await get_role_permission_cache().resolve(conn, user_row["role_ids"], user_row["is_superuser"])
+
+
+def _token_pair(email: str, user_id, permissions: int) -> Response:
+    '''The access token carries the user id and permission bitset, the refresh token re-resolves them'''
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        {"sub": email, "uid": str(user_id), "perm": permissions},
+        expires_delta=access_token_expires,
+    )
+    refresh_token = create_refresh_token({"sub": email})
+
+    return token_response_serializer.response({
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": int(access_token_expires.total_seconds())
+    })
+
+
+@router.post(
+    "/register",
+    response_model=UserOut,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(admit(Priority.LOW))],
+)
 async def register_user(
     user: RegisterRequest,
-    conn: asyncpg.Connection = Depends(get_conn)
-    ) -> UserOut:
+    conn: LazyConnection = Depends(get_conn)
+    ) -> Response:
     '''
     Register a new user with email and password.
 
     Parameters:
 
         - user (RegisterRequest): must be valid and unique.
-        - conn (asyncpg.Connection): database connection dependency.
+        - conn (LazyConnection): database connection dependency.
 
     Responses:
 
@@ -51,24 +181,34 @@ async def register_user(
     Raises:
         HTTPExeption:
 
-            - 400: If email already registered.
-            - 500: If registration fails.
+            - 400: If email already registered, or the password is known from a data breach.
     '''
 
-    # Check if the email is already registered
-    existing = await conn.fetchrow("SELECT 1 FROM users WHERE email = $1", user.email)
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered!"
-            )
+    _reject_breached(user.password)
 
-    password_hash = hash_password(user.password)
+    # The email's shard holds the user (and enforces its uniqueness)
+    await conn.route(user.email)
+
+    # Check if the email is already registered. A Bloom filter miss means it
+    # is definitely free, so the SELECT is only needed for possible hits.
+    if email_filter.might_exist(user.email):
+        existing = await conn.fetchrow("SELECT 1 FROM users WHERE email = $1", user.email)
+        if existing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered!"
+                )
 
+    # No connection is held while bcrypt runs (or waits for the hashing budget)
+    await conn.release()
+    password_hash = await get_hashing_budget().run_in_thread(hash_password, user.password, priority=Priority.LOW)
+
+    # ON CONFLICT covers concurrent registrations of the same email
     user_row = await conn.fetchrow(
         """
         INSERT INTO users (email, password_hash)
         VALUES ($1, $2)
+        ON CONFLICT (email) DO NOTHING
         RETURNING id, email, is_verified, is_active, created_at
         """,
         user.email, password_hash
@@ -76,57 +216,85 @@ async def register_user(
 
     if not user_row:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="User Registeration failed"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered!"
         )
 
-    return UserOut(**user_row)
+    email_filter.add(user.email)
+
+    # The row comes straight from our INSERT, no need to validate it again
+    return user_out_serializer.response(user_row, status_code=status.HTTP_201_CREATED)
 
 
 
-@router.post("/token", response_model=TokenResponse)
+@router.post(
+    "/token",
+    response_model=TokenResponse | MFARequiredResponse,
+    responses={429: {"description": "Too many failed logins from this source"}},
+    dependencies=[Depends(_throttle_login), Depends(admit(Priority.LOW))],
+)
 async def token(
-    payload: LoginRequest,
-    conn: asyncpg.Connection = Depends(get_conn)
-    ) -> TokenResponse:
+    request: Request,
+    payload: LoginRequest = Depends(_screen_login),
+    conn: LazyConnection = Depends(get_conn)
+    ) -> Response:
     '''
     Authenticates an existing user and returns a JWT token pair.
 
     Parameters:
         - payload (LoginRequest): Contains user's email (username) and password.
             Email must be registered. Password is plain text and will be verified.
-        - Conn (asyncpg.Connection): Database connection dependency.
+        - Conn (LazyConnection): Database connection dependency.
 
     Responses:
         - TokenResponse: Includes access token, refresh token, token type ("bearer"), and expiration time in seconds.
+        - MFARequiredResponse: If the user has 2FA enabled; exchange its mfa_token
+            and a TOTP code at /auth/2fa/verify for the token pair.
 
     Raises:
         HTTPExeption:
             - 401: If email or password is incorrect.
             - 403: If user email is not verified.
+            - 429: If this IP, subnet or user agent has too many recent failed logins.
     '''
 
-    # Get user from database
+    # Get user from database (its shard)
+    await conn.route(_normalize_email(payload.username))
     user_row = await conn.fetchrow(
-        """
-        SELECT id, email, password_hash, is_verified, is_active,
-        failed_login_attempts, locked_until
+        f"""
+        SELECT id, email, password_hash, is_verified, is_active, is_superuser,
+        failed_login_attempts, locked_until, totp_enabled, {USER_ROLE_IDS}
         FROM users WHERE email = $1
         """,
         _normalize_email(payload.username)
     )
 
     now = datetime.now(timezone.utc)
+    ip_address = _client_ip(request)
 
     # Lockout check (only if the user exists)
     if user_row and user_row["locked_until"] and user_row["locked_until"] > now:
+        audit_log.record("login.locked", user_id=user_row["id"], email=user_row["email"], ip_address=ip_address)
+        _login_failed(request)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Account temporarily locked due to too many failed login attempts",
         )
 
-    # Validate credentials
-    if (not user_row) or (not verify_password(payload.password, user_row["password_hash"])):
+    # Validate credentials (new_hash is set when the stored hash uses an outdated BCRYPT_ROUNDS)
+    # bcrypt runs in a worker thread within the hashing budget, the event loop stays free,
+    # and the connection goes back to the pool meanwhile
+    await conn.release()
+    hashing = get_hashing_budget()
+    is_valid, new_hash = (False, None)
+    if user_row:
+        is_valid, new_hash = await hashing.run_in_thread(
+            verify_and_update_password, payload.password, user_row["password_hash"], priority=Priority.LOW
+        )
+    else:
+        await hashing.run_in_thread(dummy_verify, payload.password, priority=Priority.LOW)  # same bcrypt cost as a real check
+
+    if not is_valid:
         # If the user exists, track failed attempts and potentially lock the account.
         if user_row:
             attempts = int(user_row["failed_login_attempts"] or 0) + 1
@@ -144,6 +312,16 @@ async def token(
                 locked_until,
                 user_row["id"],
             )
+            audit_log.record(
+                "login.failed", user_id=user_row["id"], email=user_row["email"], ip_address=ip_address,
+                detail={"reason": "bad_password", "attempts": attempts, "locked": locked_until is not None},
+            )
+        else:
+            audit_log.record(
+                "login.failed", email=_normalize_email(payload.username), ip_address=ip_address,
+                detail={"reason": "unknown_email"},
+            )
+        _login_failed(request)
 
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -165,47 +343,52 @@ async def token(
             detail="Account is deactivated"
         )
 
-    # Successful login: reset lockout counters and update last_login
+    # Successful login: reset lockout counters, update last_login and
+    # transparently store the rehashed password if the cost changed
     await conn.execute(
         """
         UPDATE users
-        SET failed_login_attempts = 0, locked_until = NULL, last_login = $1
+        SET failed_login_attempts = 0, locked_until = NULL, last_login = $1,
+            password_hash = COALESCE($3, password_hash)
         WHERE id = $2
         """,
         now,
         user_row["id"],
+        new_hash,
     )
 
-    # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        {"sub": user_row["email"]},
-        expires_delta=access_token_expires
-        )
-    
-    # Create refresh token
-    refresh_token = create_refresh_token({"sub": user_row["email"]})
-
-    return TokenResponse(
-        access_token=access_token,
-        refresh_token=refresh_token,
-        token_type="bearer",
-        expires_in=int(access_token_expires.total_seconds())
-    )
+    permissions = await _permissions(conn, user_row)
 
+    # Second factor: the MFA token carries the permissions, the TOTP secret
+    # stays server-side and is read again by /2fa/verify
+    if user_row["totp_enabled"]:
+        audit_log.record("login.mfa_required", user_id=user_row["id"], email=user_row["email"], ip_address=ip_address)
+        return mfa_required_serializer.response({
+            "mfa_token": create_mfa_token({
+                "sub": user_row["email"],
+                "uid": str(user_row["id"]),
+                "perm": permissions,
+            }),
+            "expires_in": settings.MFA_TOKEN_EXPIRE_MINUTES * 60,
+        })
 
+    audit_log.record("login.success", user_id=user_row["id"], email=user_row["email"], ip_address=ip_address)
+    return _token_pair(user_row["email"], user_row["id"], permissions)
 
-@router.post("/refresh", response_model=TokenResponse)
+
+
+@router.post("/refresh", response_model=TokenResponse, dependencies=[Depends(admit(Priority.CRITICAL))])
 async def refresh_token(
+    request: Request,
     refresh_token: str = Body(..., embed=True),
-    conn: asyncpg.Connection = Depends(get_conn)
-) -> TokenResponse:
+    conn: LazyConnection = Depends(get_conn)
+) -> Response:
     '''
     Refreshes an expired access token using valid refresh token.
     
     Parameters:
         - refresh_token (str): The refresh token previously issued from the /token endpoint.
-        - conn (asyncpg.Connection): Database connection dependency.
+        - conn (LazyConnection): Database connection dependency.
 
     Responses:
         - TokenResponse: Contains a new access token, optional new refresh token, token type ("bearer"),
@@ -222,11 +405,14 @@ async def refresh_token(
         # Verify refresh token
         payload = verify_refresh_token(refresh_token)
         user_email = payload.get("sub")
+        if not user_email or not isinstance(user_email, str):
+            raise ValueError("missing subject")  # before routing: the email picks the shard
         
         # Check if user exists
+        await conn.route(user_email)
         user_row = await conn.fetchrow(
-            """
-            SELECT email, is_verified, is_active
+            f"""
+            SELECT id, email, is_verified, is_active, is_superuser, {USER_ROLE_IDS}
             FROM users
             WHERE email = $1
             """,
@@ -253,24 +439,26 @@ async def refresh_token(
                 detail="Account is deactivated"
             )
         
-        # Create new access token
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        # Create new access token, with the permissions of the user's current roles
+        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         new_access_token = create_access_token(
-            {"sub": user_email}, 
+            {"sub": user_email, "uid": str(user_row["id"]), "perm": await _permissions(conn, user_row)},
             expires_delta=access_token_expires
         )
         
         # Create new refresh token
         new_refresh_token = create_refresh_token({"sub": user_email})
+        audit_log.record("token.refresh", email=user_email, ip_address=_client_ip(request))
         
-        return TokenResponse(
-            access_token=new_access_token,
-            refresh_token=new_refresh_token,
-            token_type="bearer",
-            expires_in=int(access_token_expires.total_seconds())
-        )
+        return token_response_serializer.response({
+            "access_token": new_access_token,
+            "refresh_token": new_refresh_token,
+            "token_type": "bearer",
+            "expires_in": int(access_token_expires.total_seconds())
+        })
     
     except ValueError as e:
+        audit_log.record("token.refresh_failed", ip_address=_client_ip(request), detail={"reason": str(e)})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Invalid refresh token: {str(e)}"
@@ -278,21 +466,123 @@ async def refresh_token(
 
 
 
-@router.post("/request-verification", response_model=EmailVerificationRequestResponse)
-@router.post("/request-email-verification", response_model=EmailVerificationRequestResponse)
+async def _introspection_client(authorization: str | None = Header(None)) -> None:
+    '''Callers authenticate with `Authorization: Bearer <INTROSPECTION_SECRET>`'''
+
+    secret = settings.INTROSPECTION_SECRET
+    if not secret:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.encode(), secret.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid introspection credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@router.post(
+    "/introspect",
+    response_model=IntrospectionResponse,
+    dependencies=[Depends(admit(Priority.HIGH)), Depends(_introspection_client)],
+)
+async def introspect(
+    payload: IntrospectionRequest,
+    conn: LazyConnection = Depends(get_conn)
+) -> Response:
+    '''
+    Batch token introspection (RFC 7662 style) for gateways and downstream services.
+
+    Parameters:
+        - payload (IntrospectionRequest): Up to INTROSPECTION_MAX_TOKENS access tokens.
+
+    Responses:
+        - IntrospectionResponse: One result per token, in request order. Inactive
+            tokens only carry `"active": false`.
+
+    Raises:
+        HTTPException:
+            - 401: If the caller's introspection secret is wrong.
+            - 404: If introspection is disabled (no INTROSPECTION_SECRET).
+            - 413: If the batch is larger than INTROSPECTION_MAX_TOKENS.
+    '''
+
+    if len(payload.tokens) > settings.INTROSPECTION_MAX_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.INTROSPECTION_MAX_TOKENS} tokens per request",
+        )
+
+    # Results are built from decoded claims and our own rows, no need to validate them again
+    return ORJSONResponse({"results": await introspect_tokens(conn, payload.tokens)})
+
+
+
+async def _forward_auth_lookup(email: str):
+    async with shard_ctx(shard_for(email)) as conn:
+        return await conn.fetchrow(
+            "SELECT id, email, is_verified, is_active FROM users WHERE email = $1",
+            email,
+        )
+
+
+@router.get("/forward", responses={401: {"description": "Missing, invalid or expired access token"}})
+# proxies may forward the original method, accept them all (documented once, as GET)
+@router.api_route(
+    "/forward",
+    methods=["HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    include_in_schema=False,
+)
+async def forward_auth(request: Request) -> Response:
+    '''
+    Forward-auth check for reverse proxies (nginx `auth_request`, Traefik `forwardAuth`).
+
+    Returns an empty 200 with `X-User-Id` and `X-User-Email` headers for a
+    valid bearer access token, an empty 401 otherwise. Results are cached
+    per token digest for FORWARD_AUTH_CACHE_SECONDS, so a cache hit needs no
+    database connection, dependency resolution or body serialization.
+    '''
+
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    identity = None
+    if scheme.lower() == "bearer" and token:
+        identity = await get_forward_auth_cache().identify(token, _forward_auth_lookup)
+
+    if identity is None:
+        return Response(status_code=status.HTTP_401_UNAUTHORIZED, headers={"WWW-Authenticate": "Bearer"})
+    return Response(headers={"X-User-Id": identity[0], "X-User-Email": identity[1]})
+
+
+
+@router.post(
+    "/request-verification",
+    response_model=EmailVerificationRequestResponse,
+    dependencies=[Depends(admit(Priority.NORMAL))],
+)
+@router.post(
+    "/request-email-verification",
+    response_model=EmailVerificationRequestResponse,
+    dependencies=[Depends(admit(Priority.NORMAL))],
+)
 async def verificate_email_request(
+    request: Request,
     email: str = Body(..., embed=True),
-    conn: asyncpg.Connection = Depends(get_conn)
+    conn: LazyConnection = Depends(get_conn),
+    otp_store: OTPStore = Depends(get_otp_store)
     ) -> dict:
     '''
     Sends a one-time password (OTP) to the user's email for verification.
 
     Parameters:
         - email (EmailStr): The user's email address. Must be valid and not already verified.
-        - conn (asyncpg.Connection): Database connection dependency.
+        - conn (LazyConnection): Database connection dependency.
+        - otp_store (OTPStore): Where the OTP hash is kept (see OTP_STORE).
 
     Responses:
         - EmailVerificationRequestResponse: Contains a success message and metadata (e.g. expires_in) about the OTP request.
+            Within OTP_RESEND_COOLDOWN_SECONDS of a previous request no new OTP is sent and
+            expires_in is the remaining lifetime (minutes) of the pending one.
 
     Raises:
         HTTPException:
@@ -301,58 +591,53 @@ async def verificate_email_request(
     '''
 
     email = _normalize_email(email)
-
-    user_row = await conn.fetchrow(
-        """
-        SELECT id, email, is_verified
-        FROM users
-        WHERE email = $1
-        """,
-        email
-    )
-    
-    if not user_row:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+    await conn.route(email)
+
+    # Resend cooldown: a repeated request reports the pending OTP, no DB query and no email
+    pending_expiry = await otp_service.claim_resend(email)
+    if pending_expiry is not None:
+        return EmailVerificationRequestResponse(
+            message="Verification code already sent to your email",
+            expires_in=max(1, math.ceil((pending_expiry - time.time()) / 60))
         )
-    
-    # Check if already registered
-    if user_row["is_verified"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already verified!"
+
+    try:
+        user_row = await conn.fetchrow(
+            """
+            SELECT id, email, is_verified
+            FROM users
+            WHERE email = $1
+            """,
+            email
         )
-    
-    # Invalidate previous OTPs for this user and type
-    await conn.execute(
-        """
-        UPDATE otp_tokens
-        SET used_at = $1
-        WHERE user_id = $2 AND otp_type = $3 AND used_at IS NULL
-        """,
-        datetime.now(timezone.utc),
-        user_row["id"],
-        "email_verification",
-    )
 
-    # Generate new OTP
-    otp = OTPService.generate_otp()
-    token_hash = OTPService.hash_token(otp)
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes=settings.OTP_EXPIRE_MINUTES)
+        if not user_row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
 
-    await conn.execute(
-        """
-        INSERT INTO otp_tokens
-        (user_id, otp_type, token_hash, destination, expires_at, attempts)
-        VALUES ($1, $2, $3, $4, $5, $6)
-        """,
-        user_row["id"], "email_verification", token_hash, email, expires_at, 0
-    )
-    
-    # Send email
-    email_service = EmailService()
-    await email_service.send_verification_email(email, otp)
+        # Check if already registered
+        if user_row["is_verified"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already verified!"
+            )
+
+        # Generate a new OTP (replaces any previous one for this user)
+        otp = await otp_service.issue(otp_store, user_row["id"], email)
+        audit_log.record("otp.issued", user_id=user_row["id"], email=email, ip_address=_client_ip(request))
+
+        # Send email (the SMTP/MIME stack is imported on first use), without holding a connection
+        await conn.release()
+        from app.auth.services.mailer import EmailService
+        email_service = EmailService()
+        await email_service.send_verification_email(email, otp)
+
+    except BaseException:
+        # nothing was sent, let the next request try again right away
+        await otp_service.release_resend(email)
+        raise
 
 
     return EmailVerificationRequestResponse(
@@ -362,18 +647,21 @@ async def verificate_email_request(
 
 
 
-@router.post("/verify-email", response_model=VerifyTokenResponse)
+@router.post("/verify-email", response_model=VerifyTokenResponse, dependencies=[Depends(admit(Priority.NORMAL))])
 async def verify_email(
+    request: Request,
     payload: VerifyEmailRequest,
-    conn: asyncpg.Connection = Depends(get_conn),
+    conn: LazyConnection = Depends(get_conn),
+    otp_store: OTPStore = Depends(get_otp_store),
 ) -> VerifyTokenResponse:
     '''
     Verify a user's email using the OTP previously generated through /request-email-verification.
 
-    this endpoint fetches the stored OTP hash from the database (never from the client),
+    this endpoint fetches the stored OTP hash from the OTP store (never from the client),
     validates the OTP format/length, enforces expiry/max-attempts, and marks the user verified.
     '''
 
+    await conn.route(_normalize_email(payload.email))
     user_row = await conn.fetchrow(
         "SELECT id, is_verified FROM users WHERE email = $1",
         payload.email,
@@ -384,76 +672,37 @@ async def verify_email(
     if user_row["is_verified"]:
         return VerifyTokenResponse(success=True, message="Email already verified")
 
-    now = datetime.now(timezone.utc)
-    token_row = await conn.fetchrow(
-        """
-        SELECT id, token_hash, expires_at, attempts, used_at
-        FROM otp_tokens
-        WHERE user_id = $1
-          AND otp_type = $2
-          AND destination = $3
-          AND used_at IS NULL
-        ORDER BY created_at DESC
-        LIMIT 1
-        """,
-        user_row["id"],
-        "email_verification",
-        payload.email,
+    try:
+        result = await otp_service.verify(otp_store, user_row["id"], payload.email, payload.otp)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    audit_log.record(
+        "otp.verified" if result is OTPCheck.VALID else "otp.failed",
+        user_id=user_row["id"], email=payload.email, ip_address=_client_ip(request),
+        detail=None if result is OTPCheck.VALID else {"reason": result.value},
     )
 
-    if not token_row:
+    if result is OTPCheck.NOT_FOUND:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No active verification token found",
         )
-
-    if token_row["expires_at"] <= now:
-        # Mark as used so it can't be replayed.
-        await conn.execute(
-            "UPDATE otp_tokens SET used_at = $1 WHERE id = $2",
-            now,
-            token_row["id"],
-        )
+    if result is OTPCheck.EXPIRED:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Verification token expired")
-
-    attempts = int(token_row["attempts"] or 0)
-    if attempts >= settings.OTP_MAX_ATTEMPTS:
-        await conn.execute(
-            "UPDATE otp_tokens SET used_at = $1 WHERE id = $2",
-            now,
-            token_row["id"],
-        )
+    if result is OTPCheck.TOO_MANY_ATTEMPTS:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Too many attempts")
-
-    try:
-        is_valid = otp_service.verify_input_token(
-            payload.otp,
-            token_row["token_hash"],
-            expected_length=settings.OTP_LENGTH,
-        )
-    except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-
-    if not is_valid:
-        await conn.execute(
-            "UPDATE otp_tokens SET attempts = attempts + 1 WHERE id = $1",
-            token_row["id"],
-        )
+    if result is OTPCheck.INVALID:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    # Mark token used and user verified
-    await conn.execute(
-        "UPDATE otp_tokens SET used_at = $1 WHERE id = $2",
-        now,
-        token_row["id"],
-    )
+    # OTP consumed, mark user verified
     await conn.execute(
         """
         UPDATE users
         SET is_verified = true, email_verified_at = $1
         WHERE id = $2
         """,
-        now,
+        datetime.now(timezone.utc),
         user_row["id"],
     )
     return VerifyTokenResponse(success=True, message="Email verified successfully")
@@ -462,13 +711,13 @@ async def verify_email(
 @router.post("/logout")
 async def logout_user(
 
-    current_user: dict = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     ) -> dict:
     '''
     Logout authenticated user.
 
     Parameters:
-        - current_user (dict): The authenticated user extracted from the JWT access token.
+        - current_user (Principal): The authenticated user extracted from the JWT access token.
     
     Responses:
         - dict: A confirmation message with a logout timestamp.
@@ -477,4 +726,211 @@ async def logout_user(
     return {
         "message": f"User {current_user['email']}, logged out successfully",
         "timestamp": datetime.now(timezone.utc).isoformat()
-    }
\ No newline at end of file
+    }
+
+
+@router.post("/password", response_model=VerifyTokenResponse, dependencies=[Depends(admit(Priority.LOW))])
+async def change_password(
+    payload: PasswordChangeRequest,
+    request: Request,
+    user_id: UUID = Depends(get_current_user_id),
+    conn: LazyConnection = Depends(get_conn)
+) -> VerifyTokenResponse:
+    '''
+    Change the current user's password.
+
+    Raises:
+        HTTPExeption:
+            - 400: If the current password is wrong, or the new one is known from a data breach.
+            - 401: If the token's user is gone or inactive.
+    '''
+
+    # Before any DB or bcrypt work
+    _reject_breached(payload.new_password)
+
+    row = await conn.fetchrow(f"SELECT email, password_hash FROM users WHERE id = $1 AND {ACTIVE_USER}", user_id)
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    await conn.release()
+    hashing = get_hashing_budget()
+    if not await hashing.run_in_thread(verify_password, payload.current_password, row["password_hash"], priority=Priority.LOW):
+        audit_log.record(
+            "password.change_failed", user_id=user_id, email=row["email"], ip_address=_client_ip(request),
+            detail={"reason": "bad_password"},
+        )
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Current password is incorrect")
+    password_hash = await hashing.run_in_thread(hash_password, payload.new_password, priority=Priority.LOW)
+
+    await conn.execute("UPDATE users SET password_hash = $1 WHERE id = $2", password_hash, user_id)
+    audit_log.record("password.changed", user_id=user_id, email=row["email"], ip_address=_client_ip(request))
+    return VerifyTokenResponse(success=True, message="Password changed")
+
+
+
+# Past the password step already: shed after fresh logins
+@router.post("/2fa/verify", response_model=TokenResponse, dependencies=[Depends(admit(Priority.HIGH))])
+async def verify_two_factor(
+    payload: MFAVerifyRequest,
+    request: Request,
+    conn: LazyConnection = Depends(get_conn)
+) -> Response:
+    '''
+    Second login step for users with 2FA: exchanges the mfa_token from /token
+    and a current TOTP code for the token pair.
+
+    Raises:
+        HTTPException:
+            - 400: If the code format is invalid.
+            - 401: If the MFA token is invalid or expired, the user is no longer active
+                or has disabled 2FA, or the code is wrong or already used.
+            - 429: If too many wrong codes were sent for this user.
+    '''
+
+    try:
+        claims = verify_mfa_token(payload.mfa_token)
+        user_id = UUID(claims["uid"])
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+
+    # The secret is read by user id, it never leaves the server
+    await conn.route(claims["sub"])
+    row = await _totp_state(conn, user_id)
+    await conn.release()
+    if not row["totp_enabled"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Two-factor authentication is not enabled")
+
+    # Counted per user in the OTP_STORE key-value store (shared across workers with
+    # OTP_STORE=shared), so a fresh MFA token does not reset the budget. The attempt
+    # is reserved before the code is checked (INCR is atomic): concurrent codes cannot overshoot it.
+    kv = get_kv_client()
+    attempts_key = f"mfa:attempts:{user_id}"
+    await kv.set(attempts_key, 0, ex=settings.MFA_TOKEN_EXPIRE_MINUTES * 60, nx=True)  # TTL set once, INCR keeps it
+    if await kv.incr(attempts_key) > settings.MAX_LOGIN_ATTEMPTS:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many attempts")
+
+    try:
+        is_valid = await get_totp_verifier().verify(claims["uid"], row["totp_secret"], payload.code)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if not is_valid:
+        audit_log.record("mfa.failed", user_id=user_id, email=claims["sub"], ip_address=_client_ip(request))
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication code")
+    await kv.delete(attempts_key)
+
+    audit_log.record("login.success", user_id=user_id, email=claims["sub"], ip_address=_client_ip(request),
+                     detail={"mfa": True})
+    return _token_pair(claims["sub"], claims["uid"], claims.get("perm", 0))
+
+
+@router.post("/2fa/enroll", response_model=TOTPEnrollResponse)
+async def enroll_two_factor(
+    current_user: Principal = Depends(get_current_user),
+    conn: LazyConnection = Depends(get_conn)
+) -> TOTPEnrollResponse:
+    '''
+    Start 2FA enrollment: stores a new encrypted TOTP secret and returns it
+    with an otpauth:// URI for authenticator apps. 2FA is enabled only once
+    a code is confirmed through /2fa/confirm.
+    '''
+
+    secret = generate_secret()
+    result = await conn.execute(
+        "UPDATE users SET totp_secret = $1 WHERE id = $2 AND NOT totp_enabled",
+        encrypt_secret(secret),
+        current_user["id"],
+    )
+    if result != "UPDATE 1":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Two-factor authentication already enabled"
+        )
+
+    return TOTPEnrollResponse(secret=secret, otpauth_uri=provisioning_uri(secret, current_user["email"]))
+
+
+async def _check_totp(user_id, ciphertext: str | None, code: str) -> None:
+    try:
+        is_valid = ciphertext is not None and await get_totp_verifier().verify(str(user_id), ciphertext, code)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not is_valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication code")
+
+
+async def _totp_state(conn, user_id: UUID):
+    '''2FA columns of the token's user, doubling as the active-user check (one query instead of two)'''
+    row = await conn.fetchrow(
+        f"SELECT email, totp_secret, totp_enabled FROM users WHERE id = $1 AND {ACTIVE_USER}",
+        user_id,
+    )
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return row
+
+
+@router.post("/2fa/confirm", response_model=VerifyTokenResponse)
+async def confirm_two_factor(
+    payload: TOTPCodeRequest,
+    user_id: UUID = Depends(get_current_user_id),
+    conn: LazyConnection = Depends(get_conn)
+) -> VerifyTokenResponse:
+    '''Finish enrollment: enables 2FA once the user proves their app generates valid codes'''
+
+    row = await _totp_state(conn, user_id)
+    if row["totp_enabled"]:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Two-factor authentication already enabled")
+    if not row["totp_secret"]:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Start enrollment first")
+
+    await _check_totp(user_id, row["totp_secret"], payload.code)
+
+    await conn.execute("UPDATE users SET totp_enabled = true WHERE id = $1", user_id)
+    audit_log.record("mfa.enabled", user_id=user_id, email=row["email"])
+    return VerifyTokenResponse(success=True, message="Two-factor authentication enabled")
+
+
+@router.post("/2fa/disable", response_model=VerifyTokenResponse)
+async def disable_two_factor(
+    payload: TOTPCodeRequest,
+    user_id: UUID = Depends(get_current_user_id),
+    conn: LazyConnection = Depends(get_conn)
+) -> VerifyTokenResponse:
+    '''Disable 2FA and drop the secret, requires a current code'''
+
+    row = await _totp_state(conn, user_id)
+    if not row["totp_enabled"]:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Two-factor authentication is not enabled")
+
+    await _check_totp(user_id, row["totp_secret"], payload.code)
+
+    await conn.execute("UPDATE users SET totp_enabled = false, totp_secret = NULL WHERE id = $1", user_id)
+    get_totp_verifier().forget(str(user_id))
+    audit_log.record("mfa.disabled", user_id=user_id, email=row["email"])
+    return VerifyTokenResponse(success=True, message="Two-factor authentication disabled")
+
+
+@router.get(
+    "/stuffing/heavy-hitters",
+    response_model=HeavyHittersResponse,
+    dependencies=[Depends(get_current_user), Depends(require_permission(Permission.SECURITY_READ))],
+)
+async def stuffing_heavy_hitters(limit: int = Query(20, ge=1, le=1000)) -> HeavyHittersResponse:
+    '''
+    Sources with the most recent failed logins (IPs, subnets, user agents), as
+    seen by the worker serving this request, with the action each one gets.
+    '''
+
+    detector = get_stuffing_detector()
+    if detector is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Credential-stuffing detection is disabled")
+    return HeavyHittersResponse(half_life_seconds=settings.STUFFING_HALF_LIFE_SECONDS, **detector.heavy_hitters(limit))
@@ -1,5 +1,10 @@
+from typing import Literal
+from uuid import UUID
+
 from pydantic import BaseModel, Field, field_validator
 
+from app.core.responses import ModelSerializer
+
 
 # User registration input validation
 class RegisterRequest(BaseModel):
@@ -27,6 +32,21 @@ class RegisterRequest(BaseModel):
     }
 
 
+class PasswordChangeRequest(BaseModel):
+    current_password: str
+    new_password: str = Field(..., min_length=8, max_length=72)
+
+    @field_validator("new_password")
+    @classmethod
+    def validate_password(cls, v: str) -> str:
+        v = v.strip()
+        if len(v) < 8 or len(v) > 72:
+            raise ValueError("Password must be between 8 and 72 chars long")
+        return v
+
+    model_config = {"extra": "forbid"}
+
+
 # Authentication token response
 class TokenResponse(BaseModel):
     access_token: str
@@ -35,6 +55,36 @@ class TokenResponse(BaseModel):
     expires_in: int | None = None
 
 
+token_response_serializer = ModelSerializer(TokenResponse)
+
+
+# Returned by /token instead of tokens when the user has 2FA enabled
+class MFARequiredResponse(BaseModel):
+    mfa_required: bool = True
+    mfa_token: str
+    token_type: str = "mfa"
+    expires_in: int
+
+
+mfa_required_serializer = ModelSerializer(MFARequiredResponse)
+
+
+class MFAVerifyRequest(BaseModel):
+    mfa_token: str
+    code: str = Field(..., min_length=1, max_length=16)
+
+    model_config = {"extra": "forbid"}
+
+
+class TOTPCodeRequest(BaseModel):
+    code: str = Field(..., min_length=1, max_length=16)
+
+
+class TOTPEnrollResponse(BaseModel):
+    secret: str
+    otpauth_uri: str
+
+
 class LoginRequest(BaseModel):
     username: str
     password: str
@@ -42,6 +92,19 @@ class LoginRequest(BaseModel):
     model_config = {"extra": "forbid"}
 
 
+class HeavyHitter(BaseModel):
+    key: str
+    count: float  # decayed failed logins
+    action: Literal["allow", "slow", "block"]
+
+
+class HeavyHittersResponse(BaseModel):
+    half_life_seconds: float
+    ip: list[HeavyHitter]
+    subnet: list[HeavyHitter]
+    user_agent: list[HeavyHitter]
+
+
 class EmailVerificationRequestResponse(BaseModel):
     message: str
     expires_in: int
@@ -54,4 +117,26 @@ class VerifyTokenResponse(BaseModel):
 
 class VerifyEmailRequest(BaseModel):
     email: str
-    otp: str = Field(..., min_length=1, max_length=32)
\ No newline at end of file
+    otp: str = Field(..., min_length=1, max_length=32)
+
+
+class IntrospectionRequest(BaseModel):
+    tokens: list[str] = Field(..., min_length=1)
+
+    model_config = {"extra": "forbid"}
+
+
+# RFC 7662 fields; only "active" is present for inactive tokens
+class IntrospectionResult(BaseModel):
+    active: bool
+    token_type: str | None = None
+    sub: str | None = None
+    username: str | None = None
+    user_id: UUID | None = None
+    exp: int | None = None
+    iat: int | None = None
+    jti: str | None = None
+
+
+class IntrospectionResponse(BaseModel):
+    results: list[IntrospectionResult]
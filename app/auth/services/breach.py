@@ -0,0 +1,174 @@
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from functools import lru_cache
+from typing import Iterable, TextIO
+
+from app.core.config import settings
+
+
+# File layout (little endian):
+#   header   MAGIC, key width (u32), reserved (u32), entry count (u64)
+#   fan-out  65536 x u64: entries whose first two SHA-1 bytes are <= i
+#   entries  sorted, `width` bytes each: SHA-1 bytes 2..2+width (the first two are implied by the fan-out bucket)
+MAGIC = b"BRCHIDX1"
+HEADER = struct.Struct("<8sIIQ")
+FANOUT_SIZE = 1 << 16
+FANOUT = struct.Struct(f"<{FANOUT_SIZE}Q")
+DATA_OFFSET = HEADER.size + FANOUT.size
+
+# 2 + 8 bytes = 80 bits of SHA-1: a billion entries give ~1e-15 false positives per lookup
+DEFAULT_WIDTH = 8
+
+
+class BreachedPasswords:
+    '''
+    Read-only index of breached password SHA-1s, memory-mapped.
+
+    A lookup reads one fan-out slot pair and binary searches its bucket
+    (n / 65536 entries), so it touches a handful of pages. The OS page cache
+    holds the file, the process RSS only grows by the pages actually read.
+    '''
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.width, _, self.count = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or not 1 <= self.width <= 18:
+                raise ValueError(f"{path} is not a breached password index")
+            if len(self._mm) != DATA_OFFSET + self.count * self.width:
+                raise ValueError(f"{path} is truncated or corrupt")
+        except (ValueError, struct.error):
+            self._mm.close()
+            raise
+        if hasattr(self._mm, "madvise"):
+            self._mm.madvise(mmap.MADV_RANDOM)  # lookups are random, readahead only wastes cache
+
+    def _bucket(self, prefix: int) -> tuple[int, int]:
+        end = struct.unpack_from("<Q", self._mm, HEADER.size + prefix * 8)[0]
+        start = struct.unpack_from("<Q", self._mm, HEADER.size + (prefix - 1) * 8)[0] if prefix else 0
+        return start, end
+
+    def contains_digest(self, digest: bytes) -> bool:
+        lo, hi = self._bucket(int.from_bytes(digest[:2], "big"))
+        key, width, mm = digest[2:2 + self.width], self.width, self._mm
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = DATA_OFFSET + mid * width
+            entry = mm[offset:offset + width]
+            if entry < key:
+                lo = mid + 1
+            elif entry > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __contains__(self, password: str) -> bool:
+        return self.contains_digest(hashlib.sha1(password.encode("utf-8")).digest())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+@lru_cache
+def get_breach_index() -> BreachedPasswords | None:
+    '''The configured index, opened on first use. None disables the check.'''
+    if not settings.BREACHED_PASSWORDS_FILE:
+        return None
+    return BreachedPasswords(settings.BREACHED_PASSWORDS_FILE)
+
+
+def is_breached(password: str) -> bool:
+    index = get_breach_index()
+    return index is not None and password in index
+
+
+def parse_dump(lines: Iterable[str], min_count: int = 1) -> Iterable[bytes]:
+    '''
+    SHA-1 digests from "HEX[:COUNT]" lines (the Have I Been Pwned format).
+    Lines seen fewer than `min_count` times are skipped, lines without a count always kept.
+    '''
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        hex_digest, _, count = line.partition(":")
+        if count and min_count > 1 and int(count) < min_count:
+            continue
+        try:
+            digest = bytes.fromhex(hex_digest)
+        except ValueError:
+            digest = b""
+        if len(digest) != 20:
+            raise ValueError(f"line {number}: not a SHA-1 hash")
+        yield digest
+
+
+def build_index(digests: Iterable[bytes], path: str, width: int = DEFAULT_WIDTH) -> int:
+    '''
+    Write an index from digests sorted by hash (the order of the
+    "ordered by hash" dump), in one streaming pass. Returns the entry count.
+    '''
+    if not 1 <= width <= 18:
+        raise ValueError("width must be between 1 and 18 bytes")
+
+    fanout = [0] * FANOUT_SIZE
+    count, previous = 0, b""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as out:
+        out.seek(DATA_OFFSET)
+        for digest in digests:
+            stored = digest[:2 + width]
+            if stored < previous:
+                raise ValueError("Input is not sorted by hash, use the ordered-by-hash dump or sort it first")
+            if stored == previous:
+                continue  # duplicate once truncated
+            out.write(stored[2:])
+            fanout[int.from_bytes(stored[:2], "big")] += 1
+            count, previous = count + 1, stored
+
+        total = 0
+        for prefix, bucket in enumerate(fanout):
+            total += bucket
+            fanout[prefix] = total
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, width, 0, count))
+        out.write(FANOUT.pack(*fanout))
+    os.replace(tmp_path, path)
+    return count
+
+
+def main(argv: list[str] | None = None, stdin: TextIO | None = None) -> None:
+    '''python -m app.auth.services.breach pwned-passwords-sha1-ordered-by-hash.txt breached.idx'''
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.auth.services.breach",
+        description="Build the BREACHED_PASSWORDS_FILE index from a SHA-1 password dump sorted by hash",
+    )
+    parser.add_argument("source", help='"HEX:COUNT" text dump, "-" for stdin')
+    parser.add_argument("output", help="index file to write")
+    parser.add_argument("--min-count", type=int, default=1, help="skip hashes seen fewer times (smaller index)")
+    parser.add_argument(
+        "--width", type=int, default=DEFAULT_WIDTH, help=f"bytes stored per hash after the 2-byte prefix (default: {DEFAULT_WIDTH})"
+    )
+    args = parser.parse_args(argv)
+
+    if args.source == "-":
+        count = build_index(parse_dump(stdin or sys.stdin, args.min_count), args.output, args.width)
+    else:
+        with open(args.source, encoding="ascii") as source:
+            count = build_index(parse_dump(source, args.min_count), args.output, args.width)
+    print(f"{count} hashes, {DATA_OFFSET + count * args.width} bytes -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import math
+from collections.abc import Callable, Sequence
+from datetime import datetime, timedelta
+from hashlib import blake2b
+
+from app.core.config import settings
+from app.db.connection import shard_for
+
+
+logger = logging.getLogger("app.auth.email_filter")
+
+
+class BloomFilter:
+    '''
+    Fixed-size Bloom filter over strings.
+
+    Never gives false negatives: `item in bloom` is False only for items
+    that were never added. False positives happen at about `error_rate`
+    once `capacity` items are stored.
+    '''
+
+    __slots__ = ("size", "hash_count", "bits", "count")
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % size
+
+    def add(self, item: str) -> None:
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class EmailFilter:
+    '''
+    Negative cache of registered emails, used to answer "definitely not
+    registered" without touching the database.
+
+    The filter is built from a streamed scan of `users`, receives local
+    registrations through `add()`, picks up registrations made by other
+    workers through a periodic incremental sync (by `created_at`) and is
+    rebuilt from scratch periodically so it does not fill up. Until the
+    first build finishes every email is reported as possibly registered.
+    '''
+
+    def __init__(self, capacity: int | None = None, error_rate: float | None = None) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom: BloomFilter | None = None
+        self._watermark: datetime | None = None
+        self._pending: list[str] | None = None  # registrations seen while a rebuild is running
+
+    @property
+    def ready(self) -> bool:
+        return self._bloom is not None
+
+    def might_exist(self, email: str) -> bool:
+        '''False only if the email is definitely not registered'''
+        bloom = self._bloom
+        return bloom is None or email in bloom
+
+    def add(self, email: str) -> None:
+        if self._bloom is not None:
+            self._bloom.add(email)
+        if self._pending is not None:
+            self._pending.append(email)
+
+    async def rebuild(self, conn) -> int:
+        '''Build a fresh filter from a streamed scan of all emails, then swap it in'''
+
+        estimated = await conn.fetchval(
+            "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = 'users'"
+        ) or 0
+        capacity = max(self.capacity or settings.EMAIL_FILTER_CAPACITY, int(estimated * 1.5))
+        bloom = BloomFilter(capacity, self.error_rate or settings.EMAIL_FILTER_ERROR_RATE)
+
+        self._pending = []
+        watermark = self._watermark
+        try:
+            async with conn.transaction():
+                async for row in conn.cursor("SELECT email, created_at FROM users", prefetch=5000):
+                    bloom.add(row["email"])
+                    if watermark is None or row["created_at"] > watermark:
+                        watermark = row["created_at"]
+
+            for email in self._pending:
+                bloom.add(email)
+        finally:
+            self._pending = None
+
+        self._bloom = bloom
+        self._watermark = watermark
+        return bloom.count
+
+    async def sync(self, conn) -> int:
+        '''
+        Add users created since the last scan (registrations on other workers).
+
+        `created_at` is stamped at transaction start, not at commit, so rows
+        can become visible behind the watermark. Each sync re-reads an overlap
+        of EMAIL_FILTER_SYNC_OVERLAP_SECONDS; adding an email twice is harmless.
+        '''
+
+        if self._bloom is None:
+            return await self.rebuild(conn)
+
+        if self._watermark:
+            since = self._watermark - timedelta(seconds=settings.EMAIL_FILTER_SYNC_OVERLAP_SECONDS)
+            rows = await conn.fetch(
+                "SELECT email, created_at FROM users WHERE created_at >= $1 ORDER BY created_at", since
+            )
+        else:
+            rows = await conn.fetch("SELECT email, created_at FROM users ORDER BY created_at")
+
+        for row in rows:
+            self._bloom.add(row["email"])
+        if rows and (self._watermark is None or rows[-1]["created_at"] > self._watermark):
+            self._watermark = rows[-1]["created_at"]
+        return len(rows)
+
+    async def run(self, connect) -> None:
+        '''
+        Background loop: build, then sync every EMAIL_FILTER_SYNC_SECONDS and
+        rebuild every EMAIL_FILTER_REBUILD_SECONDS. `connect` is one shard's (shard_connectors()).
+        '''
+
+        loop = asyncio.get_running_loop()
+        next_rebuild = 0.0
+        while True:
+            try:
+                async with connect() as conn:
+                    if loop.time() >= next_rebuild:
+                        count = await self.rebuild(conn)
+                        next_rebuild = loop.time() + settings.EMAIL_FILTER_REBUILD_SECONDS
+                        logger.info("email filter rebuilt with %d emails", count)
+                    else:
+                        await self.sync(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("email filter refresh failed")
+            await asyncio.sleep(settings.EMAIL_FILTER_SYNC_SECONDS)
+
+
+class ShardedEmailFilter:
+    '''
+    One EmailFilter per user shard, each built from its own shard, so an
+    email is only looked up in the filter of the shard it routes to.
+    Until `run()` has built them, every email may exist.
+    '''
+
+    def __init__(self) -> None:
+        self.filters: list[EmailFilter] = []
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.filters) and all(f.ready for f in self.filters)
+
+    def _filter(self, email: str) -> EmailFilter | None:
+        if not self.filters:
+            return None
+        return self.filters[shard_for(email) if len(self.filters) > 1 else 0]
+
+    def might_exist(self, email: str) -> bool:
+        '''False only if the email is definitely not registered'''
+        email_filter = self._filter(email)
+        return email_filter is None or email_filter.might_exist(email)
+
+    def add(self, email: str) -> None:
+        email_filter = self._filter(email)
+        if email_filter is not None:
+            email_filter.add(email)
+
+    async def run(self, connects: Sequence[Callable]) -> None:
+        '''Background refresh of every shard's filter. `connects` is shard_connectors().'''
+        self.filters = [EmailFilter() for _ in connects]
+        await asyncio.gather(*(f.run(connect) for f, connect in zip(self.filters, connects)))
+
+
+email_filter = ShardedEmailFilter()
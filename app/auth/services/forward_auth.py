@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from functools import lru_cache
+from hashlib import blake2b
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.security import verify_token
+
+
+Identity = tuple[str, str]  # (user id, email)
+_MISSING = object()
+_RETRY = object()  # the leading request was cancelled, waiters look up themselves
+
+
+class ForwardAuthCache:
+    '''
+    Token -> identity micro-cache for the forward-auth endpoint.
+
+    Entries are keyed by a blake2b digest of the token (the raw token is
+    never kept), live for at most `ttl` seconds and never beyond the token's
+    own expiry. Rejections are cached too, so a flood of bad tokens does
+    not reach the database. Concurrent misses for one token share a single
+    lookup. Per process: a deactivated user stays authorized for up to
+    `ttl` seconds.
+    '''
+
+    def __init__(
+            self,
+            ttl: float | None = None,
+            max_entries: int | None = None,
+            clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.ttl = ttl or settings.FORWARD_AUTH_CACHE_SECONDS
+        self._cache = TTLCache(
+            default_ttl=self.ttl,
+            max_entries=max_entries or settings.FORWARD_AUTH_CACHE_SIZE,
+            clock=clock,
+        )
+        self._inflight: dict[bytes, asyncio.Future] = {}
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+    async def identify(self, token: str, lookup: Callable[[str], Awaitable]) -> Identity | None:
+        '''
+        Identity for an access token, None if it must be rejected.
+        `lookup(email)` returns the user row (id, email, is_verified, is_active) or None.
+        '''
+
+        key = self.digest(token)
+        while True:
+            cached = self._cache.get(key, _MISSING)
+            if cached is not _MISSING:
+                return cached
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            identity = await asyncio.shield(pending)
+            if identity is not _RETRY:
+                return identity
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            identity, ttl = await self._resolve(token, lookup)
+        except asyncio.CancelledError:
+            # Our own request went away (client disconnect), not the lookup:
+            # the waiters' requests are fine, let them run their own
+            future.set_result(_RETRY)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved: waiters re-raise it, nobody else has to
+            raise
+        finally:
+            del self._inflight[key]
+
+        if ttl > 0:
+            self._cache.set(key, identity, ttl)
+        future.set_result(identity)
+        return identity
+
+    async def _resolve(self, token: str, lookup) -> tuple[Identity | None, float]:
+        try:
+            payload = verify_token(token)
+        except ValueError:
+            return None, self.ttl
+
+        email = payload.get("sub")
+        # refresh and MFA tokens carry a "type" claim, access tokens do not
+        if not email or payload.get("type"):
+            return None, self.ttl
+
+        ttl = self.ttl
+        if payload.get("exp"):
+            ttl = min(ttl, payload["exp"] - time.time())
+
+        row = await lookup(email)
+        if row is None or not row["is_verified"] or not row["is_active"]:
+            return None, ttl
+        return (str(row["id"]), row["email"]), ttl
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+@lru_cache
+def get_forward_auth_cache() -> ForwardAuthCache:
+    '''Process-wide cache, built on first use from the FORWARD_AUTH_* settings'''
+    return ForwardAuthCache()
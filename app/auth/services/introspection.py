@@ -0,0 +1,67 @@
+from app.core.security import verify_token
+from app.db.connection import shard_for
+
+
+INACTIVE = {"active": False}
+
+
+async def introspect_tokens(conn, tokens: list[str]) -> list[dict]:
+    '''
+    RFC 7662 style introspection of a batch of access tokens.
+
+    Every distinct token is decoded once with `verify_token`, then all
+    distinct subjects are resolved with a single `email = ANY($1)` query
+    per shard holding any of them. `conn` is the request's LazyConnection.
+    Results come back in input order: `{"active": false}` for invalid,
+    expired, non-access tokens and unknown, unverified or inactive users,
+    otherwise the token claims plus the user id.
+    '''
+
+    claims: dict[str, dict | None] = {}
+    for token in tokens:
+        if token in claims:
+            continue
+        try:
+            payload = verify_token(token)
+        except ValueError:
+            payload = None
+        # refresh and MFA tokens carry a "type" claim, access tokens do not
+        if payload is not None and (payload.get("type") or not payload.get("sub")):
+            payload = None
+        claims[token] = payload
+
+    by_shard: dict[int, list[str]] = {}
+    for email in {payload["sub"] for payload in claims.values() if payload is not None}:
+        by_shard.setdefault(shard_for(email), []).append(email)
+
+    users = {}
+    for shard, emails in by_shard.items():
+        await conn.use_shard(shard)
+        rows = await conn.fetch(
+            """
+            SELECT id, email, is_verified, is_active
+            FROM users
+            WHERE email = ANY($1::text[])
+            """,
+            emails,
+        )
+        users.update((row["email"], row) for row in rows if row["is_verified"] and row["is_active"])
+
+    results = []
+    for token in tokens:
+        payload = claims[token]
+        user = users.get(payload["sub"]) if payload is not None else None
+        if user is None:
+            results.append(INACTIVE)
+            continue
+        results.append({
+            "active": True,
+            "token_type": "access_token",
+            "sub": payload["sub"],
+            "username": user["email"],
+            "user_id": user["id"],
+            "exp": payload.get("exp"),
+            "iat": payload.get("iat"),
+            "jti": payload.get("jti"),
+        })
+    return results
@@ -1,3 +1,4 @@
+import uuid
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from app.core.config import settings
@@ -44,4 +45,32 @@ def verify_refresh_token(token: str) -> dict:
     except JWTError as e:
         raise ValueError(
             f"Invalid refresh token {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+def create_mfa_token(data: dict, expire_delta: timedelta | None = None) -> str:
+    '''Short-lived token proving the password step, exchanged at /auth/2fa/verify'''
+
+    to_encode = data.copy()
+    expire = datetime.now(timezone.utc) + (expire_delta or timedelta(minutes=settings.MFA_TOKEN_EXPIRE_MINUTES))
+
+    to_encode.update({
+        "exp": expire,
+        "iat": datetime.now(timezone.utc),
+        "jti": str(uuid.uuid4()),
+        "type": "mfa"
+    })
+
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def verify_mfa_token(token: str) -> dict:
+    '''Verify MFA token signature, expiration and type'''
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError as e:
+        raise ValueError(f"Invalid MFA token {str(e)}")
+
+    if payload.get("type") != "mfa":
+        raise ValueError("Not an MFA token")
+    return payload
@@ -0,0 +1,57 @@
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from aiosmtplib import SMTP
+
+from app.core.template_engine import get_template_env
+from app.core.config import settings
+
+
+class EmailService:
+    '''
+    Service class for sending verification emails using SMTP and Jinja2 templates.
+
+    This class handles rendering email templates and sending them to users and verification input token.
+    '''
+
+    async def send_verification_email(
+            self,
+            to: str,
+            otp: str
+        ) -> None:
+        
+        # Render templates (HTML & text)
+        env = get_template_env()
+        html_template = env.get_template("email/verify_email.html")
+        text_template = env.get_template("email/verify_email.txt")
+        
+        html_body = html_template.render(
+            user_name=to.split("@")[0],
+            otp=otp,
+            expire_minutes=settings.OTP_EXPIRE_MINUTES
+        )
+
+        text_body = text_template.render(
+            user_name=to.split("@")[0],
+            otp=otp,
+            expire_minutes=settings.OTP_EXPIRE_MINUTES
+        )
+
+        '''Create the email message'''
+        subject = "Verify Your Email Address"
+        message = MIMEMultipart("alternative")  # Use plain text if HTML not supported
+        message["Subject"] = subject
+        message["From"] = settings.FROM_EMAIL
+        message["To"] = to
+
+        message.attach(MIMEText(html_body, "html"))
+        message.attach(MIMEText(text_body, "plain"))
+
+        async with SMTP(
+            hostname=settings.SMTP_SERVER,
+            port=settings.SMTP_PORT,
+            start_tls=True
+            ) as smtp:
+
+            await smtp.connect()  # Connect to server
+            await smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+            await smtp.send_message(message)
\ No newline at end of file
@@ -1,19 +1,42 @@
 import hashlib
+import hmac
 import secrets
-from aiosmtplib import SMTP
+import time
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from functools import lru_cache
+from uuid import UUID
 
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from app.core.template_engine import env
 from app.core.config import settings
+from app.auth.services.otp_store import OTPRecord, OTPStore, get_kv_client
+
+
+EMAIL_VERIFICATION = "email_verification"
+
+
+class OTPCheck(str, Enum):
+    '''Outcome of an OTP verification'''
+    VALID = "valid"
+    NOT_FOUND = "not_found"
+    EXPIRED = "expired"
+    TOO_MANY_ATTEMPTS = "too_many_attempts"
+    INVALID = "invalid"
+
+
+@lru_cache
+def _derivation_key() -> bytes:
+    secret = settings.OTP_SECRET or settings.SECRET_KEY
+    # domain-separated so the key never equals the JWT signing key
+    return hmac.new(secret.encode("utf-8"), b"authpad-otp-derivation", hashlib.sha256).digest()
 
 
 class OTPService:
 
     @staticmethod
-    def generate_otp(length: int = settings.OTP_LENGTH) -> str:
+    def generate_otp(length: int | None = None) -> str:
         '''Generate numeric OTP'''
 
+        length = length or settings.OTP_LENGTH
         digits = "0123456789"
         return "".join(secrets.choice(digits) for _ in range(length))
 
@@ -32,70 +55,193 @@ class OTPService:
         return hashed
     
 
+    @staticmethod
+    def check_format(input_token: str, expected_length: int) -> None:
+        if not input_token.isdigit():
+            raise ValueError("Token must contain only digits")
+
+        if len(input_token) != expected_length:
+            raise ValueError(f"Token must be exactly {expected_length} digits long")
+
+
+    @staticmethod
+    def otp_window(now: float | None = None) -> int:
+        '''Index of the current derived-OTP time window (OTP_EXPIRE_MINUTES long)'''
+        step = settings.OTP_EXPIRE_MINUTES * 60
+        return int((time.time() if now is None else now) // step)
+
+
+    @staticmethod
+    def derive_otp(
+            user_id: UUID,
+            otp_type: str,
+            destination: str,
+            window: int,
+            length: int | None = None
+    ) -> str:
+        '''
+        TOTP-style code: HMAC-SHA256 over (user id, purpose, destination, window)
+        with the server secret, dynamically truncated to `length` digits.
+        '''
+
+        length = length or settings.OTP_LENGTH
+        message = f"{user_id}:{otp_type}:{destination}:{window}".encode("utf-8")
+        digest = hmac.new(_derivation_key(), message, hashlib.sha256).digest()
+        offset = digest[-1] & 0x0F
+        code = int.from_bytes(digest[offset:offset + 4], "big") & 0x7FFFFFFF
+        return str(code % 10 ** length).zfill(length)
+
+
     @staticmethod
     def verify_input_token(
             input_token: str,
             stored_hash: str,
-            expected_length: int = settings.OTP_LENGTH
+            expected_length: int | None = None
     ) -> bool:
         '''Validates the format of the input token and compares its hash with the stored hash'''
-        
-        if not input_token.isdigit():
-            raise ValueError("Token must contain only digits")
-            
-        if len(input_token) != expected_length:
-            raise ValueError(f"Token must be exactly {expected_length} digits long")
-            
+
+        expected_length = expected_length or settings.OTP_LENGTH
+
+        OTPService.check_format(input_token, expected_length)
         hashed_input = OTPService.hash_token(input_token)
-        return stored_hash == hashed_input 
+        return stored_hash == hashed_input
 
 
+    async def claim_resend(self, destination: str, otp_type: str = EMAIL_VERIFICATION) -> float | None:
+        '''
+        Start the resend cooldown for a destination.
 
-class EmailService:
-    '''
-    Service class for sending verification emails using SMTP and Jinja2 templates.
+        Returns None if the caller may issue and send a new OTP, otherwise the
+        expiry timestamp of the OTP sent within the last OTP_RESEND_COOLDOWN_SECONDS.
+        Backed by the OTP_STORE key-value client (set-if-absent with a TTL), so
+        concurrent double clicks send one email.
+        '''
 
-    This class handles rendering email templates and sending them to users and verification input token.
-    '''
+        expires_at = time.time() + settings.OTP_EXPIRE_MINUTES * 60
+        key = f"otp:cooldown:{otp_type}:{destination}"
+        client = get_kv_client()
+        if await client.set(key, str(expires_at).encode(), ex=settings.OTP_RESEND_COOLDOWN_SECONDS, nx=True):
+            return None
 
-    async def send_verification_email(
+        pending = await client.get(key)
+        return float(pending) if pending is not None else expires_at
+
+
+    async def release_resend(self, destination: str, otp_type: str = EMAIL_VERIFICATION) -> None:
+        '''End the cooldown early, e.g. when the OTP could not be sent'''
+        await get_kv_client().delete(f"otp:cooldown:{otp_type}:{destination}")
+
+
+    async def issue(
+            self,
+            store: OTPStore,
+            user_id: UUID,
+            destination: str,
+            otp_type: str = EMAIL_VERIFICATION
+    ) -> str:
+        '''
+        Generate an OTP, store its hash (replacing any previous one) and return the plain code.
+
+        In derived mode nothing is written: the code is recomputed on verification.
+        '''
+
+        if settings.OTP_MODE == "derived":
+            return self.derive_otp(user_id, otp_type, destination, self.otp_window())
+
+        otp = self.generate_otp()
+        await store.issue(OTPRecord(
+            user_id=user_id,
+            otp_type=otp_type,
+            token_hash=self.hash_token(otp),
+            destination=destination,
+            expires_at=datetime.now(timezone.utc) + timedelta(minutes=settings.OTP_EXPIRE_MINUTES),
+        ))
+        return otp
+
+
+    async def verify(
+            self,
+            store: OTPStore,
+            user_id: UUID,
+            destination: str,
+            input_token: str,
+            otp_type: str = EMAIL_VERIFICATION
+    ) -> OTPCheck:
+        '''
+        Check an OTP against the store, enforcing expiry and max attempts.
+
+        Raises:
+            ValueError: if the input token has an invalid format.
+        '''
+
+        if settings.OTP_MODE == "derived":
+            return await self._verify_derived(user_id, destination, input_token, otp_type)
+
+        record = await store.get_active(user_id, otp_type, destination)
+        if record is None:
+            return OTPCheck.NOT_FOUND
+
+        if record.expires_at <= datetime.now(timezone.utc):
+            # Mark as used so it can't be replayed.
+            await store.consume(record)
+            return OTPCheck.EXPIRED
+
+        self.check_format(input_token, settings.OTP_LENGTH)
+
+        # Reserve the attempt before comparing: the increment is atomic in every
+        # store, so concurrent guesses each see a distinct total and cannot
+        # exceed the limit together
+        attempts = await store.add_attempt(record)
+        if attempts is None:
+            return OTPCheck.NOT_FOUND  # purged meanwhile
+        if attempts > settings.OTP_MAX_ATTEMPTS:
+            await store.consume(record)
+            return OTPCheck.TOO_MANY_ATTEMPTS
+
+        if self.hash_token(input_token) != record.token_hash:
+            return OTPCheck.INVALID
+
+        # Only one concurrent request can consume the OTP
+        if not await store.consume(record):
+            return OTPCheck.NOT_FOUND
+        return OTPCheck.VALID
+
+
+    async def _verify_derived(
             self,
-            to: str,
-            otp: str
-        ) -> None:
-        
-        # Render templates (HTML & text)
-        html_template = env.get_template("email/verify_email.html")
-        text_template = env.get_template("email/verify_email.txt")
-        
-        html_body = html_template.render(
-            user_name=to.split("@")[0],
-            otp=otp,
-            expire_minutes=settings.OTP_EXPIRE_MINUTES
-        )
-
-        text_body = text_template.render(
-            user_name=to.split("@")[0],
-            otp=otp,
-            expire_minutes=settings.OTP_EXPIRE_MINUTES
-        )
-
-        '''Create the email message'''
-        subject = "Verify Your Email Address"
-        message = MIMEMultipart("alternative")  # Use plain text if HTML not supported
-        message["Subject"] = subject
-        message["From"] = settings.FROM_EMAIL
-        message["To"] = to
-
-        message.attach(MIMEText(html_body, "html"))
-        message.attach(MIMEText(text_body, "plain"))
-
-        async with SMTP(
-            hostname=settings.SMTP_SERVER,
-            port=settings.SMTP_PORT,
-            start_tls=True
-            ) as smtp:
-
-            await smtp.connect()  # Connect to server
-            await smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
-            await smtp.send_message(message)
\ No newline at end of file
+            user_id: UUID,
+            destination: str,
+            input_token: str,
+            otp_type: str
+    ) -> OTPCheck:
+        '''
+        Recompute the code for the current and previous window (so a code is
+        valid for at least OTP_EXPIRE_MINUTES) instead of reading a stored hash.
+        The only state is an attempts counter and a per-window replay marker
+        in the key-value store (see get_kv_client).
+        '''
+
+        self.check_format(input_token, settings.OTP_LENGTH)
+
+        client = get_kv_client()
+        ttl = settings.OTP_EXPIRE_MINUTES * 60 * 2
+        prefix = f"otp:derived:{otp_type}:{user_id}"
+        attempts_key = f"{prefix}:attempts"
+
+        # Reserve the attempt up front (INCR is atomic), so concurrent guesses
+        # cannot exceed the limit. Attempts are not reset by a resend since
+        # the code stays the same within a window.
+        await client.set(attempts_key, 0, ex=ttl, nx=True)  # create with a TTL, INCR keeps it
+        if await client.incr(attempts_key) > settings.OTP_MAX_ATTEMPTS:
+            return OTPCheck.TOO_MANY_ATTEMPTS
+
+        window = self.otp_window()
+        for candidate in (window, window - 1):
+            expected = self.derive_otp(user_id, otp_type, destination, candidate)
+            if hmac.compare_digest(expected, input_token):
+                if not await client.set(f"{prefix}:{candidate}:used", 1, ex=ttl, nx=True):
+                    return OTPCheck.NOT_FOUND  # replayed
+                await client.delete(attempts_key)
+                return OTPCheck.VALID
+
+        return OTPCheck.INVALID
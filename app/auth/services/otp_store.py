@@ -0,0 +1,248 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Protocol
+from uuid import UUID
+
+import orjson
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+@dataclass(slots=True)
+class OTPRecord:
+    '''One pending OTP, whatever the backend'''
+    user_id: UUID
+    otp_type: str
+    token_hash: str
+    destination: str
+    expires_at: datetime
+    attempts: int = 0
+    id: Any = None  # row id in the database store
+
+
+class OTPStore(ABC):
+    '''
+    Storage for pending OTPs.
+
+    At most one OTP is active per (user_id, otp_type): issuing a new one
+    invalidates the previous one. Attempt counters are updated atomically.
+    '''
+
+    @abstractmethod
+    async def issue(self, record: OTPRecord) -> None:
+        ...
+
+    @abstractmethod
+    async def get_active(self, user_id: UUID, otp_type: str, destination: str) -> OTPRecord | None:
+        ...
+
+    @abstractmethod
+    async def add_attempt(self, record: OTPRecord) -> int:
+        '''Count an attempt (atomically), return the new total, or None if the OTP is gone'''
+
+    @abstractmethod
+    async def consume(self, record: OTPRecord) -> bool:
+        '''Invalidate the OTP, return False if it was already used'''
+
+
+class DatabaseOTPStore(OTPStore):
+    '''OTPs as rows of `otp_tokens` (shared by every worker, costs DB writes)'''
+
+    def __init__(self, conn) -> None:
+        self.conn = conn
+
+    async def issue(self, record: OTPRecord) -> None:
+        # Invalidate previous OTPs for this user and type
+        await self.conn.execute(
+            """
+            UPDATE otp_tokens
+            SET used_at = $1
+            WHERE user_id = $2 AND otp_type = $3 AND used_at IS NULL
+            """,
+            datetime.now(timezone.utc),
+            record.user_id,
+            record.otp_type,
+        )
+        await self.conn.execute(
+            """
+            INSERT INTO otp_tokens
+            (user_id, otp_type, token_hash, destination, expires_at, attempts)
+            VALUES ($1, $2, $3, $4, $5, $6)
+            """,
+            record.user_id, record.otp_type, record.token_hash,
+            record.destination, record.expires_at, 0
+        )
+
+    async def get_active(self, user_id: UUID, otp_type: str, destination: str) -> OTPRecord | None:
+        row = await self.conn.fetchrow(
+            """
+            SELECT id, token_hash, expires_at, attempts
+            FROM otp_tokens
+            WHERE user_id = $1
+              AND otp_type = $2
+              AND destination = $3
+              AND used_at IS NULL
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            user_id,
+            otp_type,
+            destination,
+        )
+        if row is None:
+            return None
+        return OTPRecord(
+            user_id=user_id,
+            otp_type=otp_type,
+            token_hash=row["token_hash"],
+            destination=destination,
+            expires_at=row["expires_at"],
+            attempts=int(row["attempts"] or 0),
+            id=row["id"],
+        )
+
+    async def add_attempt(self, record: OTPRecord) -> int:
+        return await self.conn.fetchval(
+            "UPDATE otp_tokens SET attempts = attempts + 1 WHERE id = $1 RETURNING attempts",
+            record.id,
+        )
+
+    async def consume(self, record: OTPRecord) -> bool:
+        result = await self.conn.execute(
+            "UPDATE otp_tokens SET used_at = $1 WHERE id = $2 AND used_at IS NULL",
+            datetime.now(timezone.utc),
+            record.id,
+        )
+        return result == "UPDATE 1"
+
+
+class KeyValueClient(Protocol):
+    '''
+    The subset of a Redis-style async client the ephemeral stores need.
+    `redis.asyncio.Redis` satisfies it as-is.
+    '''
+
+    async def get(self, key: str) -> bytes | None: ...
+    async def set(self, key: str, value: bytes | int, ex: int | None = None, nx: bool = False) -> bool | None: ...
+    async def incr(self, key: str) -> int: ...
+    async def delete(self, *keys: str) -> int: ...
+
+
+class LocalKeyValueClient:
+    '''
+    In-process stand-in for a shared key-value store, backed by TTLCache
+    (timing-wheel expiry). Each worker has its own, so it only fits
+    single-process deployments, tests and local development.
+    '''
+
+    def __init__(self, max_entries: int | None = 100_000) -> None:
+        self._cache = TTLCache(default_ttl=3600, max_entries=max_entries)
+
+    async def get(self, key: str) -> bytes | None:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: bytes | int, ex: int | None = None, nx: bool = False) -> bool | None:
+        if isinstance(value, int):
+            value = str(value).encode()
+        if nx:
+            return self._cache.add(key, value, ex) or None
+        self._cache.set(key, value, ex)
+        return True
+
+    async def incr(self, key: str) -> int:
+        current = int(self._cache.get(key) or 0) + 1
+        ttl = self._cache.ttl(key)
+        # keep the key's expiry like Redis INCR does
+        self._cache.set(key, str(current).encode(), ttl if ttl is not None else self._cache.default_ttl)
+        return current
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._cache.pop(key) is not None for key in keys)
+
+
+class EphemeralOTPStore(OTPStore):
+    '''
+    OTPs in a TTL key-value store instead of Postgres: the OTP expires with
+    its key and the attempt counter is a separate key updated with INCR.
+    '''
+
+    def __init__(self, client: KeyValueClient) -> None:
+        self.client = client
+
+    @staticmethod
+    def _key(user_id: UUID, otp_type: str) -> str:
+        return f"otp:{otp_type}:{user_id}"
+
+    async def issue(self, record: OTPRecord) -> None:
+        ttl = max(1, int((record.expires_at - datetime.now(timezone.utc)).total_seconds()))
+        key = self._key(record.user_id, record.otp_type)
+        payload = orjson.dumps({
+            "token_hash": record.token_hash,
+            "destination": record.destination,
+            "expires_at": record.expires_at,
+        })
+        # Overwriting the key invalidates the previous OTP
+        await self.client.set(key, payload, ex=ttl)
+        await self.client.set(f"{key}:attempts", 0, ex=ttl)
+
+    async def get_active(self, user_id: UUID, otp_type: str, destination: str) -> OTPRecord | None:
+        key = self._key(user_id, otp_type)
+        payload = await self.client.get(key)
+        if payload is None:
+            return None
+
+        data = orjson.loads(payload)
+        if data["destination"] != destination:
+            return None
+        attempts = await self.client.get(f"{key}:attempts")
+        return OTPRecord(
+            user_id=user_id,
+            otp_type=otp_type,
+            token_hash=data["token_hash"],
+            destination=destination,
+            expires_at=datetime.fromisoformat(data["expires_at"]),
+            attempts=int(attempts or 0),
+        )
+
+    async def add_attempt(self, record: OTPRecord) -> int:
+        return await self.client.incr(f"{self._key(record.user_id, record.otp_type)}:attempts")
+
+    async def consume(self, record: OTPRecord) -> bool:
+        key = self._key(record.user_id, record.otp_type)
+        # The attempts key is left to expire (issue() resets it): deleting it
+        # would restart the count for guesses still in flight
+        return await self.client.delete(key) > 0
+
+
+_kv_client: KeyValueClient | None = None
+
+
+def get_kv_client() -> KeyValueClient:
+    '''
+    Process-wide key-value client for ephemeral auth state.
+
+    OTP_STORE=shared connects to OTP_STORE_URL (needs the `redis` package),
+    anything else uses the in-process LocalKeyValueClient.
+    '''
+    global _kv_client
+    if _kv_client is None:
+        if settings.OTP_STORE == "shared":
+            if not settings.OTP_STORE_URL:
+                raise RuntimeError("OTP_STORE=shared requires OTP_STORE_URL")
+            try:
+                from redis.asyncio import from_url
+            except ImportError as e:
+                raise RuntimeError("OTP_STORE=shared requires the 'redis' package") from e
+            _kv_client = from_url(settings.OTP_STORE_URL)
+        else:
+            _kv_client = LocalKeyValueClient()
+    return _kv_client
+
+
+def get_store(conn) -> OTPStore:
+    '''OTP store selected by OTP_STORE ("database", "memory" or "shared")'''
+    if settings.OTP_STORE == "database":
+        return DatabaseOTPStore(conn)
+    return EphemeralOTPStore(get_kv_client())
@@ -1,11 +1,38 @@
-from passlib.context import CryptContext
+import argparse
+import statistics
+import time
+from functools import lru_cache
 
+from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 MAX_PASSWORD_BYTES = 72
 MIN_PASSWORD_CHARS = 8
 
+# bcrypt accepts 4..31, below 10 is not reasonable outside tests
+MIN_BCRYPT_ROUNDS = 10
+MAX_BCRYPT_ROUNDS = 16
+
+
+@lru_cache
+def get_pwd_context():
+    '''
+    Build the passlib context on first use (passlib import and bcrypt backend detection are slow).
+
+    The cost is pinned to BCRYPT_ROUNDS in both directions, so hashes made
+    with any other cost report `needs_update` and get rehashed on login.
+    '''
+    from passlib.context import CryptContext
+
+    rounds = settings.BCRYPT_ROUNDS
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
 
 def hash_password(password: str) -> str:
     if not isinstance(password, str):
@@ -23,9 +50,100 @@ def hash_password(password: str) -> str:
         raise ValueError(f"Password too long for bcrypt (Max: {MAX_PASSWORD_BYTES} bytes)")
     elif char_length < MIN_PASSWORD_CHARS:
         raise ValueError(f"Password too short (Min: {MIN_PASSWORD_CHARS} chars)")
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+
+def _trim(plain: str) -> str:
+    return plain.encode("utf-8")[:MAX_PASSWORD_BYTES].decode("utf-8", errors="ignore")
 
 
 def verify_password(plain: str, password_hash: str) -> bool:
-    trimmed = plain.encode("utf-8")[:MAX_PASSWORD_BYTES].decode("utf-8", errors="ignore")
-    return pwd_context.verify(trimmed, password_hash)
+    return get_pwd_context().verify(_trim(plain), password_hash)
+
+
+def verify_and_update_password(plain: str, password_hash: str) -> tuple[bool, str | None]:
+    '''
+    Verify a password and, if its hash uses an outdated cost, return a new hash.
+
+    Responses:
+        (is_valid, new_hash): new_hash is None unless the caller should store it.
+    '''
+    return get_pwd_context().verify_and_update(_trim(plain), password_hash)
+
+
+@lru_cache
+def _dummy_hash() -> str:
+    return get_pwd_context().hash("dummy-password-for-timing")
+
+
+def dummy_verify(plain: str) -> bool:
+    '''
+    Spend the same bcrypt time as a real verification, for unknown accounts,
+    so response times do not reveal whether an email is registered.
+    '''
+    get_pwd_context().verify(_trim(plain), _dummy_hash())
+    return False
+
+
+def needs_rehash(password_hash: str) -> bool:
+    return get_pwd_context().needs_update(password_hash)
+
+
+def measure_hash_ms(rounds: int, samples: int = 3) -> float:
+    '''Median time of one bcrypt hash at the given cost on this machine'''
+    from passlib.hash import bcrypt
+
+    hasher = bcrypt.using(rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.hash("calibration-password")
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate_rounds(
+        target_ms: float,
+        min_rounds: int = MIN_BCRYPT_ROUNDS,
+        max_rounds: int = MAX_BCRYPT_ROUNDS,
+        samples: int = 3
+) -> tuple[int, dict[int, float]]:
+    '''
+    Pick the highest bcrypt cost whose hash time fits `target_ms`.
+
+    Every extra round doubles the time, so we stop at the first cost over budget.
+    Returns the chosen cost (never below min_rounds) and the measured timings.
+    '''
+
+    timings: dict[int, float] = {}
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        timings[rounds] = measure_hash_ms(rounds, samples)
+        if timings[rounds] > target_ms:
+            break
+        chosen = rounds
+    return chosen, timings
+
+
+def main(argv: list[str] | None = None) -> None:
+    '''python -m app.auth.services.password --target-ms 250'''
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.auth.services.password",
+        description="Calibrate BCRYPT_ROUNDS for a target hash latency on this hardware",
+    )
+    parser.add_argument("--target-ms", type=float, default=250.0, help="target hash latency (default: 250)")
+    parser.add_argument("--min-rounds", type=int, default=MIN_BCRYPT_ROUNDS)
+    parser.add_argument("--max-rounds", type=int, default=MAX_BCRYPT_ROUNDS)
+    parser.add_argument("--samples", type=int, default=3, help="hashes per cost (median is used)")
+    args = parser.parse_args(argv)
+
+    chosen, timings = calibrate_rounds(args.target_ms, args.min_rounds, args.max_rounds, args.samples)
+    for rounds, elapsed in timings.items():
+        marker = "  <- selected" if rounds == chosen else ""
+        print(f"rounds={rounds:<3} {elapsed:9.1f} ms{marker}")
+    print(f"\nBCRYPT_ROUNDS={chosen}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import time
+from collections.abc import Callable, Iterable
+from enum import IntEnum
+from functools import lru_cache
+
+from app.core.config import settings
+
+
+class Permission(IntEnum):
+    '''
+    Bit positions in the `perm` claim of access tokens, mirrored by
+    `permissions.id`. Never renumber: issued tokens keep their bits.
+    '''
+    USERS_READ = 0
+    USERS_UPDATE = 1
+    USERS_DELETE = 2
+    SECURITY_READ = 3
+
+
+def permission_mask(permissions: Iterable[Permission]) -> int:
+    mask = 0
+    for permission in permissions:
+        mask |= 1 << permission
+    return mask
+
+
+# Superusers hold every permission
+ALL_PERMISSIONS = permission_mask(Permission)
+
+
+def has_permissions(mask: int, required: int) -> bool:
+    return mask & required == required
+
+
+class RolePermissionCache:
+    '''
+    In-memory role -> permission bitset mapping.
+
+    Roles change rarely and are few, so the whole mapping is loaded with one
+    grouped query and kept for PERMISSION_CACHE_SECONDS. Resolving a user's
+    permissions at token issuance is then an OR over their role ids, with no
+    join against role_permissions.
+    '''
+
+    def __init__(self, ttl: float | None = None, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.clock = clock
+        self._masks: dict | None = None
+        self._loaded_at = float("-inf")
+
+    async def role_masks(self, conn) -> dict:
+        ttl = settings.PERMISSION_CACHE_SECONDS if self.ttl is None else self.ttl
+        if self._masks is None or self.clock() - self._loaded_at >= ttl:
+            rows = await conn.fetch(
+                """
+                SELECT role_id, bit_or(1::bigint << permission_id) AS mask
+                FROM role_permissions
+                GROUP BY role_id
+                """
+            )
+            self._masks = {row["role_id"]: row["mask"] for row in rows}
+            self._loaded_at = self.clock()
+        return self._masks
+
+    async def resolve(self, conn, role_ids: Iterable, is_superuser: bool = False) -> int:
+        '''Permission bitset of a user with the given roles'''
+        if is_superuser:
+            return ALL_PERMISSIONS
+        role_ids = list(role_ids or ())
+        if not role_ids:
+            return 0
+        masks = await self.role_masks(conn)
+        mask = 0
+        for role_id in role_ids:
+            mask |= masks.get(role_id, 0)
+        return mask & ALL_PERMISSIONS  # bits unknown to this version are not granted
+
+    def invalidate(self) -> None:
+        self._masks = None
+
+
+@lru_cache
+def get_role_permission_cache() -> RolePermissionCache:
+    return RolePermissionCache()
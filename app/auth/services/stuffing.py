@@ -0,0 +1,266 @@
+import asyncio
+import ipaddress
+import math
+import time
+from array import array
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Literal
+
+from app.core.client_ip import client_ip_known
+from app.core.config import settings
+
+
+# Forward decay keeps raw counters growing by 2**(age / half_life); they are
+# scaled back down once the factor gets this large, long before floats lose precision
+RESCALE_AT = 2.0 ** 40
+
+
+class HeavyHitters:
+    '''
+    Exponentially decaying counts of string keys and the `k` heaviest keys.
+
+    Counts live in a count-min sketch (`depth` rows of `width` counters,
+    conservative update), so memory is fixed however many keys are seen
+    and estimates only err upwards. Decay is applied lazily: counters are
+    stored multiplied by a factor that grows with time, so every count
+    halves every `half_life` seconds without touching the counters, and the
+    ranking of stored values never changes with time alone.
+
+    Not thread-safe: meant for use from one event loop, where every method
+    runs without yielding and is therefore atomic.
+    '''
+
+    def __init__(
+            self,
+            width: int = 4096,
+            depth: int = 4,
+            k: int = 50,
+            half_life: float = 300.0,
+            clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        if width < 1 or depth < 1 or k < 1:
+            raise ValueError("width, depth and k must be positive")
+        if half_life <= 0:
+            raise ValueError("half_life must be positive")
+        self.width = width
+        self.k = k
+        self.half_life = half_life
+        self._rows = [array("d", bytes(8 * width)) for _ in range(depth)]
+        self._top: dict[str, float] = {}  # key -> raw (scaled) count
+        self._rate = math.log(2) / half_life
+        self._clock = clock
+        self._epoch = clock()
+
+    def _positions(self, key: str):
+        # Double hashing, as in the email Bloom filter
+        digest = blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        width = self.width
+        return [(h1 + i * h2) % width for i in range(len(self._rows))]
+
+    def _scale(self) -> float:
+        scale = math.exp(self._rate * (self._clock() - self._epoch))
+        if scale < RESCALE_AT:
+            return scale
+        for row in self._rows:
+            for i, value in enumerate(row):
+                row[i] = value / scale
+        for key in self._top:
+            self._top[key] /= scale
+        self._epoch = self._clock()
+        return 1.0
+
+    def add(self, key: str, count: float = 1.0) -> float:
+        '''Count `key` now, returns its new (decayed) estimate'''
+        scale = self._scale()
+        positions = self._positions(key)
+        raw = min(row[i] for row, i in zip(self._rows, positions)) + count * scale
+        for row, i in zip(self._rows, positions):
+            if row[i] < raw:
+                row[i] = raw  # conservative update: never raise a counter above the new estimate
+        self._offer(key, raw)
+        return raw / scale
+
+    def _offer(self, key: str, raw: float) -> None:
+        top = self._top
+        if key in top or len(top) < self.k:
+            top[key] = raw
+            return
+        lightest = min(top, key=top.__getitem__)  # O(k), only for keys that are not tracked yet
+        if raw > top[lightest]:
+            del top[lightest]
+            top[key] = raw
+
+    def estimate(self, key: str) -> float:
+        scale = self._scale()
+        return min(row[i] for row, i in zip(self._rows, self._positions(key))) / scale
+
+    def top(self, limit: int | None = None) -> list[tuple[str, float]]:
+        '''The heaviest keys with their current estimates, heaviest first'''
+        scale = self._scale()
+        ranked = sorted(self._top.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(key, raw / scale) for key, raw in ranked]
+
+
+def subnet(ip: str, ipv4_prefix: int = 24, ipv6_prefix: int = 64) -> str | None:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    prefix = ipv4_prefix if address.version == 4 else ipv6_prefix
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+@dataclass(frozen=True, slots=True)
+class Limit:
+    slow_after: float | None  # failed logins (decayed) before attempts are delayed
+    block_after: float | None  # ... and before they are refused
+
+
+@dataclass(frozen=True, slots=True)
+class Assessment:
+    action: Literal["allow", "slow", "block"]
+    seconds: float = 0.0  # delay for "slow", time until the count decays below the limit for "block"
+    key: str | None = None  # "dimension:key" that triggered it
+    shared: bool = False  # the key is shared by unrelated clients: slow when possible, never refuse for it
+
+
+ALLOW = Assessment("allow")
+SEVERITY = {"allow": 0, "slow": 1, "block": 2}
+
+
+def _rank(assessment: Assessment) -> tuple:
+    return SEVERITY[assessment.action], not assessment.shared, assessment.seconds
+
+
+class StuffingDetector:
+    '''
+    Streaming credential-stuffing detector over failed logins.
+
+    Failures are counted per client IP, per subnet (/24 or /64) and per
+    user agent, so a source spraying many different accounts stands out
+    even though no single account reaches MAX_LOGIN_ATTEMPTS. Past a
+    dimension's `slow_after`, login attempts from that source are delayed
+    (up to `max_delay`, growing with the count); past `block_after` they
+    are refused until the count decays back under it.
+
+    A user agent is shared by every user of the same browser, so its
+    verdicts are `shared`: on equal severity a verdict on the source wins.
+
+    Counts are per worker process.
+    '''
+
+    DIMENSIONS = ("ip", "subnet", "user_agent")
+    SHARED_DIMENSIONS = ("user_agent",)
+
+    def __init__(
+            self,
+            limits: dict[str, Limit],
+            max_delay: float = 2.0,
+            max_delayed: int = 64,
+            ipv4_prefix: int = 24,
+            ipv6_prefix: int = 64,
+            **sketch,
+    ) -> None:
+        self.limits = limits
+        self.max_delay = max_delay
+        self.max_delayed = max_delayed
+        self.ipv4_prefix = ipv4_prefix
+        self.ipv6_prefix = ipv6_prefix
+        self.hitters = {dimension: HeavyHitters(**sketch) for dimension in self.DIMENSIONS}
+        self.delayed = 0
+
+    def _keys(self, ip: str | None, user_agent: str | None) -> dict[str, str]:
+        keys = {"user_agent": (user_agent or "").strip()[:256] or "<none>"}
+        if ip:
+            keys["ip"] = ip
+            network = subnet(ip, self.ipv4_prefix, self.ipv6_prefix)
+            if network:
+                keys["subnet"] = network
+        return keys
+
+    def record_failure(self, ip: str | None, user_agent: str | None) -> None:
+        for dimension, key in self._keys(ip, user_agent).items():
+            self.hitters[dimension].add(key)
+
+    def _action(self, dimension: str, count: float) -> Assessment:
+        limit = self.limits.get(dimension)
+        if limit is None:
+            return ALLOW
+        if limit.block_after is not None and count >= limit.block_after:
+            # count * 2**(-t / half_life) == block_after
+            half_life = self.hitters[dimension].half_life
+            return Assessment("block", half_life * math.log2(count / limit.block_after) or 1.0)
+        if limit.slow_after is not None and count >= limit.slow_after:
+            span = (limit.block_after or 2 * limit.slow_after) - limit.slow_after
+            fraction = (count - limit.slow_after + 1) / span if span > 0 else 1.0
+            return Assessment("slow", self.max_delay * min(1.0, fraction))
+        return ALLOW
+
+    def assess(self, ip: str | None, user_agent: str | None) -> Assessment:
+        '''The harshest action any dimension of this source calls for'''
+        worst = ALLOW
+        for dimension, key in self._keys(ip, user_agent).items():
+            action = self._action(dimension, self.hitters[dimension].estimate(key))
+            action = Assessment(action.action, action.seconds, f"{dimension}:{key}", dimension in self.SHARED_DIMENSIONS)
+            if _rank(action) > _rank(worst):
+                worst = action
+        return worst
+
+    async def slow_down(self, seconds: float) -> bool:
+        '''
+        Sleep `seconds`. Returns False at once when `max_delayed` attempts are
+        already sleeping, so a large attack cannot park unbounded requests.
+        '''
+        if self.delayed >= self.max_delayed:
+            return False
+        self.delayed += 1
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.delayed -= 1
+        return True
+
+    def heavy_hitters(self, limit: int | None = None) -> dict[str, list[dict]]:
+        report = {}
+        for dimension, hitters in self.hitters.items():
+            report[dimension] = [
+                {"key": key, "count": round(count, 2), "action": self._action(dimension, count).action}
+                for key, count in hitters.top(limit)
+            ]
+        return report
+
+
+@lru_cache
+def get_stuffing_detector() -> StuffingDetector | None:
+    '''
+    None when STUFFING_DETECTION_ENABLED is off. Without TRUSTED_PROXIES the
+    peer address may be a proxy shared by all clients: IPs and subnets are
+    still counted (and reported) but never slowed or blocked. User agents
+    are only reported unless their limits are set.
+    '''
+    if not settings.STUFFING_DETECTION_ENABLED:
+        return None
+    limits = {}
+    if settings.STUFFING_USER_AGENT_SLOW_AFTER is not None or settings.STUFFING_USER_AGENT_BLOCK_AFTER is not None:
+        limits["user_agent"] = Limit(settings.STUFFING_USER_AGENT_SLOW_AFTER, settings.STUFFING_USER_AGENT_BLOCK_AFTER)
+    if client_ip_known():
+        limits["ip"] = Limit(settings.STUFFING_IP_SLOW_AFTER, settings.STUFFING_IP_BLOCK_AFTER)
+        limits["subnet"] = Limit(settings.STUFFING_SUBNET_SLOW_AFTER, settings.STUFFING_SUBNET_BLOCK_AFTER)
+    return StuffingDetector(
+        limits=limits,
+        max_delay=settings.STUFFING_MAX_DELAY_SECONDS,
+        max_delayed=settings.STUFFING_MAX_DELAYED,
+        ipv4_prefix=settings.STUFFING_IPV4_PREFIX,
+        ipv6_prefix=settings.STUFFING_IPV6_PREFIX,
+        width=settings.STUFFING_SKETCH_WIDTH,
+        depth=settings.STUFFING_SKETCH_DEPTH,
+        k=settings.STUFFING_TOP_K,
+        half_life=settings.STUFFING_HALF_LIFE_SECONDS,
+    )
@@ -0,0 +1,137 @@
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from functools import lru_cache
+from urllib.parse import quote, urlencode
+
+from app.auth.services.otp_store import KeyValueClient, get_kv_client
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+@lru_cache
+def _fernet():
+    '''Fernet box for TOTP secrets at rest (cryptography is imported on first use)'''
+    from cryptography.fernet import Fernet
+
+    key = settings.TOTP_ENCRYPTION_KEY
+    if not key:
+        # domain-separated from the JWT signing key
+        raw = hmac.new(settings.SECRET_KEY.encode("utf-8"), b"authpad-totp-encryption", hashlib.sha256).digest()
+        key = base64.urlsafe_b64encode(raw)
+    return Fernet(key)
+
+
+def generate_secret() -> str:
+    '''Random 160-bit secret, base32 encoded like authenticator apps expect'''
+    return base64.b32encode(secrets.token_bytes(20)).decode("ascii")
+
+
+def encrypt_secret(secret: str) -> str:
+    return _fernet().encrypt(secret.encode("ascii")).decode("ascii")
+
+
+def decrypt_secret(ciphertext: str) -> str:
+    '''Raises ValueError if the ciphertext was not produced with the current key'''
+    from cryptography.fernet import InvalidToken
+
+    try:
+        return _fernet().decrypt(ciphertext.encode("ascii")).decode("ascii")
+    except InvalidToken as e:
+        raise ValueError("TOTP secret cannot be decrypted") from e
+
+
+def provisioning_uri(secret: str, account: str, issuer: str | None = None) -> str:
+    '''otpauth:// URI for QR codes (Google Authenticator key URI format)'''
+    issuer = issuer or settings.TOTP_ISSUER
+    query = urlencode({
+        "secret": secret,
+        "issuer": issuer,
+        "digits": settings.TOTP_DIGITS,
+        "period": settings.TOTP_STEP_SECONDS,
+    })
+    return f"otpauth://totp/{quote(issuer)}:{quote(account)}?{query}"
+
+
+class TOTPVerifier:
+    '''
+    RFC 6238 TOTP verification (HMAC-SHA1) with a ±`valid_window` step tolerance.
+
+    Keyed HMAC objects are precomputed per user and cached along with the
+    ciphertext they came from, so a verification costs no decryption and
+    no key setup: each candidate step is one `copy()` + `update()`; that
+    cache is per process. Accepted (user, step) pairs are marked in the
+    OTP_STORE key-value store (see get_kv_client) until the step can no
+    longer be accepted, so with OTP_STORE=shared a code is accepted once
+    across all workers.
+    '''
+
+    def __init__(
+            self,
+            step: int | None = None,
+            digits: int | None = None,
+            valid_window: int | None = None,
+            max_entries: int | None = None,
+            clock=time.time,
+            kv: KeyValueClient | None = None
+    ) -> None:
+        self.step = step or settings.TOTP_STEP_SECONDS
+        self.digits = digits or settings.TOTP_DIGITS
+        self.valid_window = settings.TOTP_VALID_WINDOW if valid_window is None else valid_window
+        self._clock = clock
+        max_entries = max_entries or settings.TOTP_CACHE_SIZE
+        self._lifetime = self.step * (2 * self.valid_window + 1)
+        self._keys = TTLCache(default_ttl=3600, max_entries=max_entries)
+        self._kv = kv
+
+    def _keyed_hmac(self, user_id, ciphertext: str):
+        cached = self._keys.get(user_id)
+        if cached is not None and cached[0] == ciphertext:
+            return cached[1]
+
+        secret = base64.b32decode(decrypt_secret(ciphertext), casefold=True)
+        keyed = hmac.new(secret, digestmod=hashlib.sha1)
+        self._keys.set(user_id, (ciphertext, keyed))
+        return keyed
+
+    def code_at(self, keyed, counter: int) -> str:
+        mac = keyed.copy()
+        mac.update(counter.to_bytes(8, "big"))
+        digest = mac.digest()
+        offset = digest[-1] & 0x0F
+        code = int.from_bytes(digest[offset:offset + 4], "big") & 0x7FFFFFFF
+        return str(code % 10 ** self.digits).zfill(self.digits)
+
+    def now(self, ciphertext: str, user_id=None) -> str:
+        '''Current code, mostly for tests and enrollment checks'''
+        return self.code_at(self._keyed_hmac(user_id, ciphertext), int(self._clock() // self.step))
+
+    async def verify(self, user_id, ciphertext: str, code: str) -> bool:
+        '''
+        True if `code` matches a step within the window and was not used yet.
+        Raises ValueError on a malformed code or an undecryptable secret.
+        '''
+
+        if not code.isdigit() or len(code) != self.digits:
+            raise ValueError(f"Code must be exactly {self.digits} digits")
+
+        keyed = self._keyed_hmac(user_id, ciphertext)
+        current = int(self._clock() // self.step)
+        for counter in range(current - self.valid_window, current + self.valid_window + 1):
+            if hmac.compare_digest(self.code_at(keyed, counter), code):
+                # set-if-absent: a second use of the same step fails, whichever worker sees it
+                client = self._kv or get_kv_client()
+                return bool(await client.set(f"totp:used:{user_id}:{counter}", 1, ex=self._lifetime, nx=True))
+        return False
+
+    def forget(self, user_id) -> None:
+        '''Drop the cached key, e.g. after re-enrollment or disabling 2FA'''
+        self._keys.pop(user_id)
+
+
+@lru_cache
+def get_totp_verifier() -> TOTPVerifier:
+    '''Process-wide verifier, built on first use from the TOTP_* settings'''
+    return TOTPVerifier()
@@ -0,0 +1,153 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from functools import lru_cache
+from typing import Any
+
+from app.core.config import settings
+
+
+class Priority(IntEnum):
+    '''Lower value = served first, shed last'''
+    CRITICAL = 0  # token refresh, /users/me: never queued or shed
+    HIGH = 1
+    NORMAL = 2
+    LOW = 3  # login, registration: shed first
+
+
+# Fraction of the queue each priority may fill before it is shed
+QUEUE_SHARE = {
+    Priority.HIGH: 1.0,
+    Priority.NORMAL: 0.75,
+    Priority.LOW: 0.5,
+}
+
+
+class Overloaded(Exception):
+    '''Raised when a request cannot be admitted, mapped to 503 + Retry-After'''
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Server overloaded, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    '''
+    Concurrency budget with a short, priority-ordered waiting queue.
+
+    A caller gets a slot at once while fewer than `limit` are in use,
+    otherwise it waits at most `queue_timeout` seconds, provided the queue
+    is not already too long for its priority (QUEUE_SHARE). Freed slots go
+    to the highest priority waiter. CRITICAL callers are always admitted
+    but still count towards the load seen by everyone else. Whoever cannot
+    be admitted gets Overloaded, with a Retry-After estimated from the
+    average time a slot is held.
+    '''
+
+    def __init__(self, limit: int, max_queue: int, queue_timeout: float) -> None:
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_use = 0
+        self.shed = 0
+        self._waiters: list[deque[asyncio.Future]] = [deque() for _ in Priority]
+        self._avg_hold = queue_timeout  # seconds, moving average
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._avg_hold * (self.queued + 1) / self.limit))
+
+    def _reject(self) -> Overloaded:
+        self.shed += 1
+        return Overloaded(self.retry_after())
+
+    async def acquire(self, priority: Priority = Priority.NORMAL) -> None:
+        if priority is Priority.CRITICAL or (self.in_use < self.limit and not self.queued):
+            self.in_use += 1
+            return
+        if self.queued >= self.max_queue * QUEUE_SHARE[priority]:
+            raise self._reject()
+
+        waiter = asyncio.get_running_loop().create_future()
+        waiters = self._waiters[priority]
+        waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot was handed over just as we gave up
+            elif waiter in waiters:
+                waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject() from None
+            raise
+
+    def release(self) -> None:
+        # Hand the slot straight to the next waiter, unless CRITICAL callers overbooked it
+        if self.in_use <= self.limit:
+            for waiters in self._waiters:
+                while waiters:
+                    waiter = waiters.popleft()
+                    if not waiter.done():
+                        waiter.set_result(None)
+                        return
+        self.in_use -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.NORMAL):
+        await self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._avg_hold += (time.monotonic() - started - self._avg_hold) * 0.1
+            self.release()
+
+    async def run_in_thread(self, func: Callable[..., Any], *args: Any, priority: Priority = Priority.NORMAL) -> Any:
+        '''Run a blocking call (bcrypt) in a worker thread within the budget'''
+        async with self.slot(priority):
+            return await asyncio.to_thread(func, *args)
+
+
+@lru_cache
+def get_hashing_budget() -> AdmissionController:
+    '''bcrypt runs off the event loop, at most BCRYPT_CONCURRENCY hashes at a time'''
+    return AdmissionController(
+        limit=settings.BCRYPT_CONCURRENCY or os.cpu_count() or 1,
+        max_queue=settings.BCRYPT_QUEUE_SIZE,
+        queue_timeout=settings.BCRYPT_QUEUE_TIMEOUT_SECONDS,
+    )
+
+
+@lru_cache
+def get_request_gate() -> AdmissionController:
+    '''In-flight request budget of the worker for routes using `admit()`'''
+    return AdmissionController(
+        limit=settings.ADMISSION_MAX_CONCURRENT_REQUESTS,
+        max_queue=settings.ADMISSION_QUEUE_SIZE,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    )
+
+
+def admit(priority: Priority):
+    '''
+    Route dependency holding a request slot for the whole request.
+
+        @router.post("/token", dependencies=[Depends(admit(Priority.LOW))])
+    '''
+
+    async def dependency():
+        async with get_request_gate().slot(priority):
+            yield
+
+    return dependency
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Protocol
+from uuid import UUID
+
+import asyncpg
+import orjson
+
+from app.core.config import settings
+
+
+logger = logging.getLogger("app.audit")
+
+AUDIT_COLUMNS = ("occurred_at", "event", "user_id", "email", "ip_address", "detail")
+
+# VARCHAR sizes of `audit_log`; longer values (an attacker-chosen login name) are truncated on record()
+FIELD_SIZES = {"event": 50, "email": 255, "ip_address": 45}
+
+
+@dataclass(slots=True)
+class AuditEvent:
+    event: str
+    user_id: UUID | None = None
+    email: str | None = None
+    ip_address: str | None = None
+    detail: dict[str, Any] | None = None
+    occurred_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def as_record(self) -> tuple:
+        detail = None if self.detail is None else orjson.dumps(self.detail).decode()
+        return (self.occurred_at, self.event, self.user_id, self.email, self.ip_address, detail)
+
+    def as_json(self) -> bytes:
+        return orjson.dumps({
+            "occurred_at": self.occurred_at,
+            "event": self.event,
+            "user_id": self.user_id,
+            "email": self.email,
+            "ip_address": self.ip_address,
+            "detail": self.detail,
+        }) + b"\n"
+
+
+class RejectedEvents(Exception):
+    '''The sink refused the data itself: writing the same events again cannot succeed'''
+
+
+class AuditSink(Protocol):
+    async def write(self, events: list[AuditEvent]) -> None: ...
+
+
+class DatabaseAuditSink:
+    '''Batches go to `audit_log` with one COPY per flush. `connect` is conn_ctx.'''
+
+    def __init__(self, connect, table: str = "audit_log") -> None:
+        self.connect = connect
+        self.table = table
+
+    async def write(self, events: list[AuditEvent]) -> None:
+        try:
+            records = [event.as_record() for event in events]
+        except TypeError as e:  # detail orjson cannot encode
+            raise RejectedEvents(str(e)) from e
+        async with self.connect() as conn:
+            try:
+                await conn.copy_records_to_table(self.table, records=records, columns=AUDIT_COLUMNS)
+            except (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError) as e:
+                raise RejectedEvents(str(e)) from e
+
+
+class FileAuditSink:
+    '''
+    Append-only JSON lines, rotated to `path.1` .. `path.N` past `max_bytes`.
+    Writes run in a worker thread so the event loop never blocks on disk.
+    '''
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    def _rotate(self) -> None:
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write(self, data: bytes) -> None:
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "ab") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+    async def write(self, events: list[AuditEvent]) -> None:
+        try:
+            data = b"".join(event.as_json() for event in events)
+        except TypeError as e:
+            raise RejectedEvents(str(e)) from e
+        await asyncio.to_thread(self._write, data)
+
+
+class AuditLog:
+    '''
+    Non-blocking audit trail.
+
+    `record()` only appends to a bounded in-memory ring buffer; the `run()`
+    task flushes it to a sink in batches, every AUDIT_FLUSH_SECONDS or as
+    soon as a batch is full. When the buffer is full the drop policy decides
+    which event is lost ("drop_oldest" or "drop_newest") and `dropped`
+    counts them. A batch whose write fails goes back to the front of the
+    buffer, unless the sink rejected the events themselves: then the batch
+    is bisected and only the events rejected on their own are dropped
+    (logged, counted in `rejected`). Cancelling `run()` (shutdown) makes one
+    last flush attempt, bounded by `shutdown_timeout`.
+    '''
+
+    def __init__(
+            self,
+            capacity: int | None = None,
+            batch_size: int | None = None,
+            flush_interval: float | None = None,
+            drop_policy: str | None = None,
+            enabled: bool | None = None,
+            shutdown_timeout: float | None = None
+    ) -> None:
+        self.enabled = enabled
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.shutdown_timeout = shutdown_timeout
+        self.dropped = 0
+        self.rejected = 0
+        self._buffer: deque[AuditEvent] | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    def _setup(self) -> deque[AuditEvent]:
+        self.enabled = settings.AUDIT_ENABLED if self.enabled is None else self.enabled
+        self.capacity = self.capacity or settings.AUDIT_BUFFER_SIZE
+        self.batch_size = self.batch_size or settings.AUDIT_BATCH_SIZE
+        self.flush_interval = self.flush_interval or settings.AUDIT_FLUSH_SECONDS
+        self.drop_policy = self.drop_policy or settings.AUDIT_DROP_POLICY
+        self.shutdown_timeout = self.shutdown_timeout or settings.AUDIT_SHUTDOWN_TIMEOUT_SECONDS
+        self._buffer = deque()
+        return self._buffer
+
+    def __len__(self) -> int:
+        return len(self._buffer) if self._buffer is not None else 0
+
+    def record(self, event: str, **fields: Any) -> None:
+        '''Queue an audit event. Never blocks and never raises on a full buffer.'''
+        buffer = self._buffer if self._buffer is not None else self._setup()
+        if not self.enabled:
+            return
+
+        if len(buffer) >= self.capacity:
+            self.dropped += 1
+            if self.drop_policy == "drop_newest":
+                return
+            buffer.popleft()
+        for name in ("email", "ip_address"):
+            if isinstance(fields.get(name), str):
+                fields[name] = fields[name][:FIELD_SIZES[name]]
+        buffer.append(AuditEvent(event[:FIELD_SIZES["event"]], **fields))
+
+        if self._wakeup is not None and len(buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _take_batch(self, limit: int) -> list[AuditEvent]:
+        buffer = self._buffer
+        return [buffer.popleft() for _ in range(min(self.batch_size, limit, len(buffer)))]
+
+    def _requeue(self, batch: list[AuditEvent]) -> None:
+        buffer = self._buffer
+        room = self.capacity - len(buffer)
+        if room < len(batch):
+            self.dropped += len(batch) - max(room, 0)
+            batch = batch[len(batch) - max(room, 0):]
+        buffer.extendleft(reversed(batch))
+
+    async def _write(self, sink: AuditSink, batch: list[AuditEvent]) -> int:
+        '''Write `batch`, bisecting it around events the sink rejects. Returns the number written.'''
+        written = 0
+        parts = [batch]  # next part last
+        while parts:
+            part = parts.pop()
+            try:
+                await sink.write(part)
+            except RejectedEvents as e:
+                if len(part) == 1:
+                    self.rejected += 1
+                    logger.error("audit event rejected by the sink, dropped (%s): %s", e, part[0].as_record())
+                else:
+                    middle = len(part) // 2
+                    parts += [part[middle:], part[:middle]]
+                continue
+            except BaseException:
+                self._requeue([event for pending in (part, *reversed(parts)) for event in pending])
+                raise
+            written += len(part)
+        return written
+
+    async def flush(self, sink: AuditSink) -> int:
+        '''Write the events buffered when called, return the number of events written'''
+        if self._buffer is None:
+            return 0
+
+        written, remaining = 0, len(self._buffer)
+        while remaining > 0 and self._buffer:
+            batch = self._take_batch(remaining)
+            remaining -= len(batch)
+            written += await self._write(sink, batch)
+        return written
+
+    async def run(self, sink: AuditSink) -> None:
+        '''Background flusher, started from the app lifespan'''
+        if self._buffer is None:
+            self._setup()
+        self._wakeup = asyncio.Event()
+
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+                try:
+                    await self.flush(sink)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("audit flush failed, %d events buffered", len(self))
+                    await asyncio.sleep(self.flush_interval)  # back off instead of retrying on every event
+        except asyncio.CancelledError:
+            try:
+                written = await asyncio.wait_for(self.flush(sink), timeout=self.shutdown_timeout)
+                logger.info(
+                    "audit log flushed %d events on shutdown (%d dropped, %d rejected)",
+                    written, self.dropped, self.rejected,
+                )
+            except Exception:
+                logger.exception("final audit flush failed, %d events lost", len(self))
+            raise
+        finally:
+            self._wakeup = None
+
+
+def build_sink(connect) -> AuditSink:
+    '''Sink selected by AUDIT_SINK ("database" or "file")'''
+    if settings.AUDIT_SINK == "file":
+        return FileAuditSink(settings.AUDIT_FILE_PATH, settings.AUDIT_FILE_MAX_BYTES, settings.AUDIT_FILE_BACKUPS)
+    return DatabaseAuditSink(connect)
+
+
+audit_log = AuditLog()
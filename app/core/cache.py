@@ -0,0 +1,136 @@
+import math
+import time
+from collections.abc import Callable, Hashable, Iterator
+from typing import Any
+
+
+class TimingWheel:
+    '''
+    Hashed timing wheel: keys are bucketed by the tick they expire in.
+
+    Advancing the wheel hands back the keys of every bucket that passed,
+    so expiry costs O(expired keys) instead of a scan of the whole map.
+    Keys further away than one rotation land in a bucket early; callers
+    re-check the real deadline and reschedule them.
+    '''
+
+    __slots__ = ("tick", "slots", "_buckets", "_cursor")
+
+    def __init__(self, tick: float = 1.0, slots: int = 512, now: float = 0.0) -> None:
+        self.tick = tick
+        self.slots = slots
+        self._buckets: list[set] = [set() for _ in range(slots)]
+        self._cursor = math.floor(now / tick)
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        tick = max(math.ceil(deadline / self.tick), self._cursor + 1)
+        self._buckets[tick % self.slots].add(key)
+
+    def advance(self, now: float) -> Iterator[Hashable]:
+        target = math.floor(now / self.tick)
+        steps = min(target - self._cursor, self.slots)
+        for offset in range(1, steps + 1):
+            index = (self._cursor + offset) % self.slots
+            bucket = self._buckets[index]
+            if bucket:
+                self._buckets[index] = set()
+                yield from bucket
+        self._cursor = max(self._cursor, target)
+
+
+class TTLCache:
+    '''
+    In-process map with per-entry TTL and an optional entry bound.
+
+    Expired entries are never returned; they are evicted by a timing wheel
+    as time moves on. When `max_entries` is reached the oldest entry is
+    dropped. Not thread-safe: meant for use from one event loop, where
+    every method runs without yielding and is therefore atomic.
+    '''
+
+    def __init__(
+            self,
+            default_ttl: float,
+            max_entries: int | None = None,
+            tick: float = 1.0,
+            clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data: dict[Hashable, tuple[Any, float]] = {}
+        self._wheel = TimingWheel(tick=tick, now=clock())
+
+    def _expire(self, now: float) -> None:
+        data = self._data
+        for key in self._wheel.advance(now):
+            entry = data.get(key)
+            if entry is None:
+                continue
+            if entry[1] <= now:
+                del data[key]
+            else:
+                self._wheel.schedule(key, entry[1])
+
+    def _live(self, key: Hashable, now: float) -> tuple[Any, float] | None:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._live(key, self._clock())
+        return default if entry is None else entry[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._live(key, self._clock()) is not None
+
+    def __len__(self) -> int:
+        self._expire(self._clock())
+        return len(self._data)
+
+    def ttl(self, key: Hashable) -> float | None:
+        '''Remaining lifetime in seconds, None if the key is absent'''
+        now = self._clock()
+        entry = self._live(key, now)
+        return None if entry is None else entry[1] - now
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        now = self._clock()
+        self._expire(now)
+        data = self._data
+        if key not in data and self.max_entries is not None and len(data) >= self.max_entries:
+            del data[next(iter(data))]
+
+        deadline = now + (self.default_ttl if ttl is None else ttl)
+        data[key] = (value, deadline)
+        self._wheel.schedule(key, deadline)
+
+    def add(self, key: Hashable, value: Any, ttl: float | None = None) -> bool:
+        '''Set only if absent, return True if the value was stored'''
+        if self._live(key, self._clock()) is not None:
+            return False
+        self.set(key, value, ttl)
+        return True
+
+    def incr(self, key: Hashable, amount: int = 1, ttl: float | None = None) -> int:
+        '''Increment a counter, creating it with `ttl` if absent (the expiry is kept otherwise)'''
+        now = self._clock()
+        entry = self._live(key, now)
+        if entry is None:
+            self.set(key, amount, ttl)
+            return amount
+        value = entry[0] + amount
+        self._data[key] = (value, entry[1])
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._live(key, self._clock())
+        if entry is None:
+            return default
+        del self._data[key]
+        return entry[0]
+
+    def clear(self) -> None:
+        self._data.clear()
@@ -0,0 +1,63 @@
+import ipaddress
+from functools import lru_cache
+
+from app.core.config import settings
+
+
+Network = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+def parse_networks(entries: list[str]) -> tuple[Network, ...]:
+    '''"10.0.0.5", "10.0.0.0/8", "::1" -> networks. Raises ValueError on a bad entry.'''
+    return tuple(ipaddress.ip_network(entry.strip(), strict=False) for entry in entries)
+
+
+def _trusted(address: str, networks: tuple[Network, ...]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return any(ip in network for network in networks)
+
+
+def resolve_client_ip(peer: str | None, forwarded_for: str | None, trusted: tuple[Network, ...]) -> str | None:
+    '''
+    The address of the client as seen by our outermost trusted proxy.
+
+    X-Forwarded-For is only read when the peer is a trusted proxy, from the
+    right: every proxy appends the address it received the request from, so
+    the first untrusted entry is the client. Entries further left were sent
+    by the client itself and can be forged.
+    '''
+
+    if peer is None or not _trusted(peer, trusted) or not forwarded_for:
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop, trusted):
+            return hop
+    return hops[0] if hops else peer
+
+
+@lru_cache
+def trusted_proxies() -> tuple[Network, ...] | None:
+    '''TRUSTED_PROXIES as networks, None while it is not configured'''
+    if settings.TRUSTED_PROXIES is None:
+        return None
+    return parse_networks(settings.TRUSTED_PROXIES)
+
+
+def client_ip_known() -> bool:
+    '''
+    True once TRUSTED_PROXIES says how clients reach us (`[]`: directly).
+    Until then the peer address may be a proxy shared by every client.
+    '''
+    return trusted_proxies() is not None
+
+
+def client_ip(request) -> str | None:
+    if request.client is None:
+        return None
+    return resolve_client_ip(request.client.host, request.headers.get("x-forwarded-for"), trusted_proxies() or ())
@@ -1,3 +1,5 @@
+from functools import lru_cache
+from typing import Literal
 from pydantic import ConfigDict, Field, model_validator
 from pydantic_settings import BaseSettings
 
@@ -12,6 +14,14 @@ class Settings(BaseSettings):
     DB_USER: str | None = None
     DB_PASS: str | None = None
     DB_ECHO: str | None = None
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 10
+    # User shards (users, otp_tokens, sessions, user_roles), routed by email hash.
+    # Append-only: the order is the shard number. Empty: everything in DB_URL.
+    DB_SHARD_URLS: list[str] = []
+    # Total connections all workers of one instance may open (split by `python -m app`)
+    DB_CONNECTION_BUDGET: int | None = None
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
 
     # JWT Authentication
     SECRET_KEY: str = Field(..., min_length=32)
@@ -23,6 +33,13 @@ class Settings(BaseSettings):
     OTP_LENGTH: int = 6
     OTP_EXPIRE_MINUTES: int = 10
     OTP_MAX_ATTEMPTS: int = 3
+    OTP_RESEND_COOLDOWN_SECONDS: int = 60  # repeated requests inside it reuse the pending OTP
+    # "database" (otp_tokens rows), "memory" (per-process, single node) or "shared" (Redis-compatible store)
+    OTP_STORE: Literal["database", "memory", "shared"] = "database"
+    OTP_STORE_URL: str | None = None
+    # "stored": random codes kept (hashed) in OTP_STORE; "derived": HMAC(secret, user, purpose, time window), no write on issue
+    OTP_MODE: Literal["stored", "derived"] = "stored"
+    OTP_SECRET: str | None = None  # defaults to a key derived from SECRET_KEY
 
     # Email SMTP
     SMTP_SERVER: str = "smtp.gmail.com"
@@ -35,6 +52,105 @@ class Settings(BaseSettings):
     MAX_LOGIN_ATTEMPTS: int = 5
     LOCKOUT_TIME_MINUTES: int = 15
     BCRYPT_ROUNDS: int = 12
+    # Index built by `python -m app.auth.services.breach`, new passwords found in it are rejected; unset disables the check
+    BREACHED_PASSWORDS_FILE: str | None = None
+
+    # Admission control: bcrypt runs in threads within a budget, excess requests get 503 + Retry-After
+    BCRYPT_CONCURRENCY: int | None = None  # per worker, defaults to the CPU count
+    BCRYPT_QUEUE_SIZE: int = 32
+    BCRYPT_QUEUE_TIMEOUT_SECONDS: float = 1.0
+    ADMISSION_MAX_CONCURRENT_REQUESTS: int = 256  # per worker, for routes declaring a priority
+    ADMISSION_QUEUE_SIZE: int = 128
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 0.5
+
+    # TOTP two-factor authentication
+    TOTP_ISSUER: str = "AuthPad"
+    TOTP_STEP_SECONDS: int = 30
+    TOTP_DIGITS: int = 6
+    TOTP_VALID_WINDOW: int = 1  # steps accepted on each side of the current one
+    TOTP_ENCRYPTION_KEY: str | None = None  # Fernet key for secrets at rest, defaults to one derived from SECRET_KEY
+    TOTP_CACHE_SIZE: int = 100_000  # entries in the per-process key and replay caches
+    MFA_TOKEN_EXPIRE_MINUTES: int = 5
+
+    # Reverse proxies (IPs or CIDRs) whose X-Forwarded-For is trusted to find the client address.
+    # `[]`: clients connect directly. Unset: unknown, so per-IP and per-subnet throttling stays off
+    TRUSTED_PROXIES: list[str] | None = None
+
+    # Credential-stuffing detection: failed logins counted per IP, subnet and user agent (decaying, per worker).
+    # Past *_SLOW_AFTER /auth/token attempts from the source are delayed, past *_BLOCK_AFTER refused with 429.
+    # IP and subnet limits only apply once TRUSTED_PROXIES is set
+    STUFFING_DETECTION_ENABLED: bool = True
+    STUFFING_HALF_LIFE_SECONDS: float = 300.0
+    STUFFING_IP_SLOW_AFTER: float | None = 10
+    STUFFING_IP_BLOCK_AFTER: float | None = 50
+    STUFFING_SUBNET_SLOW_AFTER: float | None = 50
+    STUFFING_SUBNET_BLOCK_AFTER: float | None = 250
+    # many unrelated users share a user agent: counted and reported, only slowed when set
+    STUFFING_USER_AGENT_SLOW_AFTER: float | None = None
+    STUFFING_USER_AGENT_BLOCK_AFTER: float | None = None
+    STUFFING_MAX_DELAY_SECONDS: float = 2.0
+    STUFFING_MAX_DELAYED: int = 64  # attempts sleeping at once, further slowed ones get 429 instead
+    STUFFING_IPV4_PREFIX: int = 24
+    STUFFING_IPV6_PREFIX: int = 64
+    STUFFING_SKETCH_WIDTH: int = 4096
+    STUFFING_SKETCH_DEPTH: int = 4
+    STUFFING_TOP_K: int = 50
+
+    # Batch token introspection (/auth/introspect) for downstream services
+    INTROSPECTION_SECRET: str | None = None  # sent by callers as a bearer token; unset disables the endpoint
+    INTROSPECTION_MAX_TOKENS: int = 100
+
+    # Forward-auth (/auth/forward) token micro-cache
+    FORWARD_AUTH_CACHE_SECONDS: float = 5.0
+    FORWARD_AUTH_CACHE_SIZE: int = 100_000
+
+    # Negative cache of registered emails (Bloom filter)
+    EMAIL_FILTER_ENABLED: bool = True
+    EMAIL_FILTER_CAPACITY: int = 1_000_000
+    EMAIL_FILTER_ERROR_RATE: float = 0.001
+    EMAIL_FILTER_SYNC_SECONDS: int = 5
+    # created_at is the transaction start, so a row can commit after later-stamped ones: each sync re-scans
+    # this far behind the newest row seen. Keep it above the longest registration transaction.
+    EMAIL_FILTER_SYNC_OVERLAP_SECONDS: float = 60.0
+    EMAIL_FILTER_REBUILD_SECONDS: int = 3600
+
+    # Audit log: ring buffer flushed in batches to the `audit_log` table or to rotated files
+    AUDIT_ENABLED: bool = True
+    AUDIT_SINK: Literal["database", "file"] = "database"
+    AUDIT_BUFFER_SIZE: int = 10_000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_SECONDS: float = 1.0
+    AUDIT_DROP_POLICY: Literal["drop_oldest", "drop_newest"] = "drop_oldest"
+    AUDIT_SHUTDOWN_TIMEOUT_SECONDS: float = 5.0  # the last flush on shutdown gives up after this
+    AUDIT_FILE_PATH: str = "audit.log"
+    AUDIT_FILE_MAX_BYTES: int = 100 * 1024 * 1024
+    AUDIT_FILE_BACKUPS: int = 10
+
+    # Admin bulk operations: rows per UPDATE (and per transaction)
+    ADMIN_BULK_CHUNK_SIZE: int = 1000
+
+    # RBAC: role -> permission bitsets are cached in memory this long
+    PERMISSION_CACHE_SECONDS: float = 60.0
+
+    # Account deletion: dependents are purged in the background in small batches
+    ACCOUNT_PURGE_ENABLED: bool = True
+    ACCOUNT_PURGE_INTERVAL_SECONDS: float = 10.0
+    ACCOUNT_PURGE_BATCH_SIZE: int = 500
+    ACCOUNT_PURGE_PAUSE_SECONDS: float = 0.05
+
+    # Health snapshot behind /readyz, refreshed in the background
+    HEALTH_CHECK_SECONDS: float = 2.0
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 1.0
+    HEALTH_SMTP_CHECK_SECONDS: float = 30.0
+    HEALTH_MAX_LOOP_LAG_MS: float = 250.0
+    HEALTH_MAX_POOL_SATURATION: float = 1.0  # fraction of the pool in use
+
+    # Diagnostics
+    DEBUG: bool = False
+    # Superuser-only /debug profiling routes (404 when disabled)
+    PROFILING_ENABLED: bool = False
+    PROFILE_MAX_SECONDS: float = 60.0
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5.0
 
     
     model_config = ConfigDict(
@@ -55,4 +171,25 @@ class Settings(BaseSettings):
         return self
 
 
-settings = Settings()
\ No newline at end of file
+@lru_cache
+def get_settings() -> Settings:
+    '''Build the settings on first use (reads env and .env once)'''
+    return Settings()
+
+
+class _LazySettings:
+    '''
+    Module-level proxy for the Settings instance.
+
+    Keeps `from app.core.config import settings` working everywhere without
+    parsing the environment at import time.
+    '''
+
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(get_settings(), name, value)
+
+
+settings = _LazySettings()
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+
+from app.core.config import settings
+
+
+logger = logging.getLogger("app.health")
+
+LAG_SAMPLE_SECONDS = 0.1
+
+
+@dataclass(frozen=True, slots=True)
+class HealthSnapshot:
+    '''Worker health as of `checked_at` (monotonic clock)'''
+    checked_at: float
+    db_ok: bool
+    db_latency_ms: float | None
+    pool_in_use: int
+    pool_size: int
+    pool_max: int
+    smtp_ok: bool | None  # None until the first SMTP probe
+    loop_lag_ms: float
+    reasons: tuple[str, ...] = field(default=())
+
+    @property
+    def pool_saturation(self) -> float:
+        return self.pool_in_use / self.pool_max if self.pool_max else 0.0
+
+    @property
+    def ready(self) -> bool:
+        return not self.reasons
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("checked_at")
+        data["reasons"] = list(self.reasons)
+        data["pool_saturation"] = round(self.pool_saturation, 3)
+        data["age_seconds"] = round(time.monotonic() - self.checked_at, 3)
+        data["status"] = "ready" if self.ready else "unready"
+        return data
+
+
+async def smtp_reachable(host: str, port: int, timeout: float) -> bool:
+    '''TCP connect and read the 220 greeting, without a full SMTP session'''
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    try:
+        greeting = await asyncio.wait_for(reader.readline(), timeout)
+        return greeting.startswith(b"220")
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.close()
+
+
+class HealthMonitor:
+    '''
+    Background-refreshed health snapshot behind /readyz.
+
+    Probes hit the cached snapshot, never the database: the DB ping
+    (`check_health`, including the wait for a pool connection), pool
+    saturation and SMTP reachability are measured here every
+    HEALTH_CHECK_SECONDS (SMTP every HEALTH_SMTP_CHECK_SECONDS), and
+    event-loop lag is sampled continuously. The worker reports unready when
+    the DB is down, the pool is saturated, the loop lags or the snapshot is
+    stale. SMTP is reported but does not gate readiness: logins work
+    without mail.
+    '''
+
+    def __init__(
+            self,
+            check_db: Callable[[float], Awaitable[bool]],
+            pool_stats: Callable[[], tuple[int, int, int]],
+            check_smtp: Callable[[], Awaitable[bool]] | None = None,
+            interval: float | None = None,
+            smtp_interval: float | None = None
+    ) -> None:
+        self.check_db = check_db
+        self.pool_stats = pool_stats
+        self.check_smtp = check_smtp
+        self.interval = interval
+        self.smtp_interval = smtp_interval
+        self.snapshot: HealthSnapshot | None = None
+        self._smtp_ok: bool | None = None
+        self._smtp_checked_at = float("-inf")
+        self._max_lag = 0.0
+
+    def _evaluate(self, db_ok: bool, pool: tuple[int, int, int], lag_ms: float) -> tuple[str, ...]:
+        in_use, _, max_size = pool
+        reasons = []
+        if not db_ok:
+            reasons.append("database unreachable")
+        if max_size and in_use / max_size >= settings.HEALTH_MAX_POOL_SATURATION:
+            reasons.append("connection pool saturated")
+        if lag_ms > settings.HEALTH_MAX_LOOP_LAG_MS:
+            reasons.append("event loop lagging")
+        return tuple(reasons)
+
+    async def refresh(self) -> HealthSnapshot:
+        '''Take a new snapshot'''
+
+        # Before the ping, which holds a connection itself
+        pool = self.pool_stats()
+
+        started = time.perf_counter()
+        db_ok = await self.check_db(settings.HEALTH_PROBE_TIMEOUT_SECONDS)
+        db_latency_ms = (time.perf_counter() - started) * 1000
+
+        now = time.monotonic()
+        smtp_interval = self.smtp_interval or settings.HEALTH_SMTP_CHECK_SECONDS
+        if self.check_smtp is not None and now - self._smtp_checked_at >= smtp_interval:
+            self._smtp_checked_at = now
+            self._smtp_ok = await self.check_smtp()
+
+        lag_ms, self._max_lag = self._max_lag, 0.0
+        self.snapshot = HealthSnapshot(
+            checked_at=time.monotonic(),
+            db_ok=db_ok,
+            db_latency_ms=round(db_latency_ms, 3) if db_ok else None,
+            pool_in_use=pool[0],
+            pool_size=pool[1],
+            pool_max=pool[2],
+            smtp_ok=self._smtp_ok,
+            loop_lag_ms=round(lag_ms, 3),
+            reasons=self._evaluate(db_ok, pool, lag_ms),
+        )
+        return self.snapshot
+
+    def current(self) -> HealthSnapshot | None:
+        '''Latest snapshot, with a "stale" reason if the refresh loop stopped keeping up'''
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        max_age = 3 * (self.interval or settings.HEALTH_CHECK_SECONDS) + settings.HEALTH_PROBE_TIMEOUT_SECONDS
+        if time.monotonic() - snapshot.checked_at > max_age and "snapshot stale" not in snapshot.reasons:
+            return HealthSnapshot(**{**asdict(snapshot), "reasons": snapshot.reasons + ("snapshot stale",)})
+        return snapshot
+
+    async def _sample_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_SAMPLE_SECONDS
+            await asyncio.sleep(LAG_SAMPLE_SECONDS)
+            self._max_lag = max(self._max_lag, (loop.time() - expected) * 1000)
+
+    async def run(self) -> None:
+        '''Refresh loop, started from the app lifespan'''
+        sampler = asyncio.create_task(self._sample_lag())
+        try:
+            while True:
+                try:
+                    await self.refresh()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("health refresh failed")
+                await asyncio.sleep(self.interval or settings.HEALTH_CHECK_SECONDS)
+        finally:
+            sampler.cancel()
+
+
+def _default_monitor() -> HealthMonitor:
+    from app.db.connection import check_health, pool_stats
+
+    async def check_smtp() -> bool:
+        return await smtp_reachable(settings.SMTP_SERVER, settings.SMTP_PORT, settings.HEALTH_PROBE_TIMEOUT_SECONDS)
+
+    return HealthMonitor(check_db=check_health, pool_stats=pool_stats, check_smtp=check_smtp)
+
+
+health_monitor = _default_monitor()
@@ -0,0 +1,151 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+
+class ProfilerBusy(Exception):
+    '''Another profile is already running in this worker'''
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float) -> Counter:
+    '''
+    Sample the Python stack of `thread_id` every `interval` seconds, from the
+    calling thread. Returns how often each stack (root first, ";"-joined) was seen.
+    '''
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        if labels:
+            stacks[";".join(reversed(labels))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapsed(stacks: Counter) -> str:
+    '''Collapsed stack format ("a;b;c 12" per line), as read by flamegraph.pl and speedscope'''
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class CPUProfiler:
+    '''
+    On-demand CPU profiles of the event loop thread, one at a time.
+
+    `sample()` reads the loop's stack from a helper thread, so the loop runs
+    unmodified (overhead is one stack walk per interval). `trace()` runs
+    cProfile on the loop thread for exact call counts, at a noticeable cost
+    while it lasts. Nothing is installed between profiles.
+    '''
+
+    def __init__(self) -> None:
+        self.running = False
+
+    def _claim(self) -> None:
+        if self.running:
+            raise ProfilerBusy("A profile is already running")
+        self.running = True
+
+    async def sample(self, seconds: float, interval: float) -> Counter:
+        self._claim()
+        try:
+            loop_thread = threading.get_ident()
+            return await asyncio.to_thread(sample_stacks, loop_thread, seconds, interval)
+        finally:
+            self.running = False
+
+    async def trace(self, seconds: float, limit: int = 50) -> str:
+        '''pstats report, by cumulative time, of everything the loop ran for `seconds`'''
+        self._claim()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+        finally:
+            self.running = False
+
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return out.getvalue()
+
+
+class MemoryTracer:
+    '''
+    tracemalloc snapshots and diffs. Tracing only runs between `start()` and
+    `stop()`; `snapshot()` sets the baseline that `diff()` compares against.
+    '''
+
+    # Allocations made by the tracer itself are noise
+    FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self) -> None:
+        self.baseline: tracemalloc.Snapshot | None = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self.baseline = None
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.baseline = None
+
+    def _take(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise ValueError("Memory tracing is not started")
+        return tracemalloc.take_snapshot().filter_traces(self.FILTERS)
+
+    def snapshot(self, limit: int = 25, key: str = "lineno") -> list[str]:
+        '''Take a new baseline, return its largest allocation sites'''
+        self.baseline = self._take()
+        return [str(stat) for stat in self.baseline.statistics(key)[:limit]]
+
+    def diff(self, limit: int = 25, key: str = "lineno") -> list[str]:
+        '''Allocation sites that grew (or shrank) the most since the baseline'''
+        if self.baseline is None:
+            raise ValueError("Take a snapshot first")
+        return [str(stat) for stat in self._take().compare_to(self.baseline, key)[:limit]]
+
+    def traced_memory(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": self.tracing, "current_bytes": current, "peak_bytes": peak}
+
+
+def task_stacks(limit: int | None = None) -> str:
+    '''Stacks of every asyncio task of the running loop, `limit` frames each'''
+    out = io.StringIO()
+    tasks = sorted(asyncio.all_tasks(), key=lambda task: task.get_name())
+    out.write(f"{len(tasks)} tasks\n\n")
+    for task in tasks:
+        task.print_stack(limit=limit, file=out)
+        out.write("\n")
+    return out.getvalue()
+
+
+cpu_profiler = CPUProfiler()
+memory_tracer = MemoryTracer()
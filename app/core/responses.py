@@ -0,0 +1,63 @@
+from collections.abc import Mapping
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONResponse(JSONResponse):
+    '''Default response class: renders content with orjson instead of the json module'''
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+class ModelSerializer:
+    '''
+    Precomputed JSON serializer for a response model.
+
+    Meant for data we already trust (DB rows, values built by the handler):
+    the field list and defaults are resolved once, so rendering a response
+    is a dict comprehension plus one orjson call, with no Pydantic validation.
+    The model itself stays the `response_model` for the OpenAPI schema.
+    '''
+
+    __slots__ = ("model", "fields", "defaults")
+
+    def __init__(self, model: type[BaseModel]) -> None:
+        self.model = model
+        self.fields = tuple(model.model_fields)
+        self.defaults = {
+            name: field.default
+            for name, field in model.model_fields.items()
+            if not field.is_required()
+        }
+
+    def to_dict(self, data: Mapping) -> dict:
+        # .get() works for dicts and asyncpg Records alike
+        get, defaults = data.get, self.defaults
+        return {name: get(name, defaults.get(name)) for name in self.fields}
+
+    def construct(self, data: Mapping) -> BaseModel:
+        '''Build the model without running validators'''
+        return self.model.model_construct(**self.to_dict(data))
+
+    def dumps(self, data: Mapping) -> bytes:
+        return orjson.dumps(self.to_dict(data), option=ORJSON_OPTIONS)
+
+    def response(
+            self,
+            data: Mapping,
+            status_code: int = 200,
+            headers: Mapping[str, str] | None = None
+    ) -> Response:
+        return Response(
+            content=self.dumps(data),
+            status_code=status_code,
+            headers=headers,
+            media_type="application/json",
+        )
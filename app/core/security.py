@@ -3,13 +3,11 @@ from jose import JWTError, jwt
 from datetime import timedelta, datetime, timezone
 from app.core.config import settings
 
-ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
-
 
 def create_access_token(
         data: dict,
-        secret_key: str = settings.SECRET_KEY,
-        algorithm: str = settings.ALGORITHM,
+        secret_key: str | None = None,
+        algorithm: str | None = None,
         expires_delta: timedelta | None = None
         ) -> str:
     '''create JWT access token'''
@@ -19,7 +17,7 @@ def create_access_token(
 
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (
-        expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         )
 
     to_encode.update({
@@ -28,20 +26,28 @@ def create_access_token(
         "iat": datetime.now(timezone.utc)
         })
     
-    token = jwt.encode(to_encode, secret_key, algorithm=algorithm)
+    token = jwt.encode(
+        to_encode,
+        secret_key or settings.SECRET_KEY,
+        algorithm=algorithm or settings.ALGORITHM
+        )
     return token
 
 
 
 def verify_token(
         token: str,
-        secret_key: str = settings.SECRET_KEY,
-        algorithm: str = settings.ALGORITHM
+        secret_key: str | None = None,
+        algorithm: str | None = None
         ) -> dict:
     '''verify and decode JWT token'''
 
     try:
-        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
+        payload = jwt.decode(
+            token,
+            secret_key or settings.SECRET_KEY,
+            algorithms=[algorithm or settings.ALGORITHM]
+            )
         return payload
     except JWTError as e:
         raise ValueError(f"Invalid or expired token: {str(e)}")
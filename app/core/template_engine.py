@@ -1,7 +1,14 @@
-from jinja2 import Environment, FileSystemLoader
+from functools import lru_cache
 from pathlib import Path
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 template_path = BASE_DIR / "app" / "templates"
-env = Environment(loader=FileSystemLoader(template_path))
\ No newline at end of file
+
+
+@lru_cache
+def get_template_env():
+    '''Build the Jinja2 environment on first use, keeping jinja2 out of startup'''
+    from jinja2 import Environment, FileSystemLoader
+
+    return Environment(loader=FileSystemLoader(template_path))
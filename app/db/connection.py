@@ -1,33 +1,86 @@
+import asyncio
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from functools import partial
+from hashlib import blake2b
+from typing import AsyncGenerator, Callable
 import asyncpg
 
 from app.core.config import settings
+from app.db.instrumentation import InstrumentedConnection
 
 
 _POOL: asyncpg.Pool | None = None
+# One pool per user shard, in DB_SHARD_URLS order; just [_POOL] when unsharded
+_SHARD_POOLS: list[asyncpg.Pool] = []
+
+
+async def _create_pool(url: str) -> asyncpg.Pool:
+    return await asyncpg.create_pool(
+        url,
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        command_timeout=30
+        )
 
 
 async def init_pool() -> None:
-    '''Creates a connection pool with min/max size configuration'''
-    global _POOL
+    '''Creates the connection pools (home database, plus one per shard) with min/max size configuration'''
+    global _POOL, _SHARD_POOLS
     if _POOL is None:
         if not settings.DB_URL:
             raise RuntimeError("DB_URL is not configured")
-        _POOL = await asyncpg.create_pool(
-            settings.DB_URL,
-            min_size=1,
-            max_size=10,
-            command_timeout=30
-            )
+        pool = await _create_pool(settings.DB_URL)
+        shard_pools = []
+        try:
+            for url in settings.DB_SHARD_URLS:
+                shard_pools.append(pool if url == settings.DB_URL else await _create_pool(url))
+        except BaseException:
+            for created in {pool, *shard_pools}:
+                await created.close()
+            raise
+        _POOL, _SHARD_POOLS = pool, shard_pools or [pool]
 
 
 async def close_pool() -> None:
-    '''Close the database connection pool and cleanup resources'''
-    global _POOL
+    '''Close the database connection pools and cleanup resources'''
+    global _POOL, _SHARD_POOLS
     if _POOL is not None:
+        for pool in _SHARD_POOLS:
+            if pool is not _POOL:
+                await pool.close()
         await _POOL.close()
-        _POOL = None
+        _POOL, _SHARD_POOLS = None, []
+
+
+def stable_hash(key: str) -> int:
+    '''64-bit hash of a routing key, the same in every process and Python version (unlike hash())'''
+    return int.from_bytes(blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    '''
+    Jump consistent hash (Lamping & Veach). Going from n to n + 1 buckets
+    moves only 1/(n + 1) of the keys, all of them to the new bucket.
+    '''
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_count() -> int:
+    return len(settings.DB_SHARD_URLS) or 1
+
+
+def shard_for(email: str) -> int:
+    '''
+    Shard holding the user with this (normalized) email. The email is the
+    routing key, so the per-shard UNIQUE(email) is enough for global uniqueness.
+    '''
+    count = shard_count()
+    return 0 if count == 1 else jump_hash(stable_hash(email), count)
 
 
 @asynccontextmanager
@@ -36,30 +89,169 @@ async def conn_ctx() -> AsyncGenerator[asyncpg.Connection, None]:
     Async context manager for obtaining a DB connection from the global pool.
 
     Use this outside of FastAPI dependency injection.
+    Statements are timed through InstrumentedConnection.
+    With sharding, this is the home database (DB_URL), not a user shard.
     '''
     if _POOL is None:
         await init_pool()
     async with _POOL.acquire() as conn:
-        yield conn
+        yield InstrumentedConnection(conn)
 
 
-async def get_conn() -> AsyncGenerator[asyncpg.Connection, None]:
+@asynccontextmanager
+async def shard_ctx(shard: int) -> AsyncGenerator[asyncpg.Connection, None]:
+    '''Like conn_ctx, for a connection to one user shard'''
+    if _POOL is None:
+        await init_pool()
+    async with _SHARD_POOLS[shard].acquire() as conn:
+        yield InstrumentedConnection(conn)
+
+
+def shard_connectors() -> list[Callable]:
+    '''One `connect()` per shard (same use as conn_ctx), for fan-out queries and per-shard workers'''
+    return [partial(shard_ctx, shard) for shard in range(shard_count())]
+
+
+async def find_shard(query: str, *args) -> int | None:
     '''
-    Get a database connection from the pool
+    First shard on which `query` returns a value, for lookups by a key that
+    does not route (users.id). All shards are asked concurrently.
     '''
-    async with conn_ctx() as conn:
-        yield conn
 
+    async def probe(shard: int):
+        async with shard_ctx(shard) as conn:
+            return await conn.fetchval(query, *args)
+
+    results = await asyncio.gather(*(probe(shard) for shard in range(shard_count())))
+    return next((shard for shard, found in enumerate(results) if found is not None), None)
+
+
+class LazyConnection:
+    '''
+    Connection handle that checks a pool connection out on its first query.
+
+    `release()` gives it back before work that does not need the database
+    (bcrypt, SMTP); the next query checks one out again. The pool is then
+    held for DB time only, not for the whole request. Query methods mirror
+    asyncpg.Connection; `acquire()` returns the connection itself for
+    transactions and cursors.
+
+    With sharding, `route(email)` (or `use_shard()`) must come before the
+    first query: it picks the shard the connection is taken from.
+    '''
+
+    __slots__ = ("_pool", "_shard", "_conn", "_lock")
+
+    def __init__(self, pool: asyncpg.Pool | None = None) -> None:
+        self._pool = pool
+        self._shard: int | None = None
+        self._conn: InstrumentedConnection | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def acquired(self) -> bool:
+        return self._conn is not None
+
+    @property
+    def shard(self) -> int | None:
+        return self._shard
+
+    async def use_shard(self, shard: int) -> None:
+        '''Send the next queries to `shard`, giving back a connection held on another one'''
+        if shard != self._shard:
+            await self.release()
+            self._shard = shard
+            self._pool = None
+
+    async def route(self, email: str) -> None:
+        '''Send the next queries to the shard of the user with this (normalized) email'''
+        await self.use_shard(shard_for(email))
+
+    async def acquire(self) -> InstrumentedConnection:
+        if self._conn is None:
+            async with self._lock:  # concurrent first queries must not check out two connections
+                if self._conn is None:
+                    if self._pool is None:
+                        if _POOL is None:
+                            await init_pool()
+                        if self._shard is None and len(_SHARD_POOLS) > 1:
+                            raise RuntimeError("Query on a sharded database before route()")
+                        self._pool = _SHARD_POOLS[self._shard or 0]
+                    self._conn = InstrumentedConnection(await self._pool.acquire())
+        return self._conn
+
+    async def release(self) -> None:
+        '''Return the connection to the pool until the next query'''
+        if self._conn is not None and self._conn.is_in_transaction():
+            raise RuntimeError("Cannot release a connection inside a transaction")
+        await self.close()
+
+    async def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await self._pool.release(conn._conn)
+
+    async def execute(self, query: str, *args, **kwargs):
+        return await (await self.acquire()).execute(query, *args, **kwargs)
+
+    async def executemany(self, query: str, *args, **kwargs):
+        return await (await self.acquire()).executemany(query, *args, **kwargs)
+
+    async def fetch(self, query: str, *args, **kwargs):
+        return await (await self.acquire()).fetch(query, *args, **kwargs)
+
+    async def fetchrow(self, query: str, *args, **kwargs):
+        return await (await self.acquire()).fetchrow(query, *args, **kwargs)
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        return await (await self.acquire()).fetchval(query, *args, **kwargs)
+
+    async def copy_records_to_table(self, table_name: str, **kwargs):
+        return await (await self.acquire()).copy_records_to_table(table_name, **kwargs)
 
-async def check_health() -> bool:
-    '''Check if the database connection is responsive'''
+
+async def get_conn() -> AsyncGenerator[LazyConnection, None]:
+    '''
+    Get a lazy database connection for the request: no pool connection is
+    held until the first query, and handlers release it around slow non-DB work
+    '''
+    conn = LazyConnection()
     try:
-        async with conn_ctx() as conn:
+        yield conn
+    finally:
+        await conn.close()
+
+
+async def check_health(timeout: float | None = None) -> bool:
+    '''Check if the databases (home and every shard) are responsive (within `timeout` seconds, pool wait included)'''
+
+    async def ping(connect) -> bool:
+        async with connect() as conn:
             test_result = await conn.fetchval("SELECT 1")
             return test_result == 1  # 1 means True
-        
+
+    async def ping_all() -> bool:
+        connects = [conn_ctx] + (shard_connectors() if shard_count() > 1 else [])
+        return all(await asyncio.gather(*(ping(connect) for connect in connects)))
+
+    try:
+        return await asyncio.wait_for(ping_all(), timeout)
     except Exception:
         return False
+
+
+def pool_stats() -> tuple[int, int, int]:
+    '''
+    (connections in use, open connections, max size) of the most saturated
+    pool, zeros before init
+    '''
+    if _POOL is None:
+        return 0, 0, 0
+    stats = []
+    for pool in {_POOL, *_SHARD_POOLS}:
+        size = pool.get_size()
+        stats.append((size - pool.get_idle_size(), size, pool.get_max_size()))
+    return max(stats, key=lambda s: s[0] / s[2] if s[2] else 0.0)
     
 
 def get_db_url():
@@ -0,0 +1,174 @@
+import logging
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from app.core.config import settings
+
+
+logger = logging.getLogger("app.db.queries")
+
+MAX_FINGERPRINTS = 1000
+DB_STATS_HEADER = "X-DB-Stats"
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\$\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class StatementStats:
+    '''Aggregated timings for one statement fingerprint'''
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+
+@dataclass
+class RequestDBStats:
+    '''DB round trips and time spent in the database for a single request'''
+    round_trips: int = 0
+    db_ms: float = 0.0
+
+    def header_value(self) -> str:
+        return f"round_trips={self.round_trips}; db_ms={self.db_ms:.2f}"
+
+
+_statements: dict[str, StatementStats] = {}
+_request_stats: ContextVar[RequestDBStats | None] = ContextVar("request_db_stats", default=None)
+
+
+def fingerprint(query: str) -> str:
+    '''
+    Normalize a SQL statement so that queries differing only in
+    literals, placeholders or whitespace aggregate under the same key.
+    '''
+
+    normalized = _STRING_LITERAL.sub("?", query)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+def record_statement(query: str, duration_ms: float) -> None:
+    '''Record one executed statement in the global and per-request stats'''
+
+    key = fingerprint(query)
+    stats = _statements.get(key)
+    if stats is None and len(_statements) < MAX_FINGERPRINTS:
+        stats = _statements[key] = StatementStats()
+    if stats is not None:
+        stats.calls += 1
+        stats.total_ms += duration_ms
+        stats.max_ms = max(stats.max_ms, duration_ms)
+
+    request_stats = _request_stats.get()
+    if request_stats is not None:
+        request_stats.round_trips += 1
+        request_stats.db_ms += duration_ms
+
+    if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+        logger.warning(
+            "slow query: %.2f ms: %s", duration_ms, key,
+            extra={"event": "slow_query", "fingerprint": key, "duration_ms": round(duration_ms, 3)},
+        )
+
+
+def statement_stats() -> list[tuple[str, StatementStats]]:
+    '''Return aggregated statement stats, most expensive first'''
+    return sorted(_statements.items(), key=lambda item: item[1].total_ms, reverse=True)
+
+
+def statement_report(limit: int | None = None) -> list[dict]:
+    '''The `limit` most expensive fingerprints, as JSON-ready rows'''
+    return [
+        {
+            "fingerprint": key,
+            "calls": stats.calls,
+            "total_ms": round(stats.total_ms, 3),
+            "mean_ms": round(stats.total_ms / stats.calls, 3),
+            "max_ms": round(stats.max_ms, 3),
+        }
+        for key, stats in statement_stats()[:limit]
+    ]
+
+
+def reset_statement_stats() -> None:
+    _statements.clear()
+
+
+def start_request_stats() -> RequestDBStats:
+    '''Start collecting DB stats for the current request context'''
+    stats = RequestDBStats()
+    _request_stats.set(stats)
+    return stats
+
+
+class InstrumentedConnection:
+    '''
+    Thin proxy around asyncpg.Connection that times every statement.
+
+    Query methods are timed and recorded, everything else
+    (transaction, cursor, prepare, ...) is delegated untouched.
+    '''
+
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn) -> None:
+        self._conn = conn
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+    async def _timed(self, method, query: str, args: tuple, kwargs: dict):
+        start = time.perf_counter()
+        try:
+            return await method(query, *args, **kwargs)
+        finally:
+            record_statement(query, (time.perf_counter() - start) * 1000)
+
+    async def execute(self, query: str, *args, **kwargs):
+        return await self._timed(self._conn.execute, query, args, kwargs)
+
+    async def executemany(self, query: str, *args, **kwargs):
+        return await self._timed(self._conn.executemany, query, args, kwargs)
+
+    async def fetch(self, query: str, *args, **kwargs):
+        return await self._timed(self._conn.fetch, query, args, kwargs)
+
+    async def fetchrow(self, query: str, *args, **kwargs):
+        return await self._timed(self._conn.fetchrow, query, args, kwargs)
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        return await self._timed(self._conn.fetchval, query, args, kwargs)
+
+    async def copy_records_to_table(self, table_name: str, **kwargs):
+        return await self._timed(self._conn.copy_records_to_table, table_name, (), kwargs)
+
+
+class DBStatsMiddleware:
+    '''
+    ASGI middleware that, in DEBUG mode, attaches the request's DB round trips
+    and DB time as an `X-DB-Stats` response header.
+    '''
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.DEBUG:
+            await self.app(scope, receive, send)
+            return
+
+        stats = start_request_stats()
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((DB_STATS_HEADER.lower().encode(), stats.header_value().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_stats)
@@ -1,6 +1,7 @@
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy import DateTime
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, CheckConstraint, Column, ForeignKey, Identity, Index, Integer, SmallInteger, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from .base import Base, IDMixin, TimestampMixin
@@ -21,6 +22,29 @@ class User(TimestampMixin, IDMixin, Base):
     failed_login_attempts = Column(Integer, default=0)
     locked_until = Column(DateTime(timezone=True))
     email_verified_at = Column(DateTime(timezone=True))
+    totp_secret = Column(Text)  # Fernet-encrypted base32 secret
+    totp_enabled = Column(Boolean, default=False, nullable=False, server_default="false")
+    # Set when deletion is requested; the row and its dependents are purged in the background
+    deleted_at = Column(DateTime(timezone=True))
+
+    # Covering indexes for the admin listing (keyset on created_at, id): the
+    # listed columns are INCLUDEd, so pages are index-only range scans
+    __table_args__ = (
+        Index(
+            "ix_users_created_at_id", "created_at", "id",
+            postgresql_include=["email", "username", "is_verified", "is_active", "is_superuser", "last_login"],
+        ),
+        Index(
+            "ix_users_is_active_created_at_id", "is_active", "created_at", "id",
+            postgresql_include=["email", "username", "is_verified", "is_superuser", "last_login"],
+        ),
+        Index(
+            "ix_users_is_verified_created_at_id", "is_verified", "created_at", "id",
+            postgresql_include=["email", "username", "is_active", "is_superuser", "last_login"],
+        ),
+        # Small partial index: the purge worker's queue
+        Index("ix_users_pending_deletion", "deleted_at", postgresql_where=deleted_at.isnot(None)),
+    )
 
     # Relationships
     otp_tokens = relationship(
@@ -37,12 +61,14 @@ class User(TimestampMixin, IDMixin, Base):
         lazy="selectin"
     )
 
+    roles = relationship("Role", secondary="user_roles", back_populates="users")
+
 
 class OTPToken(TimestampMixin, IDMixin, Base):
     '''Maps to existing 'otp_tokens' table'''
     __tablename__ = "otp_tokens"
 
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
     otp_type = Column(String(20), nullable=False)
     token_hash = Column(String(255), nullable=False, index=True)
     destination = Column(String(255))
@@ -59,7 +85,7 @@ class Session(TimestampMixin, IDMixin, Base):
     '''Maps to sessions table for user sessions'''
     __tablename__ = "sessions"
 
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     user_agent = Column(Text)
     ip_address = Column(String(45))  # IPv6 compatible
     expires_at = Column(DateTime(timezone=True), nullable=False)
@@ -70,5 +96,56 @@ class Session(TimestampMixin, IDMixin, Base):
 
 
 
+class Permission(Base):
+    '''Maps to `permissions`; the id is the bit position in the token bitset (app.auth.services.permissions)'''
+    __tablename__ = "permissions"
+
+    id = Column(SmallInteger, primary_key=True, autoincrement=False)
+    name = Column(String(100), unique=True, nullable=False)
+    description = Column(Text)
+
+    __table_args__ = (CheckConstraint("id BETWEEN 0 AND 62", name="ck_permissions_bit"),)  # bits of a bigint
+
+
+class Role(TimestampMixin, IDMixin, Base):
+    '''Maps to `roles`, a named set of permissions'''
+    __tablename__ = "roles"
+
+    name = Column(String(50), unique=True, nullable=False)
+    description = Column(Text)
+
+    permissions = relationship("Permission", secondary="role_permissions", lazy="selectin")
+    users = relationship("User", secondary="user_roles", back_populates="roles")
+
+
+class RolePermission(Base):
+    __tablename__ = "role_permissions"
+
+    role_id = Column(UUID(as_uuid=True), ForeignKey("roles.id", ondelete="CASCADE"), primary_key=True)
+    permission_id = Column(SmallInteger, ForeignKey("permissions.id", ondelete="CASCADE"), primary_key=True)
+
+
+class UserRole(Base):
+    __tablename__ = "user_roles"
+
+    # (user_id, role_id) order: roles are looked up per user at token issuance
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    role_id = Column(UUID(as_uuid=True), ForeignKey("roles.id", ondelete="CASCADE"), primary_key=True)
+
+
+class AuditEvent(Base):
+    '''Maps to `audit_log`, written in batches with COPY by app.core.audit'''
+    __tablename__ = "audit_log"
+
+    id = Column(BigInteger, Identity(), primary_key=True)
+    occurred_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    event = Column(String(50), nullable=False)
+    # no foreign key: the trail outlives deleted users, and a COPY batch would fail whole on one stale id
+    user_id = Column(UUID(as_uuid=True), index=True)
+    email = Column(String(255))
+    ip_address = Column(String(45))  # IPv6 compatible
+    detail = Column(JSONB)
+
+
 # Export models
-__all__ = ["User", "OTPToken", "Session"]
\ No newline at end of file
+__all__ = ["User", "OTPToken", "Session", "Permission", "Role", "RolePermission", "UserRole", "AuditEvent"]
\ No newline at end of file
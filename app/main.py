@@ -1,23 +1,65 @@
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse, Response
+import asyncio
+from contextlib import suppress
+from typing import Literal
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse, RedirectResponse, Response
 from fastapi.openapi.docs import get_swagger_ui_html
+from app.auth.dependencies import Principal, get_current_superuser
 from app.auth.routes import router as auth_router
-from app.user.routes import router as user_router
-from app.db.connection import init_pool, close_pool
+from app.user.routes import admin_router as user_admin_router, router as user_router
+from app.db.connection import LazyConnection, conn_ctx, get_conn, init_pool, close_pool, shard_connectors
+from app.db.instrumentation import DBStatsMiddleware, reset_statement_stats, statement_report
+from app.core.admission import Overloaded
+from app.core.audit import audit_log, build_sink
+from app.core.health import health_monitor
+from app.core.profiling import ProfilerBusy, collapsed, cpu_profiler, memory_tracer, task_stacks
+from app.core.responses import ORJSONResponse
+from app.core.config import settings
+from app.auth.services.email_filter import email_filter
+from app.user.services.deletion import account_purger
 from contextlib import asynccontextmanager
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_pool()
+
+    background_tasks = [asyncio.create_task(health_monitor.run())]
+    if settings.EMAIL_FILTER_ENABLED:
+        background_tasks.append(asyncio.create_task(email_filter.run(shard_connectors())))
+    if settings.ACCOUNT_PURGE_ENABLED:
+        # users live on the shards, each purged by its own worker
+        for connect in shard_connectors():
+            background_tasks.append(asyncio.create_task(account_purger.run(connect)))
+    if settings.AUDIT_ENABLED:
+        # cancelling it flushes the remaining events, so it must stop before the pool closes
+        background_tasks.append(asyncio.create_task(audit_log.run(build_sink(conn_ctx))))
+
     yield
+
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
     await close_pool()
 
 
 app = FastAPI(
     title="AuthPad API",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+    )
+
+app.add_middleware(DBStatsMiddleware)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return ORJSONResponse(
+        {"detail": "Server is busy, please retry later"},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
     )
 
 
@@ -39,6 +81,118 @@ async def swagger_ui():
     )
 
 
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    '''Liveness: the worker is up and its event loop answers. Never touches the database.'''
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    '''Readiness from the background health snapshot: 503 while starting, degraded or overloaded'''
+    snapshot = health_monitor.current()
+    if snapshot is None:
+        return ORJSONResponse({"status": "starting"}, status_code=503)
+    return ORJSONResponse(snapshot.as_dict(), status_code=200 if snapshot.ready else 503)
+
+
+async def _profiling_guard(
+    current_user: Principal = Depends(get_current_superuser),
+    conn: LazyConnection = Depends(get_conn)
+) -> None:
+    '''Superusers only, and only with PROFILING_ENABLED; no pool connection is held while profiling'''
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    await conn.release()
+
+
+def _profile_seconds(seconds: float = Query(5.0, gt=0)) -> float:
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must not exceed {settings.PROFILE_MAX_SECONDS:g}",
+        )
+    return seconds
+
+
+@app.get("/debug/profile/cpu", response_class=PlainTextResponse, dependencies=[Depends(_profiling_guard)],
+         tags=["Diagnostics"])
+async def profile_cpu(
+    seconds: float = Depends(_profile_seconds),
+    format: Literal["collapsed", "pstats"] = "collapsed",
+    limit: int = Query(50, ge=1, le=1000, description="pstats: number of functions listed"),
+) -> PlainTextResponse:
+    '''
+    Profile this worker's event loop for `seconds`.
+
+    `collapsed` samples the loop's stack every PROFILE_SAMPLE_INTERVAL_MS from
+    another thread (low overhead; feed it to a flame graph tool). `pstats`
+    runs cProfile for exact call counts and cumulative times, slowing the
+    worker while it runs. One profile at a time (409 otherwise).
+    '''
+    try:
+        if format == "pstats":
+            report = await cpu_profiler.trace(seconds, limit)
+        else:
+            report = collapsed(await cpu_profiler.sample(seconds, settings.PROFILE_SAMPLE_INTERVAL_MS / 1000))
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(report)
+
+
+@app.post("/debug/memory/start", dependencies=[Depends(_profiling_guard)], tags=["Diagnostics"])
+async def memory_start(frames: int = Query(1, ge=1, le=64)):
+    '''Start tracemalloc (slows allocations and uses memory until stopped)'''
+    memory_tracer.start(frames)
+    return memory_tracer.traced_memory()
+
+
+@app.post("/debug/memory/snapshot", dependencies=[Depends(_profiling_guard)], tags=["Diagnostics"])
+async def memory_snapshot(limit: int = Query(25, ge=1, le=500), key: Literal["lineno", "filename", "traceback"] = "lineno"):
+    '''Take the baseline snapshot, return its largest allocation sites'''
+    try:
+        return {**memory_tracer.traced_memory(), "top": memory_tracer.snapshot(limit, key)}
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@app.get("/debug/memory/diff", dependencies=[Depends(_profiling_guard)], tags=["Diagnostics"])
+async def memory_diff(limit: int = Query(25, ge=1, le=500), key: Literal["lineno", "filename", "traceback"] = "lineno"):
+    '''Allocation growth since the baseline snapshot, largest first'''
+    try:
+        return {**memory_tracer.traced_memory(), "diff": memory_tracer.diff(limit, key)}
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@app.post("/debug/memory/stop", dependencies=[Depends(_profiling_guard)], tags=["Diagnostics"])
+async def memory_stop():
+    '''Stop tracemalloc and drop the baseline'''
+    memory_tracer.stop()
+    return memory_tracer.traced_memory()
+
+
+@app.get("/debug/tasks", response_class=PlainTextResponse, dependencies=[Depends(_profiling_guard)],
+         tags=["Diagnostics"])
+async def dump_tasks(limit: int | None = Query(None, ge=1, description="frames per task")) -> PlainTextResponse:
+    '''Stacks of every asyncio task of this worker'''
+    return PlainTextResponse(task_stacks(limit))
+
+
+@app.get("/debug/db/statements", dependencies=[Depends(_profiling_guard)], tags=["Diagnostics"])
+async def db_statements(limit: int = Query(50, ge=1, le=1000)):
+    '''Statement fingerprints of this worker by total DB time (since start or the last reset)'''
+    return {"statements": statement_report(limit)}
+
+
+@app.delete("/debug/db/statements", dependencies=[Depends(_profiling_guard)], tags=["Diagnostics"])
+async def db_statements_reset():
+    '''Start a new statement stats window'''
+    reset_statement_stats()
+    return {"statements": []}
+
+
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(user_router, prefix="/users", tags=["User Management"])
 app.include_router(user_router, prefix="/user", tags=["User Management (Legacy)"])
+app.include_router(user_admin_router, prefix="/users", tags=["User Administration"])
@@ -0,0 +1,301 @@
+'''
+Production server for AuthPad.
+
+    python -m app --workers 4 --port 8000 --reuse-port
+
+A small pre-fork supervisor: the master imports the app once (preload),
+forks N uvicorn workers running uvloop + httptools, respawns workers
+that die, and on SIGTERM/SIGINT lets every worker drain its in-flight
+requests before exiting. The DB connection budget is split evenly so the
+instance never opens more than DB_CONNECTION_BUDGET connections in total.
+'''
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from dataclasses import dataclass
+
+
+logger = logging.getLogger("app.server")
+
+APP_PATH = "app.main:app"
+STARTUP_FAILURE = 3  # uvicorn's exit code when lifespan startup fails
+
+
+@dataclass(frozen=True)
+class ServerOptions:
+    app: str = APP_PATH
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 1
+    reuse_port: bool = False
+    preload: bool = True
+    graceful_timeout: int = 30
+    backlog: int = 2048
+    log_level: str = "info"
+    access_log: bool = False
+
+
+def default_workers() -> int:
+    return int(os.environ.get("WEB_CONCURRENCY", 0)) or os.cpu_count() or 1
+
+
+def worker_pool_sizes(budget: int | None, workers: int, min_size: int, max_size: int) -> tuple[int, int]:
+    '''
+    Split a global DB connection budget across workers.
+
+    Returns (min_size, max_size) for each worker's pool. Without a budget
+    the configured sizes are used as-is.
+    '''
+
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    if budget is None:
+        return min(min_size, max_size), max_size
+    if budget < workers:
+        raise ValueError(f"DB connection budget ({budget}) is smaller than the number of workers ({workers})")
+
+    per_worker = budget // workers
+    return min(min_size, per_worker), per_worker
+
+
+def bind_socket(host: str, port: int, reuse_port: bool = False, backlog: int = 2048) -> socket.socket:
+    '''Create a listening TCP socket, optionally with SO_REUSEPORT'''
+
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _uvicorn_config(options: ServerOptions):
+    import uvicorn
+
+    return uvicorn.Config(
+        options.app,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        backlog=options.backlog,
+        log_level=options.log_level,
+        access_log=options.access_log,
+        timeout_graceful_shutdown=options.graceful_timeout,
+    )
+
+
+def _serve_worker(options: ServerOptions, sock: socket.socket | None) -> None:
+    '''Worker body, runs in the forked child'''
+    import uvicorn
+
+    # Drop the master's handlers, uvicorn installs its own graceful ones
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    if sock is None:
+        # SO_REUSEPORT: every worker owns a socket and the kernel balances between them
+        sock = bind_socket(options.host, options.port, reuse_port=True, backlog=options.backlog)
+
+    uvicorn.Server(_uvicorn_config(options)).run(sockets=[sock])
+
+
+class Supervisor:
+    '''Pre-fork master: spawns, watches and drains the uvicorn workers'''
+
+    def __init__(self, options: ServerOptions, sock: socket.socket | None) -> None:
+        self.options = options
+        self.sock = sock
+        self.children: dict[int, int] = {}  # pid -> worker slot
+        self.stopping = False
+        self.failed = False
+
+    def spawn(self, slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _serve_worker(self.options, self.sock)
+            except SystemExit as exc:
+                code = exc.code if isinstance(exc.code, int) else 1
+            except BaseException:
+                logger.exception("worker %d crashed", slot)
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = slot
+        logger.info("started worker %d (pid %d)", slot, pid)
+
+    def _request_stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def _reap(self) -> list[int]:
+        '''Collect exited children, return their worker slots'''
+        freed = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            slot = self.children.pop(pid, None)
+            if slot is None:
+                continue
+            freed.append(slot)
+            if self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            logger.warning("worker %d (pid %d) exited with code %d", slot, pid, code)
+            if code == STARTUP_FAILURE:
+                # Respawning cannot fix a broken config or an unreachable DB
+                logger.error("worker %d failed to boot, stopping the server", slot)
+                self.failed = True
+                self.stopping = True
+        return freed
+
+    def drain(self) -> None:
+        '''Ask every worker to finish in-flight requests, kill stragglers after the grace period'''
+
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + self.options.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+
+        for pid in list(self.children):
+            logger.warning("worker pid %d did not drain in time, killing it", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.children:
+            self._reap()
+            time.sleep(0.05)
+
+    def run(self) -> bool:
+        '''Supervise until a stop signal or a boot failure, return False on failure'''
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        for slot in range(self.options.workers):
+            self.spawn(slot)
+
+        while not self.stopping:
+            for slot in self._reap():
+                if not self.stopping:
+                    self.spawn(slot)
+            time.sleep(0.5)
+
+        logger.info("shutting down, draining %d workers", len(self.children))
+        self.drain()
+        return not self.failed
+
+
+def configure_db_pool(workers: int) -> tuple[int, int]:
+    '''Size each worker's pool from DB_CONNECTION_BUDGET (inherited by the forked workers)'''
+    from app.core.config import settings
+
+    min_size, max_size = worker_pool_sizes(
+        settings.DB_CONNECTION_BUDGET,
+        workers,
+        settings.DB_POOL_MIN_SIZE,
+        settings.DB_POOL_MAX_SIZE,
+    )
+    settings.DB_POOL_MIN_SIZE = min_size
+    settings.DB_POOL_MAX_SIZE = max_size
+    return min_size, max_size
+
+
+def check_worker_settings(workers: int) -> None:
+    '''
+    Refuse settings that keep auth state per process when several workers
+    serve the same users: each worker would see only its own share of it.
+    '''
+    from app.core.config import settings
+
+    if workers < 2 or settings.OTP_STORE == "shared":
+        return
+    if settings.OTP_STORE == "memory":
+        raise ValueError(f"OTP_STORE=memory keeps OTPs per process, use OTP_STORE=shared with {workers} workers")
+    if settings.OTP_MODE == "derived":
+        # attempt counters and replay markers would be per worker: one code replayable once per worker
+        raise ValueError(f"OTP_MODE=derived needs OTP_STORE=shared with {workers} workers")
+    logger.warning(
+        "OTP_STORE=%s: 2FA replay markers, 2FA attempt counters and OTP resend cooldowns are kept per worker "
+        "(%d workers); set OTP_STORE=shared to enforce them across workers",
+        settings.OTP_STORE, workers,
+    )
+
+
+def run(options: ServerOptions) -> bool:
+    check_worker_settings(options.workers)
+    min_size, max_size = configure_db_pool(options.workers)
+    logger.info(
+        "%d workers, DB pool %d-%d per worker (%d connections max)",
+        options.workers, min_size, max_size, max_size * options.workers,
+    )
+
+    if not hasattr(os, "fork"):
+        # No pre-fork model available (Windows): single process
+        import uvicorn
+        server = uvicorn.Server(_uvicorn_config(options))
+        server.run(sockets=[bind_socket(options.host, options.port, backlog=options.backlog)])
+        return server.started
+
+    if options.preload:
+        # Import once in the master so workers fork with the app already loaded
+        import uvicorn.importer
+        uvicorn.importer.import_from_string(options.app)
+
+    sock = None if options.reuse_port else bind_socket(options.host, options.port, backlog=options.backlog)
+    return Supervisor(options, sock).run()
+
+
+def parse_args(argv: list[str] | None = None) -> ServerOptions:
+    parser = argparse.ArgumentParser(prog="python -m app", description="Run the AuthPad production server")
+    parser.add_argument("--app", default=APP_PATH, help="ASGI app import path (default: %(default)s)")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="worker processes (default: $WEB_CONCURRENCY or CPU count)")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="one SO_REUSEPORT socket per worker instead of a shared socket")
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="import the app in each worker instead of once before forking")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds a worker may spend draining requests on shutdown")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return ServerOptions(**vars(args))
+
+
+def main(argv: list[str] | None = None) -> None:
+    options = parse_args(argv)
+    logging.basicConfig(level=options.log_level.upper(), stream=sys.stderr,
+                        format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    try:
+        ok = run(options)
+    except ValueError as e:
+        logger.error("%s", e)
+        sys.exit(2)
+    if not ok:
+        sys.exit(1)
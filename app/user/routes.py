@@ -1,14 +1,204 @@
-from fastapi import APIRouter, Depends
-from app.auth.dependencies import get_current_user
-from app.user.schemas import UserOut
+import logging
+from datetime import datetime
+from uuid import UUID
 
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from app.auth.dependencies import Principal, get_current_user, require_permission
+from app.auth.services.forward_auth import get_forward_auth_cache
+from app.auth.services.permissions import Permission
+from app.auth.services.totp import get_totp_verifier
+from app.core.admission import Priority, admit
+from app.core.audit import audit_log
+from app.core.config import settings
+from app.core.responses import ORJSONResponse
+from app.db.connection import LazyConnection, find_shard, get_conn, shard_connectors
+from app.user.schemas import (
+    AdminUserPage,
+    BulkUserRequest,
+    DeletionRequested,
+    DeletionStatus,
+    UserOut,
+    admin_user_out_serializer,
+    user_out_serializer,
+)
+from app.user.services.admin import (
+    BulkAction,
+    UserFilter,
+    bulk_update_sharded,
+    list_users_sharded,
+)
+from app.user.services.deletion import deletion_status, mark_deleted
+
+
+logger = logging.getLogger("app.user.admin")
 
 router = APIRouter()
+# Mounted at /users only (not under the legacy /user prefix). Every route
+# also requires a permission; superusers hold all of them.
+admin_router = APIRouter(dependencies=[Depends(get_current_user)])
 
 
-@router.get("/me", response_model=UserOut)
-async def get_me(current_user = Depends(get_current_user)):
+@router.get("/me", response_model=UserOut, dependencies=[Depends(admit(Priority.CRITICAL))])
+async def get_me(current_user: Principal = Depends(get_current_user)) -> Response:
     """
     Return the current user's info using a valid JWT token.
     """
-    return UserOut(**dict(current_user))
\ No newline at end of file
+    return user_out_serializer.response(current_user)
+
+
+async def _delete_account(conn, user_id: UUID, requested_by: Principal) -> DeletionRequested:
+    deleted_at = await mark_deleted(conn, user_id)
+    if deleted_at is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found or already deleted")
+
+    # Nothing cached may keep authenticating the account
+    get_forward_auth_cache().clear()
+    get_totp_verifier().forget(str(user_id))
+    audit_log.record("account.deleted", user_id=user_id, detail={"requested_by": str(requested_by["id"])})
+    return DeletionRequested(user_id=user_id, deleted_at=deleted_at)
+
+
+@router.delete("/me", response_model=DeletionRequested, status_code=status.HTTP_202_ACCEPTED)
+async def delete_me(
+    current_user: Principal = Depends(get_current_user),
+    conn: LazyConnection = Depends(get_conn)
+) -> DeletionRequested:
+    '''
+    Delete the current user's account.
+
+    Access is revoked immediately; the account data is removed in the background.
+    '''
+    return await _delete_account(conn, current_user["id"], current_user)
+
+
+@admin_router.get("", response_model=AdminUserPage, dependencies=[Depends(require_permission(Permission.USERS_READ))])
+async def list_users_admin(
+    is_active: bool | None = None,
+    is_verified: bool | None = None,
+    is_superuser: bool | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    last_login_after: datetime | None = None,
+    last_login_before: datetime | None = None,
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=500)
+) -> Response:
+    '''
+    List users for administrators, newest first, with keyset pagination.
+
+    Pass the returned `next_cursor` to get the next page; it is null on the
+    last page. Every page costs the same, however deep.
+
+    Raises:
+        HTTPException:
+            - 400: If the cursor is invalid.
+            - 403: Without the users:read permission.
+    '''
+
+    filters = UserFilter(
+        is_active=is_active,
+        is_verified=is_verified,
+        is_superuser=is_superuser,
+        created_after=created_after,
+        created_before=created_before,
+        last_login_after=last_login_after,
+        last_login_before=last_login_before,
+    )
+    try:
+        rows, next_cursor = await list_users_sharded(shard_connectors(), filters, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return ORJSONResponse({
+        "items": [admin_user_out_serializer.to_dict(row) for row in rows],
+        "next_cursor": next_cursor,
+    })
+
+
+@admin_router.post(
+    "/bulk/{action}",
+    response_class=StreamingResponse,
+    dependencies=[Depends(require_permission(Permission.USERS_UPDATE))],
+)
+async def bulk_user_action(
+    action: BulkAction,
+    payload: BulkUserRequest,
+    current_user: Principal = Depends(get_current_user)
+) -> StreamingResponse:
+    '''
+    Apply an admin action (deactivate, activate, unlock, force_reverify) to
+    many users, selected by ids or by the listing filters.
+
+    Runs in chunks of ADMIN_BULK_CHUNK_SIZE rows, one short transaction each,
+    and streams progress as NDJSON: one `{"processed", "updated"}` line per
+    chunk, then a final line with `"done": true` (or an `"error"`).
+    '''
+
+    chunk_size = settings.ADMIN_BULK_CHUNK_SIZE
+
+    async def progress():
+        # Own connections: the stream outlives the request's dependencies
+        last = {"processed": 0, "updated": 0}
+        if payload.ids is not None:
+            selection = {"ids": list(dict.fromkeys(payload.ids))}
+        else:
+            selection = {"filters": UserFilter(**payload.filter.model_dump())}
+        try:
+            async for last in bulk_update_sharded(shard_connectors(), action, chunk_size, **selection):
+                # cached identities of changed users must not outlive the change
+                get_forward_auth_cache().clear()
+                yield orjson.dumps(last) + b"\n"
+        except Exception as e:
+            logger.exception("bulk %s failed after %d users", action.value, last["processed"])
+            yield orjson.dumps({**last, "done": False, "error": str(e)}) + b"\n"
+            return
+        finally:
+            audit_log.record(
+                "admin.bulk", user_id=current_user["id"], email=current_user["email"],
+                detail={"action": action.value, **last},
+            )
+        yield orjson.dumps({**last, "done": True}) + b"\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+
+@admin_router.delete(
+    "/{user_id}",
+    response_model=DeletionRequested,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(require_permission(Permission.USERS_DELETE))],
+)
+async def delete_user_admin(
+    user_id: UUID,
+    current_user: Principal = Depends(get_current_user),
+    conn: LazyConnection = Depends(get_conn)
+) -> DeletionRequested:
+    '''Delete a user: access is revoked at once, data is purged in the background'''
+    shard = await find_shard("SELECT 1 FROM users WHERE id = $1", user_id)
+    if shard is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found or already deleted")
+    await conn.use_shard(shard)
+    return await _delete_account(conn, user_id, current_user)
+
+
+@admin_router.get(
+    "/{user_id}/deletion",
+    response_model=DeletionStatus,
+    dependencies=[Depends(require_permission(Permission.USERS_READ))],
+)
+async def user_deletion_status(
+    user_id: UUID,
+    conn: LazyConnection = Depends(get_conn)
+) -> Response:
+    '''
+    Progress of an account deletion: "pending" with the dependent rows left,
+    "purged" once the user row is gone (also for ids that never existed),
+    "active" if no deletion was requested.
+    '''
+    shard = await find_shard("SELECT 1 FROM users WHERE id = $1", user_id)
+    if shard is None:
+        return ORJSONResponse({"user_id": user_id, "state": "purged"})
+    await conn.use_shard(shard)
+    return ORJSONResponse(await deletion_status(conn, user_id))
@@ -1,7 +1,9 @@
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+
+from app.core.responses import ModelSerializer
 
 
 class UserOut(BaseModel):
@@ -12,4 +14,65 @@ class UserOut(BaseModel):
 
     model_config = {
         "from_attributes": True
-    }
\ No newline at end of file
+    }
+
+
+user_out_serializer = ModelSerializer(UserOut)
+
+
+class AdminUserOut(BaseModel):
+    id: UUID
+    email: str
+    username: str | None = None
+    is_verified: bool
+    is_active: bool
+    is_superuser: bool
+    created_at: datetime
+    last_login: datetime | None = None
+
+
+admin_user_out_serializer = ModelSerializer(AdminUserOut)
+
+
+class AdminUserPage(BaseModel):
+    items: list[AdminUserOut]
+    next_cursor: str | None = None
+
+
+class DeletionRequested(BaseModel):
+    user_id: UUID
+    state: str = "pending"
+    deleted_at: datetime
+
+
+class DeletionStatus(BaseModel):
+    user_id: UUID
+    state: str  # "active", "pending" or "purged"
+    deleted_at: datetime | None = None
+    remaining: dict[str, int] | None = None  # dependent rows left, per table
+
+
+class UserFilterIn(BaseModel):
+    is_active: bool | None = None
+    is_verified: bool | None = None
+    is_superuser: bool | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    last_login_after: datetime | None = None
+    last_login_before: datetime | None = None
+
+    model_config = {"extra": "forbid"}
+
+
+# Target users by explicit ids or by a listing filter, not both
+class BulkUserRequest(BaseModel):
+    ids: list[UUID] | None = Field(None, min_length=1, max_length=100_000)
+    filter: UserFilterIn | None = None
+
+    model_config = {"extra": "forbid"}
+
+    @model_validator(mode="after")
+    def _one_target(self) -> "BulkUserRequest":
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Provide either ids or filter")
+        return self
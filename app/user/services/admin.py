@@ -0,0 +1,224 @@
+import asyncio
+import base64
+import heapq
+from collections.abc import AsyncIterator, Callable, Sequence
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from uuid import UUID
+
+import orjson
+
+
+# Columns of the admin listing, all included in the covering indexes on users
+LIST_COLUMNS = "id, email, username, is_verified, is_active, is_superuser, created_at, last_login"
+
+
+@dataclass(frozen=True, slots=True)
+class UserFilter:
+    '''Admin listing filters, None means "any"'''
+    is_active: bool | None = None
+    is_verified: bool | None = None
+    is_superuser: bool | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    last_login_after: datetime | None = None
+    last_login_before: datetime | None = None
+
+    def where(self, args: list) -> list[str]:
+        '''SQL conditions for the set filters, appending their values to `args`'''
+        conditions = []
+
+        def add(sql: str, value) -> None:
+            args.append(value)
+            conditions.append(sql.format(f"${len(args)}"))
+
+        for column in ("is_active", "is_verified", "is_superuser"):
+            value = getattr(self, column)
+            if value is not None:
+                add(f"{column} = {{}}", value)
+        if self.created_after is not None:
+            add("created_at >= {}", self.created_after)
+        if self.created_before is not None:
+            add("created_at < {}", self.created_before)
+        if self.last_login_after is not None:
+            add("last_login >= {}", self.last_login_after)
+        if self.last_login_before is not None:
+            add("last_login < {}", self.last_login_before)
+        return conditions
+
+
+def encode_cursor(created_at: datetime, user_id: UUID) -> str:
+    raw = orjson.dumps([created_at.isoformat(), str(user_id)])
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    '''Raises ValueError for a cursor we did not issue'''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, user_id = orjson.loads(raw)
+        return datetime.fromisoformat(created_at), UUID(user_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def build_list_query(filters: UserFilter, cursor: str | None, limit: int) -> tuple[str, list]:
+    '''
+    Keyset-paginated listing, newest first.
+
+    The next page starts strictly after the (created_at, id) of the last row
+    seen, so every page is one index range scan on (created_at, id), however
+    deep it is. One extra row is fetched to know whether a next page exists.
+    '''
+
+    args: list = []
+    conditions = filters.where(args)
+    if cursor is not None:
+        created_at, user_id = decode_cursor(cursor)
+        args.extend((created_at, user_id))
+        conditions.append(f"(created_at, id) < (${len(args) - 1}, ${len(args)})")
+
+    args.append(limit + 1)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+        SELECT {LIST_COLUMNS}
+        FROM users
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ${len(args)}
+    """
+    return query, args
+
+
+def _page(rows: list, limit: int) -> tuple[list, str | None]:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return rows, next_cursor
+
+
+async def list_users(conn, filters: UserFilter, cursor: str | None, limit: int) -> tuple[list, str | None]:
+    '''One page of users and the cursor of the next page (None on the last page)'''
+    query, args = build_list_query(filters, cursor, limit)
+    return _page(await conn.fetch(query, *args), limit)
+
+
+async def list_users_sharded(
+        connects: Sequence[Callable],
+        filters: UserFilter,
+        cursor: str | None,
+        limit: int
+) -> tuple[list, str | None]:
+    '''
+    `list_users` over every shard (`connects` from shard_connectors()). The
+    keyset order is global, so each shard's next page is fetched concurrently
+    and the pages are merged; the first `limit` rows are the global page.
+    '''
+    query, args = build_list_query(filters, cursor, limit)
+
+    async def shard_page(connect) -> list:
+        async with connect() as conn:
+            return await conn.fetch(query, *args)
+
+    pages = await asyncio.gather(*(shard_page(connect) for connect in connects))
+    rows = list(heapq.merge(*pages, key=lambda row: (row["created_at"], row["id"]), reverse=True))
+    return _page(rows, limit)
+
+
+class BulkAction(str, Enum):
+    DEACTIVATE = "deactivate"
+    ACTIVATE = "activate"
+    UNLOCK = "unlock"
+    FORCE_REVERIFY = "force_reverify"
+
+
+# action -> (SET clause, condition matching rows the action would change)
+BULK_UPDATES = {
+    BulkAction.DEACTIVATE: ("is_active = false", "is_active IS DISTINCT FROM false"),
+    # deleted accounts are waiting for the purge worker and stay inactive
+    BulkAction.ACTIVATE: ("is_active = true", "is_active IS DISTINCT FROM true AND deleted_at IS NULL"),
+    BulkAction.UNLOCK: (
+        "failed_login_attempts = 0, locked_until = NULL",
+        "(failed_login_attempts IS DISTINCT FROM 0 OR locked_until IS NOT NULL)",
+    ),
+    BulkAction.FORCE_REVERIFY: (
+        "is_verified = false, email_verified_at = NULL",
+        "(is_verified IS DISTINCT FROM false OR email_verified_at IS NOT NULL)",
+    ),
+}
+
+
+def _bulk_query(action: BulkAction) -> str:
+    set_clause, changes = BULK_UPDATES[action]
+    return f"UPDATE users SET {set_clause} WHERE id = ANY($1::uuid[]) AND {changes}"
+
+
+async def chunk_ids(ids: list[UUID], chunk_size: int) -> AsyncIterator[list[UUID]]:
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start:start + chunk_size]
+
+
+async def filtered_id_chunks(conn, filters: UserFilter, chunk_size: int) -> AsyncIterator[list[UUID]]:
+    '''Ids matching `filters`, walked with the listing's keyset so rows changed meanwhile are never revisited'''
+    cursor = None
+    while True:
+        rows, cursor = await list_users(conn, filters, cursor, chunk_size)
+        if rows:
+            yield [row["id"] for row in rows]
+        if cursor is None:
+            return
+
+
+async def bulk_update(conn, action: BulkAction, chunks: AsyncIterator[list[UUID]]) -> AsyncIterator[dict]:
+    '''
+    Apply `action` chunk by chunk, yielding progress after each chunk.
+
+    Every chunk is one `UPDATE ... WHERE id = ANY($1)` in its own implicit
+    transaction, so row locks on `users` are held for one chunk at most.
+    Rows already in the target state are skipped (no write, no WAL).
+    '''
+
+    query = _bulk_query(action)
+    processed = updated = 0
+    async for chunk in chunks:
+        result = await conn.execute(query, chunk)
+        processed += len(chunk)
+        updated += int(result.split()[-1])
+        yield {"processed": processed, "updated": updated}
+
+
+async def bulk_update_sharded(
+        connects: Sequence[Callable],
+        action: BulkAction,
+        chunk_size: int,
+        ids: list[UUID] | None = None,
+        filters: UserFilter | None = None
+) -> AsyncIterator[dict]:
+    '''
+    `bulk_update` over every shard. Ids do not route, so each chunk of ids
+    goes to all shards (only the one holding a user changes it); filtered
+    updates walk the shards one after the other.
+    '''
+
+    processed = updated = 0
+    if ids is not None:
+        query = _bulk_query(action)
+        async with AsyncExitStack() as stack:
+            conns = [await stack.enter_async_context(connect()) for connect in connects]
+            async for chunk in chunk_ids(ids, chunk_size):
+                for conn in conns:
+                    updated += int((await conn.execute(query, chunk)).split()[-1])
+                processed += len(chunk)
+                yield {"processed": processed, "updated": updated}
+        return
+
+    for connect in connects:
+        async with connect() as conn:
+            progress = {"processed": 0, "updated": 0}
+            async for progress in bulk_update(conn, action, filtered_id_chunks(conn, filters, chunk_size)):
+                yield {"processed": processed + progress["processed"], "updated": updated + progress["updated"]}
+        processed += progress["processed"]
+        updated += progress["updated"]
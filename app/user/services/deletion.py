@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from uuid import UUID
+
+from app.core.config import settings
+
+
+logger = logging.getLogger("app.user.deletion")
+
+# Tables referencing users.id (ON DELETE CASCADE), emptied in batches before the user row
+DEPENDENT_TABLES = ("otp_tokens", "sessions")
+
+# Session-level advisory lock: one purging worker at a time across the instance
+PURGE_LOCK_KEY = 0x61757468_7075_7267  # "authpurg"
+
+
+async def mark_deleted(conn, user_id: UUID) -> datetime | None:
+    '''
+    Request deletion: the user is deactivated at once (every auth path
+    rejects them from now on) and queued for the purge worker.
+    Returns the deletion time, None if the user does not exist or is already deleted.
+    '''
+    return await conn.fetchval(
+        """
+        UPDATE users
+        SET deleted_at = $2, is_active = false
+        WHERE id = $1 AND deleted_at IS NULL
+        RETURNING deleted_at
+        """,
+        user_id,
+        datetime.now(timezone.utc),
+    )
+
+
+async def deletion_status(conn, user_id: UUID) -> dict:
+    '''Where the deletion of a user stands: active, pending (with rows left) or purged'''
+    deleted_at = await conn.fetchval("SELECT deleted_at FROM users WHERE id = $1", user_id)
+    if deleted_at is None:
+        exists = await conn.fetchval("SELECT EXISTS (SELECT 1 FROM users WHERE id = $1)", user_id)
+        return {"user_id": user_id, "state": "active" if exists else "purged"}
+
+    remaining = {}
+    for table in DEPENDENT_TABLES:
+        remaining[table] = await conn.fetchval(f"SELECT count(*) FROM {table} WHERE user_id = $1", user_id)
+    return {"user_id": user_id, "state": "pending", "deleted_at": deleted_at, "remaining": remaining}
+
+
+class AccountPurger:
+    '''
+    Background removal of deleted accounts.
+
+    Dependent rows go first, BATCH_SIZE at a time with a short pause
+    between batches, so no statement holds many row locks or writes a large
+    burst of WAL. The user row itself is deleted last, when the cascade has
+    nothing left to do. Workers coordinate through an advisory lock.
+    '''
+
+    def __init__(self, batch_size: int | None = None, pause: float | None = None) -> None:
+        self.batch_size = batch_size
+        self.pause = pause
+
+    async def purge_user(self, conn, user_id: UUID) -> int:
+        '''Delete one deleted user and its dependents, return the number of rows removed'''
+        batch_size = self.batch_size or settings.ACCOUNT_PURGE_BATCH_SIZE
+        pause = settings.ACCOUNT_PURGE_PAUSE_SECONDS if self.pause is None else self.pause
+
+        removed = 0
+        for table in DEPENDENT_TABLES:
+            while True:
+                result = await conn.execute(
+                    f"""
+                    DELETE FROM {table}
+                    WHERE id IN (SELECT id FROM {table} WHERE user_id = $1 LIMIT $2)
+                    """,
+                    user_id,
+                    batch_size,
+                )
+                count = int(result.split()[-1])
+                removed += count
+                if count < batch_size:
+                    break
+                await asyncio.sleep(pause)
+
+        result = await conn.execute("DELETE FROM users WHERE id = $1 AND deleted_at IS NOT NULL", user_id)
+        return removed + int(result.split()[-1])
+
+    async def purge_pending(self, conn, limit: int = 100) -> int:
+        '''Purge up to `limit` deleted users, oldest request first; 0 if another worker is purging'''
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", PURGE_LOCK_KEY):
+            return 0
+        try:
+            user_ids = await conn.fetch(
+                "SELECT id FROM users WHERE deleted_at IS NOT NULL ORDER BY deleted_at LIMIT $1",
+                limit,
+            )
+            for row in user_ids:
+                removed = await self.purge_user(conn, row["id"])
+                logger.info("purged user %s (%d rows)", row["id"], removed)
+            return len(user_ids)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", PURGE_LOCK_KEY)
+
+    async def run(self, connect) -> None:
+        '''Background loop, every ACCOUNT_PURGE_INTERVAL_SECONDS. `connect` is one shard's (shard_connectors()).'''
+        while True:
+            try:
+                async with connect() as conn:
+                    await self.purge_pending(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("account purge failed")
+            await asyncio.sleep(settings.ACCOUNT_PURGE_INTERVAL_SECONDS)
+
+
+account_purger = AccountPurger()
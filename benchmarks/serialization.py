@@ -0,0 +1,127 @@
+'''
+Per-request serialization cost of UserOut and TokenResponse.
+
+Compares the previous path (build the model, let FastAPI revalidate it
+against `response_model` and render it) with the precomputed
+ModelSerializer path, both in isolation and through a full ASGI call.
+
+    python benchmarks/serialization.py [--number 20000]
+'''
+import argparse
+import asyncio
+import json
+import sys
+import time
+import timeit
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.auth.schemas import TokenResponse, token_response_serializer
+from app.core.responses import ORJSONResponse
+from app.user.schemas import UserOut, user_out_serializer
+
+
+USER_ROW = {
+    "id": uuid.uuid4(),
+    "email": "user@example.com",
+    "is_verified": True,
+    "is_active": True,
+    "created_at": datetime.now(timezone.utc),
+}
+
+TOKEN_DATA = {
+    "access_token": "a" * 180,
+    "refresh_token": "r" * 180,
+    "token_type": "bearer",
+    "expires_in": 3600,
+}
+
+
+def _validated(model, data) -> bytes:
+    instance = model(**data)
+    revalidated = model.model_validate(instance.model_dump())
+    return json.dumps(jsonable_encoder(revalidated)).encode()
+
+
+def _build_apps() -> tuple[FastAPI, FastAPI]:
+    standard = FastAPI(default_response_class=JSONResponse)
+    fast = FastAPI(default_response_class=ORJSONResponse)
+
+    @standard.get("/me", response_model=UserOut)
+    async def standard_me():
+        return UserOut(**USER_ROW)
+
+    @standard.post("/token", response_model=TokenResponse)
+    async def standard_token():
+        return TokenResponse(**TOKEN_DATA)
+
+    @fast.get("/me", response_model=UserOut)
+    async def fast_me():
+        return user_out_serializer.response(USER_ROW)
+
+    @fast.post("/token", response_model=TokenResponse)
+    async def fast_token():
+        return token_response_serializer.response(TOKEN_DATA)
+
+    return standard, fast
+
+
+async def _asgi_call(app: FastAPI, method: str, path: str) -> None:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def _asgi_us_per_request(app: FastAPI, method: str, path: str, number: int) -> float:
+    for _ in range(200):  # warm up route caches
+        await _asgi_call(app, method, path)
+
+    start = time.perf_counter()
+    for _ in range(number):
+        await _asgi_call(app, method, path)
+    return (time.perf_counter() - start) / number * 1e6
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="iterations per measurement")
+    args = parser.parse_args(argv)
+    number = args.number
+
+    print("serialization only (us/op)")
+    for name, model, serializer, data in (
+        ("UserOut", UserOut, user_out_serializer, USER_ROW),
+        ("TokenResponse", TokenResponse, token_response_serializer, TOKEN_DATA),
+    ):
+        validated = timeit.timeit(lambda: _validated(model, data), number=number) / number * 1e6
+        fast = timeit.timeit(lambda: serializer.dumps(data), number=number) / number * 1e6
+        print(f"  {name:<14} validated {validated:7.2f}   precomputed {fast:7.2f}   x{validated / fast:.1f}")
+
+    standard, fast_app = _build_apps()
+    print()
+    print("full ASGI request (us/request)")
+    for method, path in (("GET", "/me"), ("POST", "/token")):
+        before = asyncio.run(_asgi_us_per_request(standard, method, path, number))
+        after = asyncio.run(_asgi_us_per_request(fast_app, method, path, number))
+        print(f"  {method} {path:<8} validated {before:7.2f}   precomputed {after:7.2f}   x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+'''
+Cold start benchmark for AuthPad.
+
+Prints an `-X importtime` breakdown of `import app.main` and the
+time-to-first-response of a fresh interpreter.
+
+    python benchmarks/startup.py [--top 20] [--runs 5]
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Import + first response of a fresh process, in milliseconds (override with STARTUP_BUDGET_MS)
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 1500))
+
+# Modules the request path does not need at startup; they must load on first use
+LAZY_MODULES = ("sqlalchemy", "aiosmtplib", "jinja2", "passlib", "email.mime")
+
+
+_FIRST_RESPONSE_SNIPPET = '''
+import asyncio, json, sys, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+from app.core.config import get_settings
+settings_built = get_settings.cache_info().currsize > 0
+
+async def first_response():
+    messages = []
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+             "method": "GET", "scheme": "http", "path": "/favicon.ico", "raw_path": b"/favicon.ico",
+             "query_string": b"", "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+status = asyncio.run(first_response())
+done = time.perf_counter()
+
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_response_ms": (done - start) * 1000,
+    "status": status,
+    "settings_built_at_import": settings_built,
+    "loaded_lazy_modules": [m for m in %r if m in sys.modules],
+}))
+''' % (LAZY_MODULES,)
+
+
+def _clean_env() -> dict:
+    env = {key: value for key, value in os.environ.items() if not key.startswith("PYTHON")}
+    env["PYTHONPATH"] = str(PROJECT_ROOT)
+    return env
+
+
+def measure_first_response() -> dict:
+    '''Run a fresh interpreter that imports the app and serves one request'''
+
+    result = subprocess.run(
+        [sys.executable, "-c", _FIRST_RESPONSE_SNIPPET],
+        cwd=PROJECT_ROOT,
+        env=_clean_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_breakdown(module: str = "app.main") -> list[tuple[int, int, str]]:
+    '''Return (cumulative_us, self_us, module) for every import, slowest first'''
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        env=_clean_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return sorted(rows, reverse=True)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=20, help="number of imports to show")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to average over")
+    args = parser.parse_args(argv)
+
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in import_breakdown()[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:8.1f}  {name}")
+
+    runs = [measure_first_response() for _ in range(args.runs)]
+    import_ms = statistics.median(run["import_ms"] for run in runs)
+    first_ms = statistics.median(run["first_response_ms"] for run in runs)
+
+    print()
+    print(f"import app.main:      {import_ms:8.1f} ms (median of {args.runs})")
+    print(f"time to 1st response: {first_ms:8.1f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)")
+    print(f"lazy modules loaded:  {runs[-1]['loaded_lazy_modules'] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
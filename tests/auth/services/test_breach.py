@@ -0,0 +1,74 @@
+import hashlib
+import io
+import pytest
+
+from app.auth.services.breach import DATA_OFFSET, BreachedPasswords, build_index, main, parse_dump
+
+
+def sha1_line(password: str, count: int = 3) -> str:
+    return f"{hashlib.sha1(password.encode()).hexdigest().upper()}:{count}"
+
+
+BREACHED = ["password", "123456", "qwerty123", "letmein!"]
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    lines = sorted(sha1_line(p) for p in BREACHED)
+    path = tmp_path / "breached.idx"
+    build_index(parse_dump(lines), str(path))
+    return path
+
+
+def test_lookup_finds_breached_passwords_only(index_path):
+    index = BreachedPasswords(str(index_path))
+    try:
+        assert len(index) == len(BREACHED)
+        assert all(password in index for password in BREACHED)
+        assert "correct horse battery staple" not in index
+        assert "Password" not in index
+    finally:
+        index.close()
+
+
+def test_lookup_across_many_buckets(tmp_path):
+    passwords = [f"pw{i}" for i in range(5000)]
+    digests = sorted(hashlib.sha1(p.encode()).digest() for p in passwords)
+    path = tmp_path / "many.idx"
+    assert build_index(digests + digests[-1:], str(path), width=4) == 5000  # duplicates collapse
+
+    index = BreachedPasswords(str(path))
+    try:
+        assert path.stat().st_size == DATA_OFFSET + 5000 * 4
+        assert all(p in index for p in passwords[::97])
+        assert not any(f"other{i}" in index for i in range(200))
+    finally:
+        index.close()
+
+
+def test_builder_rejects_unsorted_or_malformed_input(tmp_path):
+    lines = sorted(sha1_line(p) for p in BREACHED)
+    with pytest.raises(ValueError):
+        build_index(parse_dump(reversed(lines)), str(tmp_path / "a.idx"))
+    with pytest.raises(ValueError):
+        build_index(parse_dump(["not-a-hash:1"]), str(tmp_path / "b.idx"))
+
+
+def test_corrupt_file_is_rejected(index_path):
+    index_path.write_bytes(index_path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        BreachedPasswords(str(index_path))
+
+
+def test_cli_filters_by_count(tmp_path, capsys):
+    dump = "\n".join(sorted([sha1_line("password", 1000), sha1_line("rare-one", 1)]))
+    path = tmp_path / "cli.idx"
+
+    main(["-", str(path), "--min-count", "2"], stdin=io.StringIO(dump))
+
+    assert "1 hashes" in capsys.readouterr().out
+    index = BreachedPasswords(str(path))
+    try:
+        assert "password" in index and "rare-one" not in index
+    finally:
+        index.close()
@@ -1,10 +1,10 @@
 import pytest
 from unittest.mock import patch, AsyncMock
-from app.auth.services.otp import EmailService
+from app.auth.services.mailer import EmailService
 
 @pytest.mark.asyncio
 async def test_send_verification_email_success():
-    with patch('app.auth.services.otp.SMTP') as mock_smtp_class:
+    with patch('app.auth.services.mailer.SMTP') as mock_smtp_class:
         
         # Setup mock
         mock_smtp_instance = AsyncMock()
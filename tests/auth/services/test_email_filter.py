@@ -0,0 +1,124 @@
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from app.auth.services.email_filter import BloomFilter, EmailFilter, ShardedEmailFilter
+from app.core.config import settings
+from app.db.connection import shard_for
+
+
+class FakeConn:
+    '''Just enough of asyncpg.Connection for the filter: reltuples, cursor and fetch'''
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.on_cursor_row = None
+
+    async def fetchval(self, query, *args):
+        return len(self.rows)
+
+    @asynccontextmanager
+    async def _transaction(self):
+        yield
+
+    def transaction(self):
+        return self._transaction()
+
+    async def cursor(self, query, prefetch=None):
+        for row in list(self.rows):
+            if self.on_cursor_row:
+                self.on_cursor_row()
+            yield row
+
+    async def fetch(self, query, *args):
+        since = args[0] if args else None
+        return [row for row in self.rows if since is None or row["created_at"] >= since]
+
+
+def _row(email, minutes=0):
+    return {"email": email, "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=minutes)}
+
+
+def test_bloom_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    emails = [f"user{i}@example.com" for i in range(1000)]
+    for email in emails:
+        bloom.add(email)
+
+    assert all(email in bloom for email in emails)
+
+
+def test_bloom_false_positive_rate_is_bounded():
+    bloom = BloomFilter(capacity=2000, error_rate=0.01)
+    for i in range(2000):
+        bloom.add(f"user{i}@example.com")
+
+    false_positives = sum(f"other{i}@example.com" in bloom for i in range(10000))
+    assert false_positives / 10000 < 0.03
+
+
+def test_filter_reports_everything_until_built():
+    email_filter = EmailFilter(capacity=100)
+
+    assert not email_filter.ready
+    assert email_filter.might_exist("anyone@example.com")
+
+
+@pytest.mark.asyncio
+async def test_rebuild_and_sync():
+    conn = FakeConn([_row("a@example.com"), _row("b@example.com", 1)])
+    email_filter = EmailFilter(capacity=100, error_rate=0.001)
+
+    assert await email_filter.rebuild(conn) == 2
+    assert email_filter.might_exist("a@example.com")
+    assert not email_filter.might_exist("c@example.com")
+
+    # registered on another worker
+    conn.rows.append(_row("c@example.com", 2))
+    await email_filter.sync(conn)
+    assert email_filter.might_exist("c@example.com")
+
+
+@pytest.mark.asyncio
+async def test_sync_picks_up_rows_committed_behind_the_watermark(monkeypatch):
+    monkeypatch.setattr(settings, "EMAIL_FILTER_SYNC_OVERLAP_SECONDS", 120.0)
+    conn = FakeConn([_row("a@example.com"), _row("b@example.com", 5)])
+    email_filter = EmailFilter(capacity=100, error_rate=0.001)
+    await email_filter.rebuild(conn)
+    conn.rows.append(_row("c@example.com", 6))
+    await email_filter.sync(conn)  # watermark now at minute 6
+
+    # a transaction that started at minute 4 commits only now
+    conn.rows.append(_row("late@example.com", 4))
+    await email_filter.sync(conn)
+
+    assert email_filter.might_exist("late@example.com")
+    assert email_filter._watermark == _row("", 6)["created_at"]
+
+
+@pytest.mark.asyncio
+async def test_registrations_during_rebuild_are_kept():
+    email_filter = EmailFilter(capacity=100, error_rate=0.001)
+    conn = FakeConn([_row("a@example.com")])
+    await email_filter.rebuild(conn)
+
+    conn.on_cursor_row = lambda: email_filter.add("new@example.com")
+    await email_filter.rebuild(conn)
+
+    assert email_filter.might_exist("new@example.com")
+
+
+@pytest.mark.asyncio
+async def test_sharded_filter_looks_up_the_email_shard(monkeypatch):
+    monkeypatch.setattr(settings, "DB_SHARD_URLS", ["postgresql://a", "postgresql://b"])
+    emails = [f"user{i}@example.com" for i in range(20)]
+    sharded = ShardedEmailFilter()
+    assert sharded.might_exist("anyone@example.com")
+
+    sharded.filters = [EmailFilter(capacity=100, error_rate=0.001) for _ in range(2)]
+    for shard, email_filter in enumerate(sharded.filters):
+        await email_filter.rebuild(FakeConn([_row(e) for e in emails if shard_for(e) == shard]))
+
+    assert sharded.ready and all(sharded.might_exist(e) for e in emails)
+    other_shard = next(e for e in emails if shard_for(e) == 1)
+    assert not sharded.filters[0].might_exist(other_shard)
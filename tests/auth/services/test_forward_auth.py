@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from datetime import timedelta
+from uuid import uuid4
+
+from app.auth.services.forward_auth import ForwardAuthCache
+from app.auth.services.jwt import create_refresh_token
+from app.core.security import create_access_token
+
+
+class Lookup:
+    def __init__(self, rows, delay: float = 0):
+        self.rows = {row["email"]: row for row in rows}
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, email):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.rows.get(email)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def user(email, **flags):
+    return {"id": uuid4(), "email": email, "is_verified": True, "is_active": True, **flags}
+
+
+@pytest.mark.asyncio
+async def test_identity_is_cached_until_ttl():
+    clock = Clock()
+    cache = ForwardAuthCache(ttl=5, max_entries=100, clock=clock)
+    row = user("a@example.com")
+    lookup = Lookup([row])
+    token = create_access_token({"sub": row["email"]})
+
+    assert await cache.identify(token, lookup) == (str(row["id"]), row["email"])
+    assert await cache.identify(token, lookup) == (str(row["id"]), row["email"])
+    assert lookup.calls == 1
+
+    clock.now += 6
+    await cache.identify(token, lookup)
+    assert lookup.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_rejections_are_cached_and_skip_the_db():
+    cache = ForwardAuthCache(ttl=5, max_entries=100)
+    lookup = Lookup([user("off@example.com", is_active=False)])
+    inactive = create_access_token({"sub": "off@example.com"})
+
+    assert await cache.identify("garbage", lookup) is None
+    assert await cache.identify(create_refresh_token({"sub": "off@example.com"}), lookup) is None
+    assert await cache.identify(
+        create_access_token({"sub": "off@example.com"}, expires_delta=timedelta(seconds=-1)), lookup
+    ) is None
+    assert lookup.calls == 0
+
+    assert await cache.identify(inactive, lookup) is None
+    assert await cache.identify(inactive, lookup) is None
+    assert lookup.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_lookup():
+    cache = ForwardAuthCache(ttl=5, max_entries=100)
+    row = user("a@example.com")
+    lookup = Lookup([row], delay=0.01)
+    token = create_access_token({"sub": row["email"]})
+
+    results = await asyncio.gather(*(cache.identify(token, lookup) for _ in range(10)))
+
+    assert lookup.calls == 1
+    assert set(results) == {(str(row["id"]), row["email"])}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_waiters():
+    cache = ForwardAuthCache(ttl=5, max_entries=100)
+    row = user("a@example.com")
+    lookup = Lookup([row], delay=0.05)
+    token = create_access_token({"sub": row["email"]})
+
+    leader = asyncio.create_task(cache.identify(token, lookup))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(cache.identify(token, lookup))
+    await asyncio.sleep(0)
+    leader.cancel()  # client disconnected
+
+    assert await waiter == (str(row["id"]), row["email"])
+    assert leader.cancelled() and lookup.calls == 2
@@ -0,0 +1,66 @@
+import pytest
+from datetime import timedelta
+from uuid import uuid4
+
+from app.auth.services.introspection import introspect_tokens
+from app.auth.services.jwt import create_refresh_token
+from app.core.security import create_access_token
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.shards = []
+
+    async def use_shard(self, shard):
+        self.shards.append(shard)
+
+    async def fetch(self, query, emails):
+        self.queries.append(emails)
+        return [row for row in self.rows if row["email"] in emails]
+
+
+def user(email, **flags):
+    return {"id": uuid4(), "email": email, "is_verified": True, "is_active": True, **flags}
+
+
+@pytest.mark.asyncio
+async def test_batch_resolves_subjects_in_one_query():
+    alice, bob = user("alice@example.com"), user("bob@example.com")
+    conn = FakeConn([alice, bob])
+    alice_token = create_access_token({"sub": alice["email"]})
+    tokens = [alice_token, create_access_token({"sub": bob["email"]}), alice_token]
+
+    results = await introspect_tokens(conn, tokens)
+
+    assert len(conn.queries) == 1
+    assert sorted(conn.queries[0]) == [alice["email"], bob["email"]]
+    assert [r["active"] for r in results] == [True, True, True]
+    assert results[0]["user_id"] == alice["id"]
+    assert results[1]["sub"] == bob["email"]
+    assert results[0]["exp"] and results[0]["jti"]
+
+
+@pytest.mark.asyncio
+async def test_invalid_tokens_and_users_are_inactive():
+    conn = FakeConn([user("locked@example.com", is_active=False), user("ok@example.com")])
+    tokens = [
+        "garbage",
+        create_access_token({"sub": "ok@example.com"}, expires_delta=timedelta(seconds=-1)),
+        create_access_token({"sub": "missing@example.com"}),
+        create_access_token({"sub": "locked@example.com"}),
+        create_refresh_token({"sub": "ok@example.com"}),
+    ]
+
+    results = await introspect_tokens(conn, tokens)
+
+    assert results == [{"active": False}] * len(tokens)
+
+
+@pytest.mark.asyncio
+async def test_no_query_without_valid_tokens():
+    conn = FakeConn([])
+
+    assert await introspect_tokens(conn, ["a", "b"]) == [{"active": False}] * 2
+    assert conn.queries == []
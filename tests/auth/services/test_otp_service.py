@@ -1,5 +1,9 @@
+import time
 import pytest
-from app.auth.services.otp import OTPService
+from unittest.mock import AsyncMock
+from uuid import uuid4
+from app.auth.services.otp import OTPCheck, OTPService
+from app.core.config import settings
 
 
 
@@ -53,4 +57,106 @@ def test_verify_wrong_input_token():
     hashed = OTPService.hash_token(token)
 
     result = OTPService.verify_input_token(wrong, hashed, expected_length=6)
-    assert result is False
\ No newline at end of file
+    assert result is False
+
+def test_derive_otp_is_deterministic_per_user_and_window():
+    user_id = uuid4()
+
+    code = OTPService.derive_otp(user_id, "email_verification", "a@b.com", window=100, length=6)
+
+    assert code == OTPService.derive_otp(user_id, "email_verification", "a@b.com", window=100, length=6)
+    assert len(code) == 6 and code.isdigit()
+    others = {
+        OTPService.derive_otp(uuid4(), "email_verification", "a@b.com", window=100, length=6),
+        OTPService.derive_otp(user_id, "email_verification", "a@b.com", window=101, length=6),
+        OTPService.derive_otp(user_id, "password_reset", "a@b.com", window=100, length=6),
+    }
+    assert code not in others
+
+
+@pytest.fixture
+def derived_mode(monkeypatch):
+    from app.auth.services import otp_store
+
+    monkeypatch.setattr(settings, "OTP_MODE", "derived")
+    monkeypatch.setattr(otp_store, "_kv_client", otp_store.LocalKeyValueClient())
+
+
+@pytest.mark.asyncio
+async def test_derived_otp_issue_writes_nothing_and_verifies(derived_mode):
+    store = AsyncMock()
+    service = OTPService()
+    user_id = uuid4()
+
+    otp = await service.issue(store, user_id, "a@b.com")
+
+    assert store.method_calls == []
+    assert await service.verify(store, user_id, "a@b.com", otp) is OTPCheck.VALID
+    # replaying the same code in the same window is rejected
+    assert await service.verify(store, user_id, "a@b.com", otp) is OTPCheck.NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_derived_otp_accepts_previous_window(derived_mode, monkeypatch):
+    service = OTPService()
+    user_id = uuid4()
+    window = OTPService.otp_window()
+    previous = OTPService.derive_otp(user_id, "email_verification", "a@b.com", window - 1)
+    expired = OTPService.derive_otp(user_id, "email_verification", "a@b.com", window - 2)
+
+    if expired != previous:
+        assert await service.verify(None, user_id, "a@b.com", expired) is OTPCheck.INVALID
+    assert await service.verify(None, user_id, "a@b.com", previous) is OTPCheck.VALID
+
+
+@pytest.mark.asyncio
+async def test_derived_otp_limits_attempts(derived_mode):
+    service = OTPService()
+    user_id = uuid4()
+    otp = await service.issue(None, user_id, "a@b.com")
+    wrong = str((int(otp) + 1) % 10 ** len(otp)).zfill(len(otp))
+
+    for _ in range(settings.OTP_MAX_ATTEMPTS):
+        assert await service.verify(None, user_id, "a@b.com", wrong) is OTPCheck.INVALID
+
+    assert await service.verify(None, user_id, "a@b.com", otp) is OTPCheck.TOO_MANY_ATTEMPTS
+
+
+@pytest.mark.asyncio
+async def test_resend_cooldown_reports_pending_expiry(monkeypatch):
+    from app.auth.services import otp_store
+
+    monkeypatch.setattr(otp_store, "_kv_client", otp_store.LocalKeyValueClient())
+    service = OTPService()
+
+    assert await service.claim_resend("a@b.com") is None
+    pending = await service.claim_resend("a@b.com")
+    assert pending == pytest.approx(time.time() + settings.OTP_EXPIRE_MINUTES * 60, abs=5)
+    # other destinations are independent
+    assert await service.claim_resend("c@d.com") is None
+
+    await service.release_resend("a@b.com")
+    assert await service.claim_resend("a@b.com") is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_guesses_cannot_exceed_max_attempts(monkeypatch):
+    import asyncio
+    from app.auth.services.otp_store import EphemeralOTPStore, LocalKeyValueClient
+
+    class SlowReadStore(EphemeralOTPStore):
+        async def get_active(self, *args):
+            record = await super().get_active(*args)
+            await asyncio.sleep(0)  # every guess reads the record before any counts
+            return record
+
+    monkeypatch.setattr(settings, "OTP_MODE", "stored")
+    monkeypatch.setattr(settings, "OTP_MAX_ATTEMPTS", 3)
+    store, service, user_id = SlowReadStore(LocalKeyValueClient()), OTPService(), uuid4()
+    otp = await service.issue(store, user_id, "a@b.com")
+    wrong = str((int(otp) + 1) % 10 ** len(otp)).zfill(len(otp))
+
+    results = await asyncio.gather(*(service.verify(store, user_id, "a@b.com", wrong) for _ in range(10)))
+
+    assert results.count(OTPCheck.INVALID) == 3
+    assert await service.verify(store, user_id, "a@b.com", otp) is not OTPCheck.VALID
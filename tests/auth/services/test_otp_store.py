@@ -0,0 +1,79 @@
+import pytest
+from uuid import uuid4
+
+from app.auth.services.otp import OTPCheck, OTPService
+from app.auth.services.otp_store import EphemeralOTPStore, LocalKeyValueClient
+from app.core.config import settings
+
+
+@pytest.fixture
+def store():
+    return EphemeralOTPStore(LocalKeyValueClient())
+
+
+@pytest.mark.asyncio
+async def test_issue_and_verify(store):
+    service = OTPService()
+    user_id = uuid4()
+
+    otp = await service.issue(store, user_id, "user@example.com")
+
+    assert await service.verify(store, user_id, "user@example.com", otp) is OTPCheck.VALID
+    # single use
+    assert await service.verify(store, user_id, "user@example.com", otp) is OTPCheck.NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_new_otp_invalidates_previous(store):
+    service = OTPService()
+    user_id = uuid4()
+
+    first = await service.issue(store, user_id, "user@example.com")
+    second = await service.issue(store, user_id, "user@example.com")
+
+    if first != second:
+        assert await service.verify(store, user_id, "user@example.com", first) is OTPCheck.INVALID
+    assert await service.verify(store, user_id, "user@example.com", second) is OTPCheck.VALID
+
+
+@pytest.mark.asyncio
+async def test_attempts_are_limited(store):
+    service = OTPService()
+    user_id = uuid4()
+    otp = await service.issue(store, user_id, "user@example.com")
+    wrong = "0" * settings.OTP_LENGTH if otp != "0" * settings.OTP_LENGTH else "1" * settings.OTP_LENGTH
+
+    for _ in range(settings.OTP_MAX_ATTEMPTS):
+        assert await service.verify(store, user_id, "user@example.com", wrong) is OTPCheck.INVALID
+
+    assert await service.verify(store, user_id, "user@example.com", otp) is OTPCheck.TOO_MANY_ATTEMPTS
+
+
+@pytest.mark.asyncio
+async def test_other_destination_not_found(store):
+    service = OTPService()
+    user_id = uuid4()
+    otp = await service.issue(store, user_id, "user@example.com")
+
+    assert await service.verify(store, user_id, "other@example.com", otp) is OTPCheck.NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_bad_format_raises(store):
+    service = OTPService()
+    user_id = uuid4()
+    await service.issue(store, user_id, "user@example.com")
+
+    with pytest.raises(ValueError):
+        await service.verify(store, user_id, "user@example.com", "12ab")
+
+
+@pytest.mark.asyncio
+async def test_local_client_incr_keeps_expiry():
+    client = LocalKeyValueClient()
+    await client.set("counter", 0, ex=30)
+
+    assert await client.incr("counter") == 1
+    assert await client.incr("counter") == 2
+    assert 0 < client._cache.ttl("counter") <= 30
+    assert await client.set("counter", 5, nx=True) is None
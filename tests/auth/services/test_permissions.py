@@ -0,0 +1,83 @@
+import pytest
+from fastapi import HTTPException
+from uuid import uuid4
+
+from app.auth.dependencies import require_permission
+from app.auth.services.permissions import (
+    ALL_PERMISSIONS,
+    Permission,
+    RolePermissionCache,
+    has_permissions,
+    permission_mask,
+)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RolesConn:
+    def __init__(self, masks):
+        self.masks = masks
+        self.fetches = 0
+
+    async def fetch(self, query, *args):
+        self.fetches += 1
+        return [{"role_id": role_id, "mask": mask} for role_id, mask in self.masks.items()]
+
+
+def test_mask_bit_test():
+    mask = permission_mask([Permission.USERS_READ, Permission.USERS_DELETE])
+
+    assert has_permissions(mask, permission_mask([Permission.USERS_READ]))
+    assert not has_permissions(mask, permission_mask([Permission.USERS_READ, Permission.USERS_UPDATE]))
+
+
+@pytest.mark.asyncio
+async def test_resolve_ors_cached_role_masks():
+    reader, deleter = uuid4(), uuid4()
+    clock = Clock()
+    conn = RolesConn({reader: 0b001, deleter: 0b100})
+    cache = RolePermissionCache(ttl=60, clock=clock)
+
+    assert await cache.resolve(conn, [reader, deleter]) == 0b101
+    assert await cache.resolve(conn, [reader, uuid4()]) == 0b001
+    assert conn.fetches == 1
+
+    clock.now += 60
+    conn.masks[reader] = 0b011
+    assert await cache.resolve(conn, [reader]) == 0b011
+    assert conn.fetches == 2
+
+
+@pytest.mark.asyncio
+async def test_resolve_without_roles_or_as_superuser_skips_db():
+    conn = RolesConn({uuid4(): 1 << 62})
+    cache = RolePermissionCache(ttl=60)
+
+    assert await cache.resolve(conn, []) == 0
+    assert await cache.resolve(conn, [], is_superuser=True) == ALL_PERMISSIONS
+    assert conn.fetches == 0
+
+
+@pytest.mark.asyncio
+async def test_unknown_bits_are_not_granted():
+    role = uuid4()
+    cache = RolePermissionCache(ttl=60)
+
+    assert await cache.resolve(RolesConn({role: (1 << 62) | 1}), [role]) == 1
+
+
+@pytest.mark.asyncio
+async def test_require_permission_checks_token_bits():
+    dependency = require_permission(Permission.USERS_UPDATE)
+
+    await dependency({"sub": "a@example.com", "perm": permission_mask([Permission.USERS_UPDATE])})
+    for payload in ({"sub": "a@example.com", "perm": 1}, {"sub": "a@example.com"}):
+        with pytest.raises(HTTPException) as exc:
+            await dependency(payload)
+        assert exc.value.status_code == 403
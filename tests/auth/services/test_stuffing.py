@@ -0,0 +1,188 @@
+import asyncio
+import pytest
+
+from app.auth.services.stuffing import HeavyHitters, Limit, StuffingDetector, subnet
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_counts_decay_by_half_life():
+    clock = Clock()
+    hitters = HeavyHitters(width=256, depth=4, k=5, half_life=60, clock=clock)
+
+    for _ in range(40):
+        hitters.add("10.0.0.1")
+    assert hitters.estimate("10.0.0.1") == pytest.approx(40)
+    assert hitters.estimate("10.0.0.2") == 0
+
+    clock.now += 60
+    assert hitters.estimate("10.0.0.1") == pytest.approx(20)
+    clock.now += 120
+    assert hitters.add("10.0.0.1") == pytest.approx(6)
+
+
+def test_counts_survive_rescaling():
+    clock = Clock()
+    hitters = HeavyHitters(width=64, depth=2, k=5, half_life=1, clock=clock)
+    hitters.add("a", 1024)
+
+    clock.now += 45  # past the rescale point of 2**40
+    assert hitters.estimate("a") == pytest.approx(1024 / 2 ** 45)
+    assert hitters.add("b") == pytest.approx(1)
+
+
+def test_top_k_keeps_the_heaviest_keys():
+    hitters = HeavyHitters(width=2048, depth=4, k=3, half_life=600, clock=Clock())
+    for i in range(200):
+        hitters.add(f"scattered-{i}")
+    for key, count in (("heavy", 50), ("medium", 20), ("light", 5)):
+        for _ in range(count):
+            hitters.add(key)
+
+    assert [key for key, _ in hitters.top()] == ["heavy", "medium", "light"]
+    assert hitters.top(1)[0][1] == pytest.approx(50, abs=2)
+
+
+def test_subnets():
+    assert subnet("203.0.113.77") == "203.0.113.0/24"
+    assert subnet("::ffff:203.0.113.77") == "203.0.113.0/24"
+    assert subnet("2001:db8:1:2:3:4:5:6") == "2001:db8:1:2::/64"
+    assert subnet("testclient") is None
+
+
+def detector(clock) -> StuffingDetector:
+    return StuffingDetector(
+        limits={"ip": Limit(5, 20), "subnet": Limit(50, 100), "user_agent": Limit(None, None)},
+        max_delay=2.0,
+        max_delayed=1,
+        width=1024, depth=4, k=10, half_life=60, clock=clock,
+    )
+
+
+def test_spraying_ip_is_slowed_then_blocked():
+    clock = Clock()
+    guard = detector(clock)
+    assert guard.assess("198.51.100.9", "curl/8").action == "allow"
+
+    for _ in range(5):
+        guard.record_failure("198.51.100.9", "curl/8")
+    slowed = guard.assess("198.51.100.9", "curl/8")
+    assert slowed.action == "slow" and slowed.key == "ip:198.51.100.9"
+    assert 0 < slowed.seconds <= 2.0
+    assert guard.assess("198.51.100.10", "curl/8").action == "allow"  # same subnet, under its limit
+
+    for _ in range(35):
+        guard.record_failure("198.51.100.9", "curl/8")
+    blocked = guard.assess("198.51.100.9", "curl/8")
+    assert blocked.action == "block" and blocked.seconds == pytest.approx(60)  # 40 -> 20 takes one half-life
+
+    clock.now += 61
+    assert guard.assess("198.51.100.9", "curl/8").action == "slow"
+
+
+def test_subnet_catches_rotating_ips():
+    guard = detector(Clock())
+    for i in range(100):
+        guard.record_failure(f"192.0.2.{i}", "Mozilla/5.0")
+
+    verdict = guard.assess("192.0.2.200", "Mozilla/5.0")
+    assert verdict.action == "block" and verdict.key == "subnet:192.0.2.0/24"
+    report = guard.heavy_hitters()
+    assert report["subnet"][0] == {"key": "192.0.2.0/24", "count": 100.0, "action": "block"}
+    assert report["user_agent"][0]["action"] == "allow"
+
+
+@pytest.mark.asyncio
+async def test_delays_are_bounded():
+    guard = detector(Clock())
+
+    first = asyncio.create_task(guard.slow_down(0.05))
+    await asyncio.sleep(0)
+    assert await guard.slow_down(0.05) is False  # max_delayed reached
+    assert await first is True
+    assert guard.delayed == 0
+
+
+def test_ip_limits_wait_for_trusted_proxies(monkeypatch):
+    from app.auth.services import stuffing
+    from app.core import client_ip
+    from app.core.config import settings
+
+    def build(trusted):
+        monkeypatch.setattr(settings, "TRUSTED_PROXIES", trusted)
+        client_ip.trusted_proxies.cache_clear()
+        stuffing.get_stuffing_detector.cache_clear()
+        return stuffing.get_stuffing_detector()
+
+    try:
+        # behind an unconfigured proxy every client shares its address: never throttle it
+        guard = build(None)
+        for _ in range(100):
+            guard.record_failure("10.0.0.2", f"agent-{_}")
+        assert guard.assess("10.0.0.2", "agent-new").action == "allow"
+        assert guard.heavy_hitters(1)["ip"][0]["key"] == "10.0.0.2"
+
+        guard = build(["10.0.0.0/8"])
+        for _ in range(100):
+            guard.record_failure("203.0.113.5", f"agent-{_}")
+        assert guard.assess("203.0.113.5", "agent-new").action == "block"
+    finally:
+        client_ip.trusted_proxies.cache_clear()
+        stuffing.get_stuffing_detector.cache_clear()
+
+
+def test_user_agent_is_report_only_by_default(monkeypatch):
+    from app.auth.services import stuffing
+    from app.core import client_ip
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "TRUSTED_PROXIES", [])
+    client_ip.trusted_proxies.cache_clear()
+    stuffing.get_stuffing_detector.cache_clear()
+    try:
+        guard = stuffing.get_stuffing_detector()
+        for i in range(900):
+            guard.record_failure(f"10.{i % 250}.{i // 250}.1", "Chrome/130")
+
+        assert guard.assess("203.0.113.5", "Chrome/130").action == "allow"
+        assert guard.heavy_hitters(1)["user_agent"][0]["key"] == "Chrome/130"
+    finally:
+        client_ip.trusted_proxies.cache_clear()
+        stuffing.get_stuffing_detector.cache_clear()
+
+
+class FakeRequest:
+    def __init__(self, ip: str, user_agent: str) -> None:
+        self.client = type("Address", (), {"host": ip})()
+        self.headers = {"user-agent": user_agent}
+
+
+@pytest.mark.asyncio
+async def test_hot_user_agent_alone_is_never_refused(monkeypatch):
+    from app.auth import routes
+
+    guard = StuffingDetector(
+        limits={"ip": Limit(5, 20), "user_agent": Limit(10, None)},
+        max_delay=0.01, max_delayed=0,  # every delay slot taken
+        width=1024, depth=4, k=10, half_life=60, clock=Clock(),
+    )
+    monkeypatch.setattr(routes, "get_stuffing_detector", lambda: guard)
+    for i in range(50):
+        guard.record_failure(f"198.51.100.{i}", "Chrome/130")
+    verdict = guard.assess("203.0.113.5", "Chrome/130")
+    assert verdict.action == "slow" and verdict.shared
+
+    await routes._throttle_login(FakeRequest("203.0.113.5", "Chrome/130"))  # clean IP gets through
+
+    for _ in range(6):
+        guard.record_failure("203.0.113.5", "Chrome/130")
+    assert guard.assess("203.0.113.5", "Chrome/130").key == "ip:203.0.113.5"
+    with pytest.raises(routes.HTTPException) as error:
+        await routes._throttle_login(FakeRequest("203.0.113.5", "Chrome/130"))
+    assert error.value.status_code == 429
@@ -0,0 +1,102 @@
+import base64
+import pytest
+
+from app.auth.services.otp_store import LocalKeyValueClient
+from app.auth.services.totp import TOTPVerifier, decrypt_secret, encrypt_secret, generate_secret, provisioning_uri
+
+
+RFC_SECRET = base64.b32encode(b"12345678901234567890").decode()
+
+
+class Clock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_secret_encryption_roundtrip():
+    secret = generate_secret()
+    ciphertext = encrypt_secret(secret)
+
+    assert secret not in ciphertext
+    assert decrypt_secret(ciphertext) == secret
+
+    with pytest.raises(ValueError):
+        decrypt_secret("not-a-fernet-token")
+
+
+def test_rfc6238_vector():
+    # RFC 6238 appendix B, SHA1, T = 59
+    verifier = TOTPVerifier(step=30, digits=8, valid_window=0, max_entries=10, kv=LocalKeyValueClient(), clock=Clock(59))
+
+    assert verifier.now(encrypt_secret(RFC_SECRET)) == "94287082"
+
+
+@pytest.mark.asyncio
+async def test_accepts_adjacent_steps_only():
+    clock = Clock(1_000_000)
+    verifier = TOTPVerifier(step=30, digits=6, valid_window=1, max_entries=10, kv=LocalKeyValueClient(), clock=clock)
+    ciphertext = encrypt_secret(RFC_SECRET)
+
+    clock.now -= 30
+    previous = verifier.now(ciphertext, "u1")
+    clock.now -= 30
+    too_old = verifier.now(ciphertext, "u1")
+    clock.now += 60
+
+    assert await verifier.verify("u1", ciphertext, previous) is True
+    if too_old != verifier.now(ciphertext, "u1"):
+        assert await verifier.verify("u1", ciphertext, too_old) is False
+
+
+@pytest.mark.asyncio
+async def test_code_cannot_be_replayed():
+    verifier = TOTPVerifier(step=30, digits=6, valid_window=1, max_entries=10, kv=LocalKeyValueClient(), clock=Clock(1_000_000))
+    ciphertext = encrypt_secret(RFC_SECRET)
+    code = verifier.now(ciphertext, "u1")
+
+    assert await verifier.verify("u1", ciphertext, code) is True
+    assert await verifier.verify("u1", ciphertext, code) is False
+    # replay protection is per user
+    assert await verifier.verify("u2", ciphertext, code) is True
+
+
+
+@pytest.mark.asyncio
+async def test_replay_is_refused_by_another_worker_sharing_the_store():
+    shared = LocalKeyValueClient()  # stands in for OTP_STORE=shared
+    workers = [
+        TOTPVerifier(step=30, digits=6, valid_window=1, max_entries=10, kv=shared, clock=Clock(1_000_000))
+        for _ in range(2)
+    ]
+    ciphertext = encrypt_secret(RFC_SECRET)
+    code = workers[0].now(ciphertext, "u1")
+
+    assert await workers[0].verify("u1", ciphertext, code) is True
+    assert await workers[1].verify("u1", ciphertext, code) is False
+
+def test_rekeyed_secret_is_not_served_from_cache():
+    verifier = TOTPVerifier(step=30, digits=6, valid_window=0, max_entries=10, kv=LocalKeyValueClient(), clock=Clock(1_000_000))
+    old, new = encrypt_secret(RFC_SECRET), encrypt_secret(generate_secret())
+    verifier.now(old, "u1")
+
+    assert verifier.now(new, "u1") == TOTPVerifier(
+        step=30, digits=6, valid_window=0, max_entries=10, kv=LocalKeyValueClient(), clock=Clock(1_000_000)
+    ).now(new)
+
+
+@pytest.mark.asyncio
+async def test_malformed_code_rejected():
+    verifier = TOTPVerifier(step=30, digits=6, valid_window=1, max_entries=10, kv=LocalKeyValueClient())
+
+    with pytest.raises(ValueError):
+        await verifier.verify("u1", encrypt_secret(RFC_SECRET), "12ab56")
+
+
+def test_provisioning_uri():
+    uri = provisioning_uri("ABCDEF", "user@example.com", issuer="AuthPad")
+
+    assert uri.startswith("otpauth://totp/AuthPad:user%40example.com?")
+    assert "secret=ABCDEF" in uri
@@ -0,0 +1,51 @@
+import pytest
+from fastapi import HTTPException
+from uuid import uuid4
+
+from app.auth.dependencies import Principal, get_current_user, get_current_user_id
+
+
+class RowConn:
+    def __init__(self, row):
+        self.row = row
+        self.calls = []
+        self.routed = None
+
+    async def route(self, email):
+        self.routed = email
+
+    async def fetchrow(self, query, *args, **kwargs):
+        self.calls.append((query, args, kwargs))
+        return self.row
+
+
+@pytest.mark.asyncio
+async def test_current_user_projects_principal_columns():
+    conn = RowConn({"id": uuid4(), "email": "a@example.com"})
+
+    await get_current_user({"sub": "a@example.com"}, conn)
+
+    assert conn.routed == "a@example.com"  # the user's shard
+    query, args, kwargs = conn.calls[0]
+    assert "password_hash" not in query
+    assert "deleted_at IS NULL" in query and args == ("a@example.com",)
+    assert kwargs == {"record_class": Principal}
+
+
+@pytest.mark.asyncio
+async def test_unknown_or_inactive_user_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user({"sub": "a@example.com"}, RowConn(None))
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_current_user_id_comes_from_token():
+    user_id, conn = uuid4(), RowConn(None)
+
+    assert await get_current_user_id({"sub": "a@example.com", "uid": str(user_id)}, conn) == user_id
+    assert conn.routed == "a@example.com" and not conn.calls
+    for payload in ({"sub": "a@example.com"}, {"sub": "a@example.com", "uid": "nope"}):
+        with pytest.raises(HTTPException) as exc:
+            await get_current_user_id(payload, conn)
+        assert exc.value.status_code == 401
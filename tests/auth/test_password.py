@@ -51,4 +51,59 @@ def test_hash_pass_rejects_bad_input(bad_input):
     with pytest.raises(ValueError) as exc:
         hash_password(bad_input)
 
-    assert "password" in str(exc.value).lower()
\ No newline at end of file
+    assert "password" in str(exc.value).lower()
+
+@pytest.fixture
+def low_rounds(monkeypatch):
+    '''Run the context at a tiny cost, restore the configured one afterwards'''
+    from app.auth.services import password as password_module
+
+    def use_rounds(rounds):
+        monkeypatch.setattr(password_module.settings, "BCRYPT_ROUNDS", rounds)
+        password_module.get_pwd_context.cache_clear()
+
+    yield use_rounds
+    password_module.get_pwd_context.cache_clear()
+
+
+def test_hash_uses_bcrypt_rounds_setting(low_rounds):
+    low_rounds(5)
+    assert hash_password("123kfoel").startswith("$2b$05$")
+
+
+def test_cost_change_triggers_rehash_on_verify(low_rounds):
+    from app.auth.services.password import needs_rehash, verify_and_update_password
+
+    low_rounds(4)
+    old_hash = hash_password("123kfoel")
+    assert not needs_rehash(old_hash)
+
+    low_rounds(5)
+    assert needs_rehash(old_hash)
+
+    is_valid, new_hash = verify_and_update_password("123kfoel", old_hash)
+    assert is_valid
+    assert new_hash.startswith("$2b$05$")
+    assert verify_password("123kfoel", new_hash)
+    assert verify_and_update_password("123kfoel", new_hash) == (True, None)
+
+
+def test_wrong_password_is_never_rehashed(low_rounds):
+    from app.auth.services.password import verify_and_update_password
+
+    low_rounds(4)
+    old_hash = hash_password("123kfoel")
+    low_rounds(5)
+
+    assert verify_and_update_password("h8Njdj3k", old_hash) == (False, None)
+
+
+def test_calibrate_picks_highest_cost_within_target(monkeypatch):
+    from app.auth.services import password as password_module
+
+    # pretend every round doubles a 1 ms base cost
+    monkeypatch.setattr(password_module, "measure_hash_ms", lambda rounds, samples=3: 2 ** (rounds - 4))
+
+    chosen, timings = password_module.calibrate_rounds(target_ms=100, min_rounds=4, max_rounds=16)
+    assert chosen == 10  # 64 ms, 11 would take 128 ms
+    assert max(timings) == 11
@@ -0,0 +1,21 @@
+import pytest
+from fastapi import HTTPException
+
+from app.auth import routes
+from app.auth.services.jwt import create_refresh_token
+
+
+class UnroutableConn:
+    async def route(self, email):
+        raise AssertionError("must not route without a subject")
+
+
+class FakeRequest:
+    client = None
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_without_subject_is_401():
+    with pytest.raises(HTTPException) as exc:
+        await routes.refresh_token(FakeRequest(), create_refresh_token({}), UnroutableConn())
+    assert exc.value.status_code == 401
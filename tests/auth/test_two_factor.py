@@ -0,0 +1,77 @@
+import pytest
+from fastapi import HTTPException
+from uuid import uuid4
+
+from app.auth import routes
+from app.auth.services import otp_store
+from app.auth.services.jwt import create_mfa_token, verify_mfa_token
+from app.auth.services.totp import encrypt_secret, generate_secret, get_totp_verifier
+from app.core.config import settings
+
+
+class TOTPConn:
+    def __init__(self, row):
+        self.row = row
+        self.routed = None
+
+    async def route(self, email):
+        self.routed = email
+
+    async def fetchrow(self, query, *args):
+        return self.row
+
+    async def release(self):
+        pass
+
+
+class FakeRequest:
+    client = None
+
+
+@pytest.fixture
+def enrolled(monkeypatch):
+    monkeypatch.setattr(otp_store, "_kv_client", otp_store.LocalKeyValueClient())
+    user_id = uuid4()
+    ciphertext = encrypt_secret(generate_secret())
+    row = {"email": "a@example.com", "totp_secret": ciphertext, "totp_enabled": True}
+    return user_id, ciphertext, TOTPConn(row)
+
+
+def mfa_token(user_id) -> str:
+    return create_mfa_token({"sub": "a@example.com", "uid": str(user_id), "perm": 0})
+
+
+def wrong_code(code: str) -> str:
+    return str((int(code) + 500_000) % 10 ** len(code)).zfill(len(code))
+
+
+def test_mfa_token_does_not_carry_the_secret(enrolled):
+    user_id, _, _ = enrolled
+    assert "tsec" not in verify_mfa_token(mfa_token(user_id))
+
+
+@pytest.mark.asyncio
+async def test_secret_is_loaded_server_side(enrolled):
+    user_id, ciphertext, conn = enrolled
+    code = get_totp_verifier().now(ciphertext, str(user_id))
+
+    payload = routes.MFAVerifyRequest(mfa_token=mfa_token(user_id), code=code)
+    response = await routes.verify_two_factor(payload, FakeRequest(), conn)
+
+    assert response.status_code == 200 and conn.routed == "a@example.com"
+
+
+@pytest.mark.asyncio
+async def test_attempt_budget_survives_a_new_mfa_token(enrolled):
+    user_id, ciphertext, conn = enrolled
+    code = wrong_code(get_totp_verifier().now(ciphertext, str(user_id)))
+
+    for _ in range(settings.MAX_LOGIN_ATTEMPTS):
+        with pytest.raises(HTTPException) as exc:
+            await routes.verify_two_factor(routes.MFAVerifyRequest(mfa_token=mfa_token(user_id), code=code), FakeRequest(), conn)
+        assert exc.value.status_code == 401
+
+    # logging in again gives a fresh MFA token, not a fresh budget
+    with pytest.raises(HTTPException) as exc:
+        await routes.verify_two_factor(routes.MFAVerifyRequest(mfa_token=mfa_token(user_id), code=code), FakeRequest(), conn)
+    assert exc.value.status_code == 429
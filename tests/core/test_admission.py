@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+
+from app.core.admission import AdmissionController, Overloaded, Priority
+
+
+@pytest.mark.asyncio
+async def test_admits_up_to_limit_then_queues_until_released():
+    gate = AdmissionController(limit=1, max_queue=4, queue_timeout=1)
+    await gate.acquire(Priority.NORMAL)
+
+    waiter = asyncio.create_task(gate.acquire(Priority.NORMAL))
+    await asyncio.sleep(0)
+    assert gate.queued == 1 and not waiter.done()
+
+    gate.release()
+    await waiter
+    assert gate.in_use == 1 and gate.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_sheds_with_retry_after():
+    gate = AdmissionController(limit=1, max_queue=4, queue_timeout=0.01)
+    await gate.acquire(Priority.NORMAL)
+
+    with pytest.raises(Overloaded) as info:
+        await gate.acquire(Priority.NORMAL)
+
+    assert info.value.retry_after >= 1
+    assert gate.shed == 1 and gate.queued == 0 and gate.in_use == 1
+
+
+@pytest.mark.asyncio
+async def test_low_priority_is_shed_first_and_served_last():
+    gate = AdmissionController(limit=1, max_queue=4, queue_timeout=1)
+    await gate.acquire(Priority.NORMAL)
+    low = [asyncio.create_task(gate.acquire(Priority.LOW)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    # the queue is half full: LOW is rejected at once, HIGH may still wait
+    with pytest.raises(Overloaded):
+        await gate.acquire(Priority.LOW)
+    high = asyncio.create_task(gate.acquire(Priority.HIGH))
+    await asyncio.sleep(0)
+
+    gate.release()
+    await asyncio.wait_for(high, 1)
+    assert not any(task.done() for task in low)
+
+    for task in low:
+        gate.release()
+        await asyncio.wait_for(task, 1)
+
+
+@pytest.mark.asyncio
+async def test_critical_is_always_admitted_without_stealing_slots():
+    gate = AdmissionController(limit=1, max_queue=4, queue_timeout=1)
+    await gate.acquire(Priority.LOW)
+    await gate.acquire(Priority.CRITICAL)
+    waiter = asyncio.create_task(gate.acquire(Priority.NORMAL))
+    await asyncio.sleep(0)
+
+    gate.release()  # the CRITICAL one: over the limit, so nobody is woken
+    await asyncio.sleep(0)
+    assert not waiter.done() and gate.in_use == 1
+
+    gate.release()
+    await waiter
+
+
+@pytest.mark.asyncio
+async def test_run_in_thread_releases_the_slot():
+    gate = AdmissionController(limit=2, max_queue=0, queue_timeout=0)
+
+    results = await asyncio.gather(*(gate.run_in_thread(pow, 2, n) for n in range(2)))
+
+    assert results == [1, 2]
+    assert gate.in_use == 0
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import pytest
+
+from app.core.audit import AuditLog, FileAuditSink, RejectedEvents
+
+
+class MemorySink:
+    def __init__(self, fail_times: int = 0):
+        self.batches = []
+        self.fail_times = fail_times
+
+    async def write(self, events):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("sink down")
+        self.batches.append([event.event for event in events])
+
+
+def make_log(**overrides):
+    options = dict(capacity=5, batch_size=2, flush_interval=0.01, drop_policy="drop_oldest", enabled=True)
+    options.update(overrides)
+    return AuditLog(**options)
+
+
+def test_full_buffer_drops_oldest():
+    log = make_log()
+    for index in range(7):
+        log.record(f"e{index}")
+
+    assert len(log) == 5
+    assert log.dropped == 2
+    assert [event.event for event in log._buffer] == ["e2", "e3", "e4", "e5", "e6"]
+
+
+def test_full_buffer_drops_newest():
+    log = make_log(drop_policy="drop_newest")
+    for index in range(7):
+        log.record(f"e{index}")
+
+    assert [event.event for event in log._buffer] == ["e0", "e1", "e2", "e3", "e4"]
+    assert log.dropped == 2
+
+
+def test_disabled_log_records_nothing():
+    log = make_log(enabled=False)
+    log.record("login.failed")
+
+    assert len(log) == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_in_batches():
+    log, sink = make_log(), MemorySink()
+    for index in range(5):
+        log.record(f"e{index}")
+
+    assert await log.flush(sink) == 5
+    assert sink.batches == [["e0", "e1"], ["e2", "e3"], ["e4"]]
+    assert len(log) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_requeued_in_order():
+    log, sink = make_log(), MemorySink(fail_times=1)
+    for index in range(3):
+        log.record(f"e{index}")
+
+    with pytest.raises(ConnectionError):
+        await log.flush(sink)
+
+    assert [event.event for event in log._buffer] == ["e0", "e1", "e2"]
+    await log.flush(sink)
+    assert sink.batches == [["e0", "e1"], ["e2"]]
+
+
+@pytest.mark.asyncio
+async def test_cancelling_run_flushes_remaining_events():
+    log, sink = make_log(flush_interval=60), MemorySink()
+    task = asyncio.create_task(log.run(sink))
+    await asyncio.sleep(0)
+    log.record("logout")
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert sink.batches == [["logout"]]
+
+
+class PickySink(MemorySink):
+    '''Refuses any batch containing an event named "bad", like a failing COPY'''
+
+    async def write(self, events):
+        if any(event.event == "bad" for event in events):
+            raise RejectedEvents("value too long")
+        await super().write(events)
+
+
+class HangingSink:
+    async def write(self, events):
+        await asyncio.Event().wait()
+
+
+def test_fields_are_truncated_to_column_sizes():
+    log = make_log()
+    log.record("login.failed", email="x" * 10_000, ip_address="y" * 100)
+
+    event = log._buffer[0]
+    assert len(event.email) == 255 and len(event.ip_address) == 45
+
+
+@pytest.mark.asyncio
+async def test_rejected_event_is_dropped_without_blocking_the_rest():
+    log, sink = make_log(capacity=10, batch_size=8), PickySink()
+    for name in ("e0", "e1", "bad", "e3", "e4", "e5"):
+        log.record(name)
+
+    assert await log.flush(sink) == 5
+    assert [event for batch in sink.batches for event in batch] == ["e0", "e1", "e3", "e4", "e5"]
+    assert log.rejected == 1 and len(log) == 0
+
+
+@pytest.mark.asyncio
+async def test_shutdown_flush_gives_up_after_timeout():
+    log = make_log(flush_interval=60, shutdown_timeout=0.05)
+    task = asyncio.create_task(log.run(HangingSink()))
+    await asyncio.sleep(0)
+    log.record("logout")
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(task, timeout=1)
+
+    assert [event.event for event in log._buffer] == ["logout"]
+
+
+@pytest.mark.asyncio
+async def test_file_sink_appends_json_lines_and_rotates(tmp_path):
+    path = tmp_path / "audit.log"
+    sink = FileAuditSink(str(path), max_bytes=400, backup_count=2)
+    log = make_log(capacity=100, batch_size=100)
+
+    for round_ in range(4):
+        for index in range(3):
+            log.record("login.failed", email=f"user{index}@example.com", detail={"round": round_})
+        await log.flush(sink)
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert lines[-1]["event"] == "login.failed" and lines[-1]["detail"] == {"round": 3}
+    assert (tmp_path / "audit.log.1").exists()
+    assert not (tmp_path / "audit.log.3").exists()
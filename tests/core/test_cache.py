@@ -0,0 +1,80 @@
+from app.core.cache import TTLCache, TimingWheel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_timing_wheel_returns_due_keys_only():
+    wheel = TimingWheel(tick=1.0, slots=8, now=0.0)
+    wheel.schedule("soon", 2.0)
+    wheel.schedule("later", 5.0)
+
+    assert list(wheel.advance(3.0)) == ["soon"]
+    assert list(wheel.advance(5.0)) == ["later"]
+
+
+def test_entries_expire():
+    clock = FakeClock()
+    cache = TTLCache(default_ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+
+    clock.now += 11
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_wheel_evicts_expired_entries_without_access():
+    clock = FakeClock()
+    cache = TTLCache(default_ttl=5, clock=clock)
+    for i in range(100):
+        cache.set(i, i)
+
+    clock.now += 6
+    cache.set("fresh", True)  # advancing the wheel evicts the rest
+    assert len(cache._data) == 1
+
+
+def test_long_ttl_survives_wheel_rotation():
+    clock = FakeClock()
+    cache = TTLCache(default_ttl=5, tick=1.0, clock=clock)
+    cache._wheel = TimingWheel(tick=1.0, slots=4, now=clock.now)
+    cache.set("long", 1, ttl=10)
+
+    for _ in range(9):
+        clock.now += 1
+        cache.set("tick", 0)
+    assert cache.get("long") == 1
+
+    clock.now += 2
+    assert cache.get("long") is None
+
+
+def test_max_entries_drops_oldest():
+    cache = TTLCache(default_ttl=60, max_entries=2, clock=FakeClock())
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+
+    assert "a" not in cache
+    assert cache.get("b") == 2 and cache.get("c") == 3
+
+
+def test_add_incr_and_ttl():
+    clock = FakeClock()
+    cache = TTLCache(default_ttl=60, clock=clock)
+
+    assert cache.add("k", "v", ttl=30)
+    assert not cache.add("k", "other")
+    assert cache.get("k") == "v"
+
+    assert cache.incr("n", ttl=30) == 1
+    clock.now += 10
+    assert cache.incr("n") == 2
+    assert cache.ttl("n") == 20
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+from app.core import client_ip as client_ip_module
+from app.core.client_ip import client_ip, parse_networks, resolve_client_ip
+from app.core.config import settings
+
+
+PROXIES = parse_networks(["10.0.0.0/8", "192.168.1.1"])
+
+
+def test_direct_peer_is_the_client():
+    assert resolve_client_ip("203.0.113.5", "1.2.3.4", PROXIES) == "203.0.113.5"  # header from an untrusted peer
+    assert resolve_client_ip("203.0.113.5", None, ()) == "203.0.113.5"
+
+
+def test_forwarded_for_is_read_from_the_right_through_trusted_hops():
+    assert resolve_client_ip("10.0.0.2", "203.0.113.5", PROXIES) == "203.0.113.5"
+    # "6.6.6.6" was sent by the client itself
+    assert resolve_client_ip("10.0.0.2", "6.6.6.6, 203.0.113.5, 192.168.1.1", PROXIES) == "203.0.113.5"
+    assert resolve_client_ip("::ffff:10.0.0.2", "203.0.113.5", PROXIES) == "203.0.113.5"
+    assert resolve_client_ip("10.0.0.2", None, PROXIES) == "10.0.0.2"
+
+
+def test_client_ip_uses_configured_proxies(monkeypatch):
+    request = SimpleNamespace(client=SimpleNamespace(host="10.0.0.2"), headers={"x-forwarded-for": "203.0.113.5"})
+    monkeypatch.setattr(settings, "TRUSTED_PROXIES", ["10.0.0.0/8"])
+    client_ip_module.trusted_proxies.cache_clear()
+    try:
+        assert client_ip(request) == "203.0.113.5"
+    finally:
+        client_ip_module.trusted_proxies.cache_clear()
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+
+from app.core.config import settings
+from app.core.health import HealthMonitor, smtp_reachable
+
+
+def monitor(db_ok=True, pool=(1, 5, 10), smtp_ok=True):
+    calls = {"db": 0, "smtp": 0}
+
+    async def check_db(timeout):
+        calls["db"] += 1
+        return db_ok
+
+    async def check_smtp():
+        calls["smtp"] += 1
+        return smtp_ok
+
+    health = HealthMonitor(check_db, lambda: pool, check_smtp, interval=2, smtp_interval=30)
+    return health, calls
+
+
+@pytest.mark.asyncio
+async def test_healthy_snapshot_is_ready():
+    health, _ = monitor()
+
+    snapshot = await health.refresh()
+
+    assert snapshot.ready
+    assert health.current() is snapshot
+    data = snapshot.as_dict()
+    assert data["status"] == "ready"
+    assert data["pool_saturation"] == 0.1
+    assert data["smtp_ok"] is True
+
+
+@pytest.mark.asyncio
+async def test_unready_reasons():
+    health, _ = monitor(db_ok=False, pool=(10, 10, 10))
+    health._max_lag = settings.HEALTH_MAX_LOOP_LAG_MS + 1
+
+    snapshot = await health.refresh()
+
+    assert not snapshot.ready
+    assert set(snapshot.reasons) == {"database unreachable", "connection pool saturated", "event loop lagging"}
+    assert snapshot.db_latency_ms is None
+
+
+@pytest.mark.asyncio
+async def test_smtp_failure_does_not_gate_readiness_and_is_probed_less_often():
+    health, calls = monitor(smtp_ok=False)
+
+    await health.refresh()
+    snapshot = await health.refresh()
+
+    assert snapshot.ready and snapshot.smtp_ok is False
+    assert calls == {"db": 2, "smtp": 1}
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_is_unready():
+    health, _ = monitor()
+    snapshot = await health.refresh()
+    object.__setattr__(snapshot, "checked_at", snapshot.checked_at - 3600)
+
+    assert "snapshot stale" in health.current().reasons
+
+
+@pytest.mark.asyncio
+async def test_smtp_reachable_reads_the_greeting():
+    async def greet(reader, writer):
+        writer.write(b"220 test ESMTP\r\n")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(greet, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        assert await smtp_reachable("127.0.0.1", port, timeout=1) is True
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    assert await smtp_reachable("127.0.0.1", port, timeout=1) is False
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import pytest
+
+from app.core.profiling import (
+    CPUProfiler,
+    MemoryTracer,
+    ProfilerBusy,
+    collapsed,
+    sample_stacks,
+    task_stacks,
+)
+
+
+def busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_collects_collapsed_stacks_of_another_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,))
+    worker.start()
+    try:
+        stacks = sample_stacks(worker.ident, seconds=0.05, interval=0.001)
+    finally:
+        stop.set()
+        worker.join()
+
+    report = collapsed(stacks)
+    assert stacks and "busy_loop (" in report
+    first = report.splitlines()[0]
+    assert first.rsplit(" ", 1)[1].isdigit() and ";" in first  # root first, count last
+
+
+@pytest.mark.asyncio
+async def test_one_cpu_profile_at_a_time():
+    profiler = CPUProfiler()
+
+    first = asyncio.create_task(profiler.sample(0.05, 0.01))
+    await asyncio.sleep(0)
+    with pytest.raises(ProfilerBusy):
+        await profiler.trace(0.01)
+    await first
+
+    assert "function calls" in await profiler.trace(0.01)
+    assert not profiler.running
+
+
+def test_memory_diff_against_baseline():
+    tracer = MemoryTracer()
+    with pytest.raises(ValueError):
+        tracer.snapshot()
+
+    tracer.start()
+    try:
+        tracer.snapshot()
+        retained = [bytearray(1024) for _ in range(200)]
+        diff = tracer.diff(limit=5)
+    finally:
+        tracer.stop()
+
+    assert retained and any("test_profiling.py" in line for line in diff)
+    assert not tracer.tracing
+
+
+@pytest.mark.asyncio
+async def test_task_stacks_lists_running_tasks():
+    async def parked():
+        await asyncio.sleep(10)
+
+    task = asyncio.create_task(parked(), name="parked-task")
+    await asyncio.sleep(0)
+    try:
+        dump = task_stacks()
+    finally:
+        task.cancel()
+
+    assert "parked-task" in dump and "parked" in dump
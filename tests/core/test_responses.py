@@ -0,0 +1,58 @@
+import json
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from app.auth.schemas import TokenResponse, token_response_serializer
+from app.core.responses import ORJSONResponse
+from app.user.schemas import UserOut, user_out_serializer
+
+
+def test_user_serializer_matches_pydantic_output():
+    row = {
+        "id": uuid4(),
+        "email": "user@gmail.com",
+        "is_verified": True,
+        "is_active": True,  # extra DB column, must not leak
+        "created_at": datetime.now(timezone.utc),
+    }
+
+    fast = json.loads(user_out_serializer.dumps(row))
+    expected = json.loads(UserOut(**row).model_dump_json())
+
+    assert fast == expected
+
+
+def test_serializer_fills_optional_defaults():
+    output = json.loads(token_response_serializer.dumps({"access_token": "abc"}))
+
+    assert output == {
+        "access_token": "abc",
+        "refresh_token": None,
+        "token_type": "bearer",
+        "expires_in": None,
+    }
+
+
+def test_construct_skips_validation():
+    token = token_response_serializer.construct({"access_token": "abc", "expires_in": "not-an-int"})
+
+    assert isinstance(token, TokenResponse)
+    assert token.expires_in == "not-an-int"
+
+
+def test_serializer_response():
+    response = user_out_serializer.response(
+        {"id": uuid4(), "email": "a@b.com", "is_verified": False},
+        status_code=201,
+    )
+
+    assert response.status_code == 201
+    assert response.media_type == "application/json"
+    assert json.loads(response.body)["created_at"] is None
+
+
+def test_orjson_response_renders_uuid_and_datetime():
+    user_id = uuid4()
+    response = ORJSONResponse({"id": user_id, "at": datetime(2024, 1, 1, tzinfo=timezone.utc)})
+
+    assert json.loads(response.body) == {"id": str(user_id), "at": "2024-01-01T00:00:00Z"}
@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.core.config import settings
+from app.db import connection
+from app.db.connection import LazyConnection, jump_hash, shard_count, shard_for, stable_hash
+
+
+class FakePool:
+    def __init__(self):
+        self.checked_out = 0
+        self.acquires = 0
+
+    async def acquire(self):
+        await asyncio.sleep(0)
+        self.checked_out += 1
+        self.acquires += 1
+        raw = AsyncMock()
+        raw.fetchval.return_value = 1
+        raw.is_in_transaction = MagicMock(return_value=False)
+        return raw
+
+    async def release(self, raw):
+        self.checked_out -= 1
+
+
+@pytest.mark.asyncio
+async def test_acquires_on_first_query_only():
+    pool = FakePool()
+    conn = LazyConnection(pool)
+    assert pool.acquires == 0 and not conn.acquired
+
+    assert await conn.fetchval("SELECT 1") == 1
+    await conn.execute("SELECT 2")
+    assert pool.acquires == 1 and pool.checked_out == 1
+
+    await conn.close()
+    assert pool.checked_out == 0
+
+
+@pytest.mark.asyncio
+async def test_release_returns_connection_until_next_query():
+    pool = FakePool()
+    conn = LazyConnection(pool)
+
+    await conn.fetchval("SELECT 1")
+    await conn.release()
+    assert pool.checked_out == 0 and not conn.acquired
+
+    await conn.fetchval("SELECT 1")
+    assert pool.acquires == 2 and pool.checked_out == 1
+    await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_queries_share_one_connection():
+    pool = FakePool()
+    conn = LazyConnection(pool)
+
+    await asyncio.gather(conn.acquire(), conn.acquire())
+    assert pool.acquires == 1
+    await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_release_refused_inside_transaction():
+    pool = FakePool()
+    conn = LazyConnection(pool)
+    raw = (await conn.acquire())._conn
+    raw.is_in_transaction.return_value = True
+
+    with pytest.raises(RuntimeError):
+        await conn.release()
+    assert pool.checked_out == 1
+
+    await conn.close()
+    assert pool.checked_out == 0
+
+
+def test_jump_hash_is_stable_and_moves_keys_only_to_new_shard():
+    keys = [stable_hash(f"user{i}@example.com") for i in range(2000)]
+    before = [jump_hash(key, 4) for key in keys]
+    after = [jump_hash(key, 5) for key in keys]
+
+    assert stable_hash("a@example.com") == stable_hash("a@example.com")
+    assert set(before) == {0, 1, 2, 3}
+    moved = [(old, new) for old, new in zip(before, after) if old != new]
+    assert all(new == 4 for _, new in moved)
+    assert 0.1 < len(moved) / len(keys) < 0.3  # about 1/5
+
+
+def test_shard_for_follows_shard_map(monkeypatch):
+    monkeypatch.setattr(settings, "DB_SHARD_URLS", [])
+    assert shard_count() == 1 and shard_for("a@example.com") == 0
+
+    monkeypatch.setattr(settings, "DB_SHARD_URLS", ["postgresql://a", "postgresql://b", "postgresql://c"])
+    assert shard_count() == 3
+    assert shard_for("a@example.com") == jump_hash(stable_hash("a@example.com"), 3)
+
+
+@pytest.mark.asyncio
+async def test_routed_connection_uses_shard_pool(monkeypatch):
+    pools = [FakePool(), FakePool()]
+    monkeypatch.setattr(connection, "_POOL", pools[0])
+    monkeypatch.setattr(connection, "_SHARD_POOLS", pools)
+    conn = LazyConnection()
+
+    with pytest.raises(RuntimeError):
+        await conn.fetchval("SELECT 1")  # sharded, not routed yet
+
+    await conn.use_shard(1)
+    await conn.fetchval("SELECT 1")
+    assert pools[1].checked_out == 1
+
+    await conn.use_shard(0)  # switching shards gives the connection back
+    assert pools[1].checked_out == 0 and not conn.acquired
+    await conn.fetchval("SELECT 1")
+    assert pools[0].checked_out == 1
+    await conn.close()
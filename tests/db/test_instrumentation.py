@@ -0,0 +1,88 @@
+import logging
+import pytest
+from unittest.mock import AsyncMock
+
+from app.db import instrumentation
+from app.db.instrumentation import (
+    InstrumentedConnection,
+    fingerprint,
+    reset_statement_stats,
+    start_request_stats,
+    statement_stats,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    reset_statement_stats()
+    yield
+    reset_statement_stats()
+
+
+def test_fingerprint_normalizes_literals_and_whitespace():
+    first = fingerprint("SELECT id FROM users\n   WHERE email = 'a@b.com' LIMIT 10")
+    second = fingerprint("SELECT id FROM users WHERE email = 'x@y.org' LIMIT 50")
+
+    assert first == second
+    assert first == "SELECT id FROM users WHERE email = ? LIMIT ?"
+
+
+def test_fingerprint_normalizes_placeholders():
+    assert fingerprint("UPDATE otp_tokens SET used_at = $1 WHERE id = $2") == \
+        "UPDATE otp_tokens SET used_at = ? WHERE id = ?"
+
+
+@pytest.mark.asyncio
+async def test_instrumented_connection_records_statements():
+    raw = AsyncMock()
+    raw.fetchval.return_value = 1
+    conn = InstrumentedConnection(raw)
+    request_stats = start_request_stats()
+
+    assert await conn.fetchval("SELECT 1") == 1
+    await conn.execute("UPDATE users SET last_login = $1 WHERE id = $2", None, None)
+
+    raw.fetchval.assert_awaited_once_with("SELECT 1")
+    assert request_stats.round_trips == 2
+    assert request_stats.db_ms >= 0
+
+    stats = dict(statement_stats())
+    assert stats["SELECT ?"].calls == 1
+    assert "UPDATE users SET last_login = ? WHERE id = ?" in stats
+
+
+@pytest.mark.asyncio
+async def test_slow_query_is_logged(monkeypatch, caplog):
+    monkeypatch.setattr(instrumentation.settings, "SLOW_QUERY_THRESHOLD_MS", 0.0)
+    conn = InstrumentedConnection(AsyncMock())
+
+    with caplog.at_level(logging.WARNING, logger="app.db.queries"):
+        await conn.fetchrow("SELECT * FROM users WHERE email = $1", "a@b.com")
+
+    record = caplog.records[-1]
+    assert record.event == "slow_query"
+    assert record.fingerprint == "SELECT * FROM users WHERE email = ?"
+
+
+def test_unknown_attributes_are_delegated():
+    raw = AsyncMock()
+    conn = InstrumentedConnection(raw)
+
+    assert conn.transaction is raw.transaction
+
+
+@pytest.mark.asyncio
+async def test_statement_report_route():
+    from app.main import db_statements, db_statements_reset
+
+    instrumentation.record_statement("SELECT * FROM users WHERE id = $1", 3.0)
+    instrumentation.record_statement("SELECT * FROM users WHERE id = $1", 1.0)
+    instrumentation.record_statement("SELECT 1", 0.5)
+
+    assert (await db_statements(limit=1))["statements"] == [{
+        "fingerprint": "SELECT * FROM users WHERE id = ?",
+        "calls": 2, "total_ms": 4.0, "mean_ms": 2.0, "max_ms": 3.0,
+    }]
+
+    await db_statements_reset()
+    assert statement_stats() == []
@@ -0,0 +1,66 @@
+import socket
+import pytest
+
+from app.server import bind_socket, parse_args, worker_pool_sizes
+
+
+def test_pool_budget_is_split_across_workers():
+    assert worker_pool_sizes(budget=40, workers=4, min_size=1, max_size=10) == (1, 10)
+    assert worker_pool_sizes(budget=40, workers=16, min_size=1, max_size=10) == (1, 2)
+    assert worker_pool_sizes(budget=10, workers=3, min_size=5, max_size=10) == (3, 3)
+
+
+def test_pool_sizes_without_budget_use_settings():
+    assert worker_pool_sizes(budget=None, workers=8, min_size=2, max_size=10) == (2, 10)
+
+
+def test_pool_budget_smaller_than_workers_rejected():
+    with pytest.raises(ValueError):
+        worker_pool_sizes(budget=2, workers=4, min_size=1, max_size=10)
+
+
+def test_parse_args_defaults_and_flags():
+    options = parse_args(["--workers", "3", "--port", "9000", "--reuse-port", "--no-preload"])
+
+    assert options.workers == 3
+    assert options.port == 9000
+    assert options.reuse_port is True
+    assert options.preload is False
+    assert options.app == "app.main:app"
+
+
+def test_parse_args_rejects_zero_workers():
+    with pytest.raises(SystemExit):
+        parse_args(["--workers", "0"])
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="SO_REUSEPORT not available")
+def test_reuse_port_sockets_share_a_port():
+    first = bind_socket("127.0.0.1", 0, reuse_port=True)
+    port = first.getsockname()[1]
+    second = bind_socket("127.0.0.1", port, reuse_port=True)
+
+    try:
+        assert second.getsockname()[1] == port
+    finally:
+        first.close()
+        second.close()
+
+
+def test_per_process_otp_state_needs_a_single_worker(monkeypatch):
+    from app.core.config import settings
+    from app.server import check_worker_settings
+
+    monkeypatch.setattr(settings, "OTP_MODE", "derived")
+    monkeypatch.setattr(settings, "OTP_STORE", "database")
+    check_worker_settings(1)
+    with pytest.raises(ValueError):
+        check_worker_settings(4)
+
+    monkeypatch.setattr(settings, "OTP_STORE", "shared")
+    check_worker_settings(4)
+
+    monkeypatch.setattr(settings, "OTP_MODE", "stored")
+    monkeypatch.setattr(settings, "OTP_STORE", "memory")
+    with pytest.raises(ValueError):
+        check_worker_settings(2)
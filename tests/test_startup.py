@@ -0,0 +1,23 @@
+from benchmarks.startup import STARTUP_BUDGET_MS, import_breakdown, measure_first_response
+
+
+def test_startup_does_not_load_heavy_modules():
+    result = measure_first_response()
+
+    assert result["status"] == 204
+    assert result["loaded_lazy_modules"] == []
+    assert result["settings_built_at_import"] is False
+
+
+def test_startup_within_budget():
+    # best of three to keep a noisy CI runner from failing the budget
+    best = min(measure_first_response()["first_response_ms"] for _ in range(3))
+
+    assert best < STARTUP_BUDGET_MS, f"cold start took {best:.0f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)"
+
+
+def test_import_breakdown_lists_app_modules():
+    modules = [name.strip() for _, _, name in import_breakdown()]
+
+    assert "app.main" in modules
+    assert "app.auth.routes" in modules
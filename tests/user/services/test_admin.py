@@ -0,0 +1,167 @@
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from app.user.services.admin import (
+    BulkAction,
+    UserFilter,
+    build_list_query,
+    bulk_update,
+    bulk_update_sharded,
+    chunk_ids,
+    decode_cursor,
+    encode_cursor,
+    filtered_id_chunks,
+    list_users,
+    list_users_sharded,
+)
+
+
+def test_cursor_roundtrip():
+    created_at, user_id = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc), uuid4()
+
+    assert decode_cursor(encode_cursor(created_at, user_id)) == (created_at, user_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "bm90LWpzb24"])
+def test_invalid_cursor_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_query_uses_keyset_instead_of_offset():
+    since = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    cursor = encode_cursor(datetime(2024, 6, 1, tzinfo=timezone.utc), uuid4())
+
+    query, args = build_list_query(UserFilter(is_active=True, created_after=since), cursor, limit=50)
+
+    assert "OFFSET" not in query
+    assert "is_active = $1" in query and "created_at >= $2" in query
+    assert "(created_at, id) < ($3, $4)" in query
+    assert "ORDER BY created_at DESC, id DESC" in query and "LIMIT $5" in query
+    assert args[0] is True and args[1] == since and args[-1] == 51
+
+
+def test_query_without_filters_has_no_where():
+    query, args = build_list_query(UserFilter(), None, limit=10)
+
+    assert "WHERE" not in query
+    assert args == [11]
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetch(self, query, *args):
+        return self.rows[:args[-1]]
+
+
+@pytest.mark.asyncio
+async def test_next_cursor_points_after_last_row():
+    now = datetime.now(timezone.utc)
+    rows = [{"id": uuid4(), "created_at": now - timedelta(minutes=i)} for i in range(3)]
+
+    page, next_cursor = await list_users(FakeConn(rows), UserFilter(), None, limit=2)
+    assert len(page) == 2
+    assert decode_cursor(next_cursor) == (rows[1]["created_at"], rows[1]["id"])
+
+    page, next_cursor = await list_users(FakeConn(rows), UserFilter(), None, limit=3)
+    assert len(page) == 3 and next_cursor is None
+
+
+class RecordingConn:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.updates = []
+
+    async def fetch(self, query, *args):
+        # keyset pages over self.rows (newest first), honouring the cursor
+        if "(created_at, id) <" in query:
+            created_at, user_id = args[-3], args[-2]
+            rows = [r for r in self.rows if (r["created_at"], r["id"]) < (created_at, user_id)]
+        else:
+            rows = self.rows
+        return rows[:args[-1]]
+
+    async def execute(self, query, ids):
+        self.updates.append((query, list(ids)))
+        return f"UPDATE {len(ids) - 1}"
+
+
+async def collect(gen):
+    return [item async for item in gen]
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_by_ids_runs_chunked_any_updates():
+    conn = RecordingConn()
+    ids = [uuid4() for _ in range(5)]
+
+    progress = await collect(bulk_update(conn, BulkAction.DEACTIVATE, chunk_ids(ids, 2)))
+
+    assert [ids for _, ids in conn.updates] == [ids[0:2], ids[2:4], ids[4:]]
+    query = conn.updates[0][0]
+    assert "SET is_active = false" in query and "id = ANY($1::uuid[])" in query
+    assert "is_active IS DISTINCT FROM false" in query  # no-op rows are not rewritten
+    assert progress[-1] == {"processed": 5, "updated": 2}
+
+
+@pytest.mark.asyncio
+async def test_filtered_chunks_walk_every_matching_user_once():
+    now = datetime.now(timezone.utc)
+    rows = [{"id": uuid4(), "created_at": now - timedelta(minutes=i)} for i in range(5)]
+    conn = RecordingConn(rows)
+
+    chunks = await collect(filtered_id_chunks(conn, UserFilter(is_active=True), chunk_size=2))
+
+    assert chunks == [[r["id"] for r in rows[0:2]], [r["id"] for r in rows[2:4]], [rows[4]["id"]]]
+
+
+def connector(conn):
+    @asynccontextmanager
+    async def connect():
+        yield conn
+    return connect
+
+
+@pytest.mark.asyncio
+async def test_sharded_listing_merges_shard_pages_in_keyset_order():
+    now = datetime.now(timezone.utc)
+    rows = [{"id": uuid4(), "created_at": now - timedelta(minutes=i)} for i in range(7)]
+    shards = [RecordingConn(rows[0::2]), RecordingConn(rows[1::2])]
+
+    page, cursor = await list_users_sharded([connector(c) for c in shards], UserFilter(), None, limit=3)
+    assert page == rows[:3]
+
+    page, cursor = await list_users_sharded([connector(c) for c in shards], UserFilter(), cursor, limit=3)
+    assert page == rows[3:6] and cursor is not None
+
+    page, cursor = await list_users_sharded([connector(c) for c in shards], UserFilter(), cursor, limit=3)
+    assert page == rows[6:] and cursor is None
+
+
+class ShardConn(RecordingConn):
+    '''Updates only the ids it holds'''
+
+    def __init__(self, ids):
+        super().__init__()
+        self.ids = set(ids)
+
+    async def execute(self, query, ids):
+        self.updates.append((query, list(ids)))
+        return f"UPDATE {len(self.ids.intersection(ids))}"
+
+
+@pytest.mark.asyncio
+async def test_sharded_bulk_by_ids_counts_each_id_once():
+    ids = [uuid4() for _ in range(5)]
+    shards = [ShardConn(ids[:2]), ShardConn(ids[2:])]
+
+    progress = await collect(
+        bulk_update_sharded([connector(c) for c in shards], BulkAction.UNLOCK, 2, ids=ids)
+    )
+
+    assert [len(ids) for _, ids in shards[0].updates] == [2, 2, 1]  # every chunk goes to every shard
+    assert progress[-1] == {"processed": 5, "updated": 5}
@@ -0,0 +1,92 @@
+import pytest
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from app.user.services.deletion import AccountPurger, PURGE_LOCK_KEY, deletion_status
+
+
+class PurgeConn:
+    '''Dependents per table, deleted `LIMIT` rows at a time; records every statement'''
+
+    def __init__(self, dependents, pending=(), locked=False):
+        self.dependents = dict(dependents)
+        self.pending = list(pending)
+        self.locked = locked
+        self.statements = []
+
+    async def execute(self, query, *args):
+        self.statements.append((" ".join(query.split()), args))
+        if query.lstrip().startswith("SELECT pg_advisory_unlock"):
+            return "SELECT 1"
+        if "FROM users" in query:
+            return "DELETE 1"
+        table = query.split("DELETE FROM")[1].split()[0]
+        count = min(self.dependents[table], args[1])
+        self.dependents[table] -= count
+        return f"DELETE {count}"
+
+    async def fetchval(self, query, *args):
+        self.statements.append((" ".join(query.split()), args))
+        return not self.locked
+
+    async def fetch(self, query, *args):
+        return [{"id": user_id} for user_id in self.pending[:args[0]]]
+
+
+@pytest.mark.asyncio
+async def test_purge_deletes_dependents_in_batches_then_user():
+    conn = PurgeConn({"otp_tokens": 5, "sessions": 2})
+
+    removed = await AccountPurger(batch_size=2, pause=0).purge_user(conn, uuid4())
+
+    deletes = [query for query, _ in conn.statements]
+    assert sum("DELETE FROM otp_tokens" in q for q in deletes) == 3  # 2 + 2 + 1
+    assert sum("DELETE FROM sessions" in q for q in deletes) == 2  # 2, then an empty batch
+    assert "DELETE FROM users" in deletes[-1] and "deleted_at IS NOT NULL" in deletes[-1]
+    assert removed == 8
+    assert conn.dependents == {"otp_tokens": 0, "sessions": 0}
+
+
+@pytest.mark.asyncio
+async def test_purge_pending_holds_advisory_lock():
+    pending = [uuid4(), uuid4()]
+    conn = PurgeConn({"otp_tokens": 0, "sessions": 0}, pending)
+
+    assert await AccountPurger(batch_size=10, pause=0).purge_pending(conn) == 2
+    assert conn.statements[0] == ("SELECT pg_try_advisory_lock($1)", (PURGE_LOCK_KEY,))
+    assert conn.statements[-1] == ("SELECT pg_advisory_unlock($1)", (PURGE_LOCK_KEY,))
+
+
+@pytest.mark.asyncio
+async def test_purge_pending_skips_when_another_worker_holds_lock():
+    conn = PurgeConn({"otp_tokens": 3, "sessions": 0}, [uuid4()], locked=True)
+
+    assert await AccountPurger(batch_size=10, pause=0).purge_pending(conn) == 0
+    assert len(conn.statements) == 1
+
+
+class StatusConn:
+    def __init__(self, deleted_at, exists, remaining=0):
+        self.deleted_at = deleted_at
+        self.exists = exists
+        self.remaining = remaining
+
+    async def fetchval(self, query, *args):
+        if "SELECT deleted_at" in query:
+            return self.deleted_at
+        if "EXISTS" in query:
+            return self.exists
+        return self.remaining
+
+
+@pytest.mark.asyncio
+async def test_deletion_status_states():
+    user_id = uuid4()
+    deleted_at = datetime.now(timezone.utc)
+
+    assert (await deletion_status(StatusConn(None, True), user_id))["state"] == "active"
+    assert (await deletion_status(StatusConn(None, False), user_id))["state"] == "purged"
+
+    pending = await deletion_status(StatusConn(deleted_at, True, remaining=4), user_id)
+    assert pending["state"] == "pending" and pending["deleted_at"] == deleted_at
+    assert pending["remaining"] == {"otp_tokens": 4, "sessions": 4}